@@ -1,11 +1,36 @@
 import dash
-from dash import dcc, html, Input, Output, State, callback, dash_table
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
-import datetime
+from dash import dcc, html, Input, Output, State, Patch, ClientsideFunction, callback, ctx, dash_table
+from dash.exceptions import PreventUpdate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import date
+import math
+import os
+import queue
 import uuid
+from urllib.parse import parse_qs
+from cache import FragmentCache, open_cache, serialize_component
+from compression import ResponseCompression
+from geo import distance_km
+from images import CARD_MAX_WIDTH, HERO_MAX_WIDTH, ImageStore
+from metrics import Metrics
+from moderation import Moderator, analyze, sentiment_label
+from rate_limit import RateLimiter, client_address, warn_untrusted_proxies
+from repository import open_repository
+from response_cache import ResponseCache
+from static_assets import StaticAssets
+from review_writer import ReviewWriter
+from store import REVIEW_ORDERS, ROLLUP_FIELDS, ROLLUP_PERIODS, valid_rating
+
+# Dash serializes callback responses with plotly's JSON helpers, which
+# import orjson and numpy the first time they meet a component. Threads
+# doing that at once can crash the process on a half-initialized module,
+# so both are imported here instead, before any request thread exists and
+# before gunicorn forks preloaded workers, which then share them.
+import numpy  # noqa: F401
+try:
+    import orjson  # noqa: F401
+except ImportError:
+    pass
 
 # Sample restaurant data
 restaurants_data = [
@@ -18,7 +43,9 @@ restaurants_data = [
         'image': 'https://images.unsplash.com/photo-1517248135467-4c7edcad34c4?w=400&h=300&fit=crop',
         'description': 'Elegant French cuisine in a cozy garden setting with seasonal menus.',
         'phone': '(555) 123-4567',
-        'address': '123 Main St, Downtown'
+        'address': '123 Main St, Downtown',
+        'latitude': 40.7127,
+        'longitude': -74.0059
     },
     {
         'id': '2',
@@ -29,7 +56,9 @@ restaurants_data = [
         'image': 'https://images.unsplash.com/photo-1579584425555-c3ce17fd4351?w=400&h=300&fit=crop',
         'description': 'Authentic Japanese sushi bar with fresh ingredients and traditional preparation.',
         'phone': '(555) 234-5678',
-        'address': '456 Oak Ave, Midtown'
+        'address': '456 Oak Ave, Midtown',
+        'latitude': 40.7549,
+        'longitude': -73.984
     },
     {
         'id': '3',
@@ -40,7 +69,9 @@ restaurants_data = [
         'image': 'https://images.unsplash.com/photo-1565299624946-b28f40a0ca4b?w=400&h=300&fit=crop',
         'description': 'Family-owned pizzeria serving authentic wood-fired pizzas since 1952.',
         'phone': '(555) 345-6789',
-        'address': '789 Pine St, Little Italy'
+        'address': '789 Pine St, Little Italy',
+        'latitude': 40.7193,
+        'longitude': -73.9973
     },
     {
         'id': '4',
@@ -51,7 +82,9 @@ restaurants_data = [
         'image': 'https://images.unsplash.com/photo-1565557623262-b51c2513a641?w=400&h=300&fit=crop',
         'description': 'Modern Indian cuisine with traditional spices and contemporary presentation.',
         'phone': '(555) 456-7890',
-        'address': '321 Elm St, Uptown'
+        'address': '321 Elm St, Uptown',
+        'latitude': 40.8116,
+        'longitude': -73.9465
     },
     {
         'id': '5',
@@ -62,7 +95,9 @@ restaurants_data = [
         'image': 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=400&h=300&fit=crop',
         'description': 'Premium steaks and fine dining experience in an upscale atmosphere.',
         'phone': '(555) 567-8901',
-        'address': '654 Broadway, Financial District'
+        'address': '654 Broadway, Financial District',
+        'latitude': 40.7074,
+        'longitude': -74.0113
     }
 ]
 
@@ -102,10 +137,174 @@ reviews_data = [
     }
 ]
 
+# All reads and writes go through the repository. Set RESTAURANT_DB to a
+# SQLite file to persist data and share it between workers (wsgi.py does
+# this by default); a new database is seeded with the sample data above,
+# its reviews scored like new ones.
+repository = open_repository(os.environ.get('RESTAURANT_DB'), restaurants_data,
+                             [analyze(review)[0] for review in reviews_data])
+
+# New reviews are queued, then moderated (spam, profanity, duplicates and
+# sentiment; see moderation.py) and written in batches off the request thread
+review_writer = ReviewWriter(repository, Moderator(repository))
+
+# Rendered pages and cards, rebuilt when the data they show changes
+fragment_cache = FragmentCache(int(os.environ.get('FRAGMENT_CACHE_SIZE', 10000)))
+
 # Initialize the Dash app
 app = dash.Dash(__name__)
 app.title = "Restaurant Reviews"
 
+# Bootstrap and the stylesheet are served from assets/ (minified, with
+# immutable cache headers). PRECOMPRESS_ASSETS=1 also prepares gzip and
+# brotli copies at startup.
+static_assets = StaticAssets(app.config.assets_folder, app.get_asset_url(''),
+                             precompress=os.environ.get('PRECOMPRESS_ASSETS', '') in ('1', 'true'))
+static_assets.init_app(app.server)
+
+# Behind TRUSTED_PROXIES reverse proxies, the client address (which the
+# rate limits below go by) is taken from their X-Forwarded-For headers
+trusted_proxies = int(os.environ.get('TRUSTED_PROXIES', 0))
+if trusted_proxies:
+    app.server.wsgi_app = ProxyFix(app.server.wsgi_app, x_for=trusted_proxies)
+else:
+    warn_untrusted_proxies(app.server)
+
+# Token buckets per client: callback requests (CALLBACK_RATE_LIMIT per
+# second on average, bursts of CALLBACK_BURST; a page load fires a dozen)
+# and review submissions (REVIEW_RATE_LIMIT per minute, bursts of
+# REVIEW_BURST). A rate of 0 turns a limit off. The callback limit is off
+# by default: clients behind one NAT share an address, and Dash leaves a
+# throttled callback's outputs stale. Checked before the response cache,
+# so a throttled client gets no cached answers either.
+rate_limiter = RateLimiter({
+    'callback': (float(os.environ.get('CALLBACK_RATE_LIMIT', 0)),
+                 int(os.environ.get('CALLBACK_BURST', 60))),
+    'review': (float(os.environ.get('REVIEW_RATE_LIMIT', 6)) / 60,
+               int(os.environ.get('REVIEW_BURST', 3)))
+})
+rate_limiter.init_app(app.server, 'callback')
+
+# Callback responses and pages compressed with brotli or gzip
+# (COMPRESS_RESPONSES=0 turns it off, e.g. behind a proxy that compresses).
+# Set up before the response cache, which stores the uncompressed bodies.
+response_compression = ResponseCompression()
+if os.environ.get('COMPRESS_RESPONSES', '1') not in ('0', 'false'):
+    response_compression.init_app(app.server)
+
+# Resized local copies of restaurant images (see images.py), served from
+# /images with long-lived cache headers
+image_store = ImageStore(os.environ.get('IMAGE_DIR', 'images'))
+image_store.init_app(app.server)
+
+
+# Versions for cached markup that shows restaurant images: ingesting
+# images (python images.py) changes them as well as writes do
+def data_version():
+    return repository.data_version(), image_store.version()
+
+
+def restaurant_version(restaurant_id):
+    return repository.restaurant_version(restaurant_id), image_store.version()
+
+
+# Responses of the read-only callbacks, keyed on their inputs and the data
+# version. RESPONSE_CACHE is 'memory' (per process, the default), a
+# directory shared by all workers, or 'off'. Pages and grid responses run
+# to tens of KB, so the memory backend is bounded by bytes as well as
+# entries; every worker holds its own.
+response_cache = ResponseCache(
+    open_cache(os.environ.get('RESPONSE_CACHE', 'memory'),
+               int(os.environ.get('RESPONSE_CACHE_SIZE', 10000)),
+               int(os.environ.get('RESPONSE_CACHE_BYTES', 32 * 1024 * 1024))),
+    data_version,
+    outputs=['page-content.children', 'restaurants-grid.children', 'data-grid-page.data',
+             'search-matches.data',
+             'reviews-list.children', 'review-restaurant-select.options',
+             'analytics-volume.figure', 'analytics-distribution.figure',
+             'analytics-restaurant.options']
+)
+response_cache.init_app(app.server)
+
+# Request and function timings, cache hit counts and review writer counters
+# on /metrics (METRICS=1), and the timings of each response in a
+# Server-Timing header (SERVER_TIMING=1). With METRICS_DIR set, workers
+# share their numbers through that directory and /metrics reports the total.
+metrics = Metrics(enabled=os.environ.get('METRICS', '') in ('1', 'true'),
+                  server_timing=os.environ.get('SERVER_TIMING', '') in ('1', 'true'),
+                  directory=os.environ.get('METRICS_DIR'))
+metrics.collect('restaurant_cache_hits_total', 'counter', "Cache lookups answered from the cache",
+                'cache', lambda: {'fragment': fragment_cache.hits, 'response': response_cache.hits})
+metrics.collect('restaurant_cache_misses_total', 'counter', "Cache lookups that had to build the value",
+                'cache', lambda: {'fragment': fragment_cache.misses, 'response': response_cache.misses})
+metrics.collect('restaurant_coalesced_total', 'counter',
+                "Requests that shared the work of an identical one in progress", 'cache',
+                lambda: {'fragment': fragment_cache.coalesced, 'response': response_cache.coalesced})
+metrics.collect('restaurant_throttled_total', 'counter', "Requests turned away by a rate limit",
+                'limit', lambda: dict(rate_limiter.throttled))
+metrics.collect('restaurant_compressed_bytes_total', 'counter',
+                "Bytes of the compressed responses, before and after compression", 'stage',
+                lambda: {'before': response_compression.bytes_in,
+                         'after': response_compression.bytes_out})
+metrics.collect('restaurant_reviews_total', 'counter', "Reviews by what the review writer did with them",
+                'status', lambda: {'submitted': review_writer.submitted,
+                                   'rejected': review_writer.rejected,
+                                   'flagged': review_writer.flagged,
+                                   'written': review_writer.written,
+                                   'failed': review_writer.failed})
+metrics.collect('restaurant_reviews_flagged_total', 'counter', "Reviews held back by moderation",
+                'reason', lambda: dict(review_writer.moderator.rejected))
+metrics.collect('restaurant_reviews_pending', 'gauge', "Reviews queued but not written yet",
+                None, review_writer.pending)
+metrics.init_app(app.server)
+
+
+# Browsers pick a variant from srcSet using these display widths
+CARD_IMAGE_SIZES = "(min-width: 1200px) 350px, (min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw"
+HERO_IMAGE_SIZES = "(min-width: 768px) 50vw, 100vw"
+
+# Number of restaurant cards rendered per grid page
+GRID_PAGE_SIZE = 12
+
+# Radius choices of the home page's distance filter, in km
+DISTANCE_CHOICES = (1, 2, 5, 10)
+
+# The home page's leaderboards (see store.Leaderboards) and their length
+LEADERBOARD_LABELS = {'top_rated': "Top rated", 'most_reviewed': "Most reviewed",
+                      'trending': "Trending this week"}
+LEADERBOARD_SIZE = 10
+
+# Catalogues with at most this many restaurants are sent to the browser
+# whole and filtered and sorted there (assets/grid.js); bigger ones are
+# queried on the server a page at a time. 0 always uses the server.
+CLIENTSIDE_GRID_LIMIT = int(os.environ.get('CLIENTSIDE_GRID_LIMIT', 200))
+
+# What the server-side grid sends for each card: 'components' (the card's
+# component tree) or 'data' (the few fields a card shows, which
+# assets/grid.js turns into the same card). Data is several times smaller
+# and also replaces the pre-rendered cards in the clientside catalogue.
+GRID_PAYLOAD = os.environ.get('GRID_PAYLOAD', 'components')
+
+# Number of reviews shown per page on the restaurant page
+REVIEWS_PAGE_SIZE = 10
+# Order of the restaurant page's reviews until the user picks another one,
+# and for sort values that are not in store.REVIEW_ORDERS
+DEFAULT_REVIEW_ORDER = 'newest'
+
+# Maximum number of suggestions in the add-review restaurant picker
+RESTAURANT_PICKER_LIMIT = 20
+
+# Time buckets offered on the analytics page, from store.ROLLUP_PERIODS
+ANALYTICS_PERIODS = [
+    {'label': 'Weekly', 'value': 'W'},
+    {'label': 'Monthly', 'value': 'M'},
+    {'label': 'Quarterly', 'value': 'Q'}
+]
+
+# Limits for submitted reviews
+MAX_REVIEWER_NAME_LENGTH = 100
+MAX_REVIEW_TEXT_LENGTH = 5000
+
 # Define styles
 COLORS = {
     'primary': '#1f77b4',
@@ -131,7 +330,8 @@ def create_header():
                 ], href="/", className="navbar-brand"),
                 html.Div([
                     html.A("Home", href="/", className="nav-link"),
-                    html.A("Add Review", href="/add-review", className="nav-link")
+                    html.A("Add Review", href="/add-review", className="nav-link"),
+                    html.A("Analytics", href="/analytics", className="nav-link")
                 ], className="navbar-nav")
             ], className="container")
         ], className="navbar navbar-expand-lg navbar-dark bg-primary")
@@ -146,13 +346,26 @@ def create_star_rating(rating):
             stars.append(html.Span("☆", className="star"))
     return html.Div(stars, className="star-rating")
 
+# Card images load as they scroll into view: Img here has no loading
+# attribute, so the sources go in data-src/data-srcset and
+# assets/lazy-images.js moves them into place
+def create_card_image(restaurant):
+    sources = image_store.sources(restaurant['image'], CARD_MAX_WIDTH)
+    props = {'data-src': sources['src']}
+    if 'srcSet' in sources:
+        props['data-srcset'] = sources['srcSet']
+    return html.Img(alt=restaurant['name'], sizes=CARD_IMAGE_SIZES, className="card-img-top",
+                    **props)
+
+@metrics.timed
 def create_restaurant_card(restaurant):
-    avg_rating = calculate_average_rating(restaurant['id'])
-    review_count = len([r for r in reviews_data if r['restaurant_id'] == restaurant['id']])
+    stats = repository.get_rating_stats(restaurant['id'])
+    avg_rating = stats.average
+    review_count = stats.count
     
     return html.Div([
         html.Div([
-            html.Img(src=restaurant['image'], className="card-img-top"),
+            create_card_image(restaurant),
             html.Div([
                 html.H5(restaurant['name'], className="card-title"),
                 html.P([
@@ -175,13 +388,122 @@ def create_restaurant_card(restaurant):
         ], className="card restaurant-card")
     ], className="col-md-6 col-lg-4 mb-4")
 
+def get_restaurant_card(restaurant):
+    return fragment_cache.get(('card', restaurant['id']),
+                              restaurant_version(restaurant['id']),
+                              lambda: create_restaurant_card(restaurant))
+
+# What a card shows, for grid.js to render (GRID_PAYLOAD=data)
+@metrics.timed
+def create_card_data(restaurant):
+    stats = repository.get_rating_stats(restaurant['id'])
+    return {
+        'id': restaurant['id'],
+        'name': restaurant['name'],
+        'cuisine': restaurant['cuisine'],
+        'location': restaurant['location'],
+        'price_range': restaurant['price_range'],
+        'description': restaurant['description'],
+        'rating': stats.average,
+        'review_count': stats.count,
+        'image': image_store.sources(restaurant['image'], CARD_MAX_WIDTH)
+    }
+
+def get_card_data(restaurant):
+    return fragment_cache.get(('card-data', restaurant['id']),
+                              restaurant_version(restaurant['id']),
+                              lambda: create_card_data(restaurant))
+
+# Rounded with int(x + 0.5) rather than round(), which rounds halves to
+# even, so assets/grid.js (Math.floor(x + 0.5)) shows the same text
+def format_distance(km):
+    metres = int(km * 100 + 0.5) * 10
+    if metres < 1000:
+        return f"{metres} m"
+    return f"{int(km * 10 + 0.5) / 10:.1f} km"
+
+# A cached card (serialized) with a badge showing how far away the
+# restaurant is, as the first child of the card itself
+def add_distance_badge(card, km):
+    badge = serialize_component(html.Span(f"📍 {format_distance(km)}", className="distance-badge"))
+    inner = card['props']['children'][0]
+    inner = dict(inner, props=dict(inner['props'], children=[badge] + inner['props']['children']))
+    return dict(card, props=dict(card['props'], children=[inner]))
+
+# The (latitude, longitude) in the user-location store, or None if it is
+# missing or malformed
+def parse_user_location(data):
+    try:
+        latitude, longitude = float(data['latitude']), float(data['longitude'])
+    except (TypeError, KeyError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+@metrics.timed
 def calculate_average_rating(restaurant_id):
-    restaurant_reviews = [r for r in reviews_data if r['restaurant_id'] == restaurant_id]
-    if not restaurant_reviews:
-        return 0
-    return round(sum(r['rating'] for r in restaurant_reviews) / len(restaurant_reviews), 1)
+    return repository.get_rating_stats(restaurant_id).average
+
+def create_facet_options(counts, all_label):
+    return [{'label': all_label, 'value': 'all'}] + [
+        {'label': f"{value} ({count})", 'value': value} for value, count in counts
+    ]
+
+def use_clientside_grid():
+    restaurant_count = sum(count for _, count in repository.facets()['cuisine'])
+    return restaurant_count <= CLIENTSIDE_GRID_LIMIT
 
-def create_home_page():
+# Everything grid.js needs to filter, sort and render the grid
+@metrics.timed
+def create_catalog_data():
+    restaurants = []
+    for seq, restaurant in enumerate(repository.list_restaurants()):
+        row = {
+            'id': restaurant['id'],
+            'name': restaurant['name'],
+            'cuisine': restaurant['cuisine'],
+            'location': restaurant['location'],
+            'price_range': restaurant['price_range'],
+            'rating': calculate_average_rating(restaurant['id']),
+            'latitude': restaurant.get('latitude'),
+            'longitude': restaurant.get('longitude'),
+            'seq': seq
+        }
+        if GRID_PAYLOAD == 'data':
+            row.update(get_card_data(restaurant))
+        else:
+            row['card'] = get_restaurant_card(restaurant)
+        restaurants.append(row)
+    return {'page_size': GRID_PAGE_SIZE, 'image_sizes': CARD_IMAGE_SIZES,
+            'restaurants': restaurants}
+
+# The grid with its count and "Load more" button. The clientside grid and
+# the data payload grid use their own ids, so only their callbacks fire.
+@metrics.timed
+def create_restaurants_grid(clientside=False):
+    prefix = "client-" if clientside else "data-" if GRID_PAYLOAD == 'data' else ""
+    children = [
+        html.P(id=f"{prefix}results-count", className="results-count text-muted"),
+        html.Div(id=f"{prefix}restaurants-grid", className="row"),
+        html.Div([
+            html.Button("Load more", id=f"{prefix}load-more",
+                        className="btn btn-outline-primary")
+        ], id=f"{prefix}load-more-section", className="load-more-section"),
+        dcc.Store(id=f"{prefix}grid-cursor", data=0)
+    ]
+    if clientside:
+        children += [
+            dcc.Store(id="catalog-data", data=create_catalog_data()),
+            dcc.Store(id="search-matches")
+        ]
+    elif prefix == "data-":
+        children.append(dcc.Store(id="data-grid-page"))
+    return html.Div(children, className="container")
+
+@metrics.timed
+def create_home_page(clientside=False):
+    facets = repository.facets()
     return html.Div([
         create_header(),
         html.Div([
@@ -198,7 +520,8 @@ def create_home_page():
                             placeholder="Search restaurants...",
                             className="form-control search-input"
                         ),
-                        html.Button("Search", className="btn btn-primary search-btn")
+                        html.Button("Search", id="search-button",
+                                    className="btn btn-primary search-btn")
                     ], className="search-section")
                 ], className="hero-content")
             ], className="hero-section"),
@@ -212,14 +535,7 @@ def create_home_page():
                             html.Label("Cuisine:"),
                             dcc.Dropdown(
                                 id="cuisine-filter",
-                                options=[
-                                    {'label': 'All Cuisines', 'value': 'all'},
-                                    {'label': 'French', 'value': 'French'},
-                                    {'label': 'Japanese', 'value': 'Japanese'},
-                                    {'label': 'Italian', 'value': 'Italian'},
-                                    {'label': 'Indian', 'value': 'Indian'},
-                                    {'label': 'American', 'value': 'American'}
-                                ],
+                                options=create_facet_options(facets['cuisine'], 'All Cuisines'),
                                 value='all',
                                 className="form-select"
                             )
@@ -228,14 +544,7 @@ def create_home_page():
                             html.Label("Location:"),
                             dcc.Dropdown(
                                 id="location-filter",
-                                options=[
-                                    {'label': 'All Locations', 'value': 'all'},
-                                    {'label': 'Downtown', 'value': 'Downtown'},
-                                    {'label': 'Midtown', 'value': 'Midtown'},
-                                    {'label': 'Little Italy', 'value': 'Little Italy'},
-                                    {'label': 'Uptown', 'value': 'Uptown'},
-                                    {'label': 'Financial District', 'value': 'Financial District'}
-                                ],
+                                options=create_facet_options(facets['location'], 'All Locations'),
                                 value='all',
                                 className="form-select"
                             )
@@ -244,13 +553,7 @@ def create_home_page():
                             html.Label("Price Range:"),
                             dcc.Dropdown(
                                 id="price-filter",
-                                options=[
-                                    {'label': 'All Prices', 'value': 'all'},
-                                    {'label': '$', 'value': '$'},
-                                    {'label': '$$', 'value': '$$'},
-                                    {'label': '$$$', 'value': '$$$'},
-                                    {'label': '$$$$', 'value': '$$$$'}
-                                ],
+                                options=create_facet_options(facets['price_range'], 'All Prices'),
                                 value='all',
                                 className="form-select"
                             )
@@ -263,27 +566,65 @@ def create_home_page():
                                     {'label': 'Rating (High to Low)', 'value': 'rating_desc'},
                                     {'label': 'Rating (Low to High)', 'value': 'rating_asc'},
                                     {'label': 'Name (A-Z)', 'value': 'name_asc'},
-                                    {'label': 'Name (Z-A)', 'value': 'name_desc'}
+                                    {'label': 'Name (Z-A)', 'value': 'name_desc'},
+                                    {'label': 'Distance (Nearest first)', 'value': 'distance'}
                                 ],
                                 value='rating_desc',
                                 className="form-select"
                             )
                         ], className="col-md-3")
-                    ], className="row")
+                    ], className="row"),
+                    html.Div([
+                        html.Div([
+                            html.Label("Distance:"),
+                            dcc.Dropdown(
+                                id="distance-filter",
+                                options=[{'label': 'Any Distance', 'value': 'all'}] + [
+                                    {'label': f"Within {km} km", 'value': km}
+                                    for km in DISTANCE_CHOICES
+                                ],
+                                value='all',
+                                className="form-select"
+                            )
+                        ], className="col-md-3"),
+                        html.Div([
+                            html.Button("📍 Near me", id="locate-button",
+                                        className="btn btn-outline-primary"),
+                            html.Span(id="locate-status", className="locate-status text-muted"),
+                            # Kept for the browser session, so it survives
+                            # going to a restaurant page and back
+                            dcc.Store(id="user-location", storage_type='session')
+                        ], className="col-md-9 locate-section")
+                    ], className="row distance-row")
                 ], className="container")
             ], className="filters-section"),
-            
-            # Restaurant grid
+
+            # Leaderboards, following the cuisine and location filters
             html.Div([
                 html.Div([
-                    html.Div(id="restaurants-grid", className="row")
+                    html.H4("🏆 Leaderboards"),
+                    dcc.RadioItems(
+                        id="leaderboard-board",
+                        options=[{'label': label, 'value': board}
+                                 for board, label in LEADERBOARD_LABELS.items()],
+                        value='top_rated',
+                        inline=True,
+                        className="leaderboard-tabs"
+                    ),
+                    html.Ol(id="leaderboard-list", className="leaderboard-list")
                 ], className="container")
+            ], className="leaderboard-section"),
+
+            # Restaurant grid
+            html.Div([
+                create_restaurants_grid(clientside)
             ], className="restaurants-section")
         ])
     ])
 
+@metrics.timed
 def create_restaurant_detail_page(restaurant_id):
-    restaurant = next((r for r in restaurants_data if r['id'] == restaurant_id), None)
+    restaurant = repository.get_restaurant(restaurant_id)
     if not restaurant:
         return html.Div([
             create_header(),
@@ -292,21 +633,23 @@ def create_restaurant_detail_page(restaurant_id):
             ], className="container")
         ])
     
-    restaurant_reviews = [r for r in reviews_data if r['restaurant_id'] == restaurant_id]
-    avg_rating = calculate_average_rating(restaurant_id)
+    stats = repository.get_rating_stats(restaurant_id)
+    avg_rating = stats.average
     
     return html.Div([
         create_header(),
         html.Div([
             html.Div([
                 html.Div([
-                    html.Img(src=restaurant['image'], className="restaurant-hero-img")
+                    html.Img(alt=restaurant['name'], sizes=HERO_IMAGE_SIZES,
+                             className="restaurant-hero-img",
+                             **image_store.sources(restaurant['image'], HERO_MAX_WIDTH))
                 ], className="col-md-6"),
                 html.Div([
                     html.H1(restaurant['name']),
                     html.Div([
                         create_star_rating(avg_rating),
-                        html.Span(f" {avg_rating}/5 ({len(restaurant_reviews)} reviews)", 
+                        html.Span(f" {avg_rating}/5 ({stats.count} reviews)", 
                                 className="rating-text")
                     ], className="rating-section"),
                     html.P([
@@ -333,12 +676,30 @@ def create_restaurant_detail_page(restaurant_id):
             
             html.Hr(),
             
-            html.H3("Reviews"),
             html.Div([
-                create_review_card(review) for review in restaurant_reviews
-            ] if restaurant_reviews else [
-                html.P("No reviews yet. Be the first to review this restaurant!")
-            ], className="reviews-section")
+                html.H3("Reviews"),
+                dcc.Dropdown(
+                    id="review-sort",
+                    options=[
+                        {'label': 'Newest first', 'value': 'newest'},
+                        {'label': 'Highest rated', 'value': 'highest'},
+                        {'label': 'Lowest rated', 'value': 'lowest'}
+                    ],
+                    value=DEFAULT_REVIEW_ORDER,
+                    clearable=False,
+                    className="form-select review-sort"
+                )
+            ], className="reviews-header"),
+            # Filled one page at a time by update_reviews
+            html.Div(id="reviews-list", className="reviews-section"),
+            html.Div([
+                html.Button("Previous", id="reviews-prev", type="button",
+                            className="btn btn-outline-primary btn-sm"),
+                html.Span(id="reviews-page-label", className="reviews-page-label"),
+                html.Button("Next", id="reviews-next", type="button",
+                            className="btn btn-outline-primary btn-sm")
+            ], className="reviews-pager"),
+            dcc.Store(id="reviews-page", data={'restaurant_id': restaurant_id, 'page': 0})
         ], className="container")
     ])
 
@@ -347,6 +708,7 @@ def create_review_card(review):
         html.Div([
             html.Div([
                 html.H6(review['reviewer_name']),
+                create_sentiment_badge(review.get('sentiment')),
                 html.Small(review['date'], className="text-muted")
             ], className="review-header"),
             create_star_rating(review['rating']),
@@ -354,7 +716,22 @@ def create_review_card(review):
         ], className="card-body")
     ], className="card review-card mb-3")
 
-def create_add_review_page():
+# Positive, mixed or negative, from the score moderation gave the review
+def create_sentiment_badge(score):
+    label = sentiment_label(score)
+    if label is None:
+        return None
+    return html.Span(label.capitalize(), className=f"review-sentiment {label}",
+                     title=f"Sentiment score {score:+.2f}")
+
+def create_restaurant_options(restaurant_ids):
+    restaurants = (repository.get_restaurant(restaurant_id)
+                   for restaurant_id in restaurant_ids if restaurant_id)
+    return [{'label': restaurant['name'], 'value': restaurant['id']}
+            for restaurant in restaurants if restaurant]
+
+@metrics.timed
+def create_add_review_page(restaurant_id=None):
     return html.Div([
         create_header(),
         html.Div([
@@ -363,13 +740,13 @@ def create_add_review_page():
                 html.Form([
                     html.Div([
                         html.Label("Select Restaurant:"),
+                        # Options are looked up as the user types, see
+                        # update_restaurant_options
                         dcc.Dropdown(
                             id="review-restaurant-select",
-                            options=[
-                                {'label': restaurant['name'], 'value': restaurant['id']}
-                                for restaurant in restaurants_data
-                            ],
-                            placeholder="Choose a restaurant...",
+                            options=create_restaurant_options([restaurant_id]),
+                            value=restaurant_id,
+                            placeholder="Start typing a restaurant name...",
                             className="form-select"
                         )
                     ], className="mb-3"),
@@ -410,260 +787,535 @@ def create_add_review_page():
                         )
                     ], className="mb-3"),
                     
-                    html.Button("Submit Review", id="submit-review", 
-                              className="btn btn-primary")
+                    html.Button("Submit Review", id="submit-review", type="button",
+                              className="btn btn-primary"),
+                    html.Div(id="review-feedback", className="mt-3")
                 ])
             ], className="col-md-8 mx-auto")
         ], className="container")
     ])
 
+# Charts are filled in by update_analytics and update_rating_distribution
+@metrics.timed
+def create_analytics_page():
+    facets = repository.facets()
+    return html.Div([
+        create_header(),
+        html.Div([
+            html.H2("Ratings Analytics", className="mb-4"),
+            html.Div([
+                html.Div([
+                    html.Label("Cuisine:"),
+                    dcc.Dropdown(
+                        id="analytics-cuisine",
+                        options=create_facet_options(facets['cuisine'], 'All Cuisines'),
+                        value='all',
+                        clearable=False,
+                        className="form-select"
+                    )
+                ], className="col-md-3"),
+                html.Div([
+                    html.Label("Location:"),
+                    dcc.Dropdown(
+                        id="analytics-location",
+                        options=create_facet_options(facets['location'], 'All Locations'),
+                        value='all',
+                        clearable=False,
+                        className="form-select"
+                    )
+                ], className="col-md-3"),
+                html.Div([
+                    html.Label("Compare by:"),
+                    dcc.RadioItems(
+                        id="analytics-group",
+                        options=[{'label': ' Cuisine', 'value': 'cuisine'},
+                                 {'label': ' Location', 'value': 'location'}],
+                        value='cuisine',
+                        inline=True,
+                        labelClassName="me-3"
+                    )
+                ], className="col-md-3"),
+                html.Div([
+                    html.Label("Period:"),
+                    dcc.Dropdown(
+                        id="analytics-period",
+                        options=ANALYTICS_PERIODS,
+                        value='M',
+                        clearable=False,
+                        className="form-select"
+                    )
+                ], className="col-md-3")
+            ], className="row mb-4"),
+            dcc.Loading([
+                dcc.Graph(id="analytics-volume"),
+                dcc.Graph(id="analytics-trend"),
+                dash_table.DataTable(
+                    id="analytics-summary",
+                    columns=[
+                        {'name': "Group", 'id': 'group'},
+                        {'name': "Reviews", 'id': 'review_count', 'type': 'numeric'},
+                        {'name': "Average rating", 'id': 'average_rating', 'type': 'numeric'},
+                        {'name': "5-star share", 'id': 'five_star_share', 'type': 'numeric',
+                         'format': {'specifier': '.0%'}}
+                    ],
+                    sort_action='native',
+                    style_cell={'textAlign': 'left', 'padding': '8px'},
+                    style_header={'fontWeight': 'bold'}
+                )
+            ]),
+            html.H4("Rating distribution", className="mt-5"),
+            html.Div([
+                html.Label("Restaurant:"),
+                # Options are looked up as the user types; without a
+                # restaurant the chart covers the cuisine and location above
+                dcc.Dropdown(
+                    id="analytics-restaurant",
+                    placeholder="All restaurants (start typing to pick one)...",
+                    className="form-select"
+                )
+            ], className="col-md-6 mb-3"),
+            dcc.Graph(id="analytics-distribution")
+        ], className="container analytics-section")
+    ])
+
+# One row per period and group from the rollup rows of one period, with the
+# average rating recomputed from the summed totals. There are a few rows
+# per period, however many reviews there are.
+def aggregate_rollups(rows, group_by):
+    # pandas is only needed here, and takes longer to import than the rest
+    # of the app, so workers load it on the first analytics request
+    import pandas as pd
+
+    frame = pd.DataFrame(rows, columns=ROLLUP_FIELDS)
+    totals = frame.groupby(['date', group_by], as_index=False)[
+        ['review_count', 'rating_sum']].sum()
+    totals['average_rating'] = (totals['rating_sum'] / totals['review_count']).round(2)
+    return totals, frame
+
+# Figures are plain dicts: Dash sends them as they are, while plotly
+# objects spend far longer validating every property than the data takes
+FIGURE_LAYOUT = {'margin': {'t': 50, 'b': 40}, 'hovermode': 'x unified'}
+
+def create_empty_figure(message):
+    return {'data': [], 'layout': {
+        'xaxis': {'visible': False}, 'yaxis': {'visible': False}, 'height': 300,
+        'annotations': [{'text': message, 'showarrow': False, 'font': {'size': 16}}]
+    }}
+
+# One trace per group over time, as bars (stacked) or lines
+def create_timeseries_figure(totals, group_by, column, title, axis_title, kind):
+    data = []
+    for group, rows in totals.groupby(group_by):
+        trace = {'type': kind, 'name': group, 'x': rows['date'].tolist(),
+                 'y': rows[column].tolist()}
+        if kind == 'scatter':
+            trace['mode'] = 'lines+markers'
+        data.append(trace)
+    layout = dict(FIGURE_LAYOUT, title=title, yaxis={'title': axis_title},
+                  legend={'title': {'text': group_by.capitalize()}})
+    if kind == 'bar':
+        layout['barmode'] = 'stack'
+    return {'data': data, 'layout': layout}
+
+def create_rating_distribution_figure(histogram, title):
+    return {'data': [{
+        'type': 'bar',
+        'x': [f"{stars} ★" for stars in range(1, 6)],
+        'y': histogram,
+        'marker': {'color': ['#d62728', '#ff7f0e', '#bcbd22', '#2ca02c', '#1f77b4']}
+    }], 'layout': dict(FIGURE_LAYOUT, title=title, xaxis={'title': "Rating"},
+                       yaxis={'title': "Reviews"})}
+
 # Callbacks
 @app.callback(
     Output('page-content', 'children'),
-    Input('url', 'pathname')
+    Input('url', 'pathname'),
+    State('url', 'search')
 )
-def display_page(pathname):
+@metrics.timed
+def display_page(pathname, search=None):
     if pathname == '/add-review':
-        return create_add_review_page()
+        restaurant_id = parse_qs((search or '').lstrip('?')).get('restaurant_id', [None])[0]
+        return fragment_cache.get(('add-review', restaurant_id), repository.catalog_version(),
+                                  lambda: create_add_review_page(restaurant_id))
+    elif pathname == '/analytics':
+        return fragment_cache.get(('analytics',), repository.catalog_version(),
+                                  create_analytics_page)
     elif pathname and pathname.startswith('/restaurant/'):
         restaurant_id = pathname.split('/')[-1]
-        return create_restaurant_detail_page(restaurant_id)
+        return fragment_cache.get(('restaurant', restaurant_id),
+                                  restaurant_version(restaurant_id),
+                                  lambda: create_restaurant_detail_page(restaurant_id))
+    elif use_clientside_grid():
+        # The page embeds every card and rating, so any write rebuilds it
+        return fragment_cache.get(('home', 'clientside'), data_version(),
+                                  lambda: create_home_page(clientside=True))
     else:
-        return create_home_page()
+        return fragment_cache.get(('home',), repository.catalog_version(), create_home_page)
 
 @app.callback(
-    Output('restaurants-grid', 'children'),
+    [Output('restaurants-grid', 'children'),
+     Output('results-count', 'children'),
+     Output('load-more-section', 'style'),
+     Output('grid-cursor', 'data')],
     [Input('cuisine-filter', 'value'),
      Input('location-filter', 'value'),
      Input('price-filter', 'value'),
-     Input('sort-filter', 'value')]
+     Input('sort-filter', 'value'),
+     Input('distance-filter', 'value'),
+     Input('user-location', 'data'),
+     Input('search-input', 'value'),
+     Input('search-button', 'n_clicks'),
+     Input('load-more', 'n_clicks')],
+    State('grid-cursor', 'data')
 )
-def update_restaurants_grid(cuisine, location, price, sort_by):
-    filtered_restaurants = restaurants_data.copy()
-    
-    # Apply filters
-    if cuisine != 'all':
-        filtered_restaurants = [r for r in filtered_restaurants if r['cuisine'] == cuisine]
-    if location != 'all':
-        filtered_restaurants = [r for r in filtered_restaurants if r['location'] == location]
-    if price != 'all':
-        filtered_restaurants = [r for r in filtered_restaurants if r['price_range'] == price]
-    
-    # Apply sorting
-    if sort_by == 'rating_desc':
-        filtered_restaurants.sort(key=lambda x: calculate_average_rating(x['id']), reverse=True)
-    elif sort_by == 'rating_asc':
-        filtered_restaurants.sort(key=lambda x: calculate_average_rating(x['id']))
-    elif sort_by == 'name_asc':
-        filtered_restaurants.sort(key=lambda x: x['name'])
-    elif sort_by == 'name_desc':
-        filtered_restaurants.sort(key=lambda x: x['name'], reverse=True)
-    
-    return [create_restaurant_card(restaurant) for restaurant in filtered_restaurants]
-
-# Custom CSS
-app.index_string = '''
-<!DOCTYPE html>
-<html>
-    <head>
-        {%metas%}
-        <title>{%title%}</title>
-        {%favicon%}
-        {%css%}
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background-color: #f8f9fa;
-            }
-            
-            .hero-section {
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 80px 0;
-                text-align: center;
-            }
-            
-            .hero-content h1 {
-                font-size: 3.5rem;
-                margin-bottom: 1rem;
-                font-weight: 700;
-            }
-            
-            .search-section {
-                max-width: 600px;
-                margin: 2rem auto;
-                display: flex;
-                gap: 10px;
-            }
-            
-            .search-input {
-                flex: 1;
-                padding: 12px 20px;
-                border: none;
-                border-radius: 25px;
-                font-size: 16px;
-            }
-            
-            .search-btn {
-                padding: 12px 30px;
-                border-radius: 25px;
-                border: none;
-                background-color: #ff6b6b;
-                color: white;
-                font-weight: 600;
-            }
-            
-            .filters-section {
-                background-color: white;
-                padding: 30px 0;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            
-            .restaurants-section {
-                padding: 50px 0;
-            }
-            
-            .restaurant-card {
-                transition: transform 0.3s ease, box-shadow 0.3s ease;
-                border: none;
-                border-radius: 15px;
-                overflow: hidden;
-                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-            }
-            
-            .restaurant-card:hover {
-                transform: translateY(-5px);
-                box-shadow: 0 8px 15px rgba(0,0,0,0.2);
-            }
-            
-            .card-img-top {
-                height: 200px;
-                object-fit: cover;
-            }
-            
-            .star-rating {
-                display: inline-block;
-                margin: 10px 0;
-            }
-            
-            .star {
-                font-size: 18px;
-                color: #ddd;
-            }
-            
-            .star.filled {
-                color: #ffd700;
-            }
-            
-            .card-actions {
-                display: flex;
-                gap: 10px;
-            }
-            
-            .btn {
-                border-radius: 20px;
-                padding: 8px 20px;
-                font-weight: 600;
-                transition: all 0.3s ease;
-            }
-            
-            .btn-primary {
-                background-color: #667eea;
-                border-color: #667eea;
-            }
-            
-            .btn-primary:hover {
-                background-color: #5a6fd8;
-                border-color: #5a6fd8;
-            }
-            
-            .btn-outline-primary {
-                color: #667eea;
-                border-color: #667eea;
-            }
-            
-            .btn-outline-primary:hover {
-                background-color: #667eea;
-                border-color: #667eea;
-            }
-            
-            .restaurant-details {
-                padding: 50px 0;
-            }
-            
-            .restaurant-hero-img {
-                width: 100%;
-                height: 400px;
-                object-fit: cover;
-                border-radius: 15px;
-            }
-            
-            .rating-section {
-                margin: 20px 0;
-            }
-            
-            .rating-text {
-                font-size: 18px;
-                color: #666;
-                margin-left: 10px;
-            }
-            
-            .review-card {
-                border-radius: 10px;
-                border: none;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            
-            .review-header {
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                margin-bottom: 10px;
-            }
-            
-            .review-text {
-                margin-top: 10px;
-                line-height: 1.6;
-            }
-            
-            .navbar-brand {
-                font-size: 1.5rem;
-                font-weight: 700;
-            }
-            
-            .nav-link {
-                font-weight: 500;
-                margin: 0 15px;
-                color: rgba(255,255,255,0.8) !important;
-            }
-            
-            .nav-link:hover {
-                color: white !important;
-            }
-            
-            .form-control, .form-select {
-                border-radius: 8px;
-                border: 1px solid #ddd;
-                padding: 10px 15px;
-            }
-            
-            .form-control:focus, .form-select:focus {
-                border-color: #667eea;
-                box-shadow: 0 0 0 0.2rem rgba(102, 126, 234, 0.25);
-            }
-        </style>
-    </head>
-    <body>
-        {%app_entry%}
-        <footer>
-            {%config%}
-            {%scripts%}
-            {%renderer%}
-        </footer>
-    </body>
-</html>
-'''
+@metrics.timed
+def update_restaurants_grid(cuisine, location, price, sort_by, distance, user_location, search,
+                            search_clicks, load_more_clicks, cursor):
+    load_more = ctx.triggered_id == 'load-more'
+    page, near, offset, total = query_grid_page(cuisine, location, price, sort_by, distance,
+                                                user_location, search, load_more, cursor)
+    cards = []
+    for restaurant in page:
+        card = get_restaurant_card(restaurant)
+        km = restaurant_distance(near, restaurant)
+        if km is not None:
+            card = add_distance_badge(card, km)
+        cards.append(card)
+    if load_more:
+        grid = Patch()
+        grid.extend(cards)
+    else:
+        grid = cards
+    return (grid,) + grid_page_status(offset + len(cards), total)
+
+# The same grid as compact rows, which grid.render below turns into cards
+@app.callback(
+    [Output('data-grid-page', 'data'),
+     Output('data-results-count', 'children'),
+     Output('data-load-more-section', 'style'),
+     Output('data-grid-cursor', 'data')],
+    [Input('cuisine-filter', 'value'),
+     Input('location-filter', 'value'),
+     Input('price-filter', 'value'),
+     Input('sort-filter', 'value'),
+     Input('distance-filter', 'value'),
+     Input('user-location', 'data'),
+     Input('search-input', 'value'),
+     Input('search-button', 'n_clicks'),
+     Input('data-load-more', 'n_clicks')],
+    State('data-grid-cursor', 'data')
+)
+@metrics.timed
+def update_grid_page(cuisine, location, price, sort_by, distance, user_location, search,
+                     search_clicks, load_more_clicks, cursor):
+    load_more = ctx.triggered_id == 'data-load-more'
+    page, near, offset, total = query_grid_page(cuisine, location, price, sort_by, distance,
+                                                user_location, search, load_more, cursor)
+    rows = []
+    for restaurant in page:
+        row = get_card_data(restaurant)
+        km = restaurant_distance(near, restaurant)
+        if km is not None:
+            row = dict(row, distance=format_distance(km))
+        rows.append(row)
+    data = {'append': load_more, 'image_sizes': CARD_IMAGE_SIZES, 'restaurants': rows}
+    return (data,) + grid_page_status(offset + len(rows), total)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='grid', function_name='render'),
+    Output('data-restaurants-grid', 'children'),
+    Input('data-grid-page', 'data'),
+    State('data-restaurants-grid', 'children'),
+    prevent_initial_call=True
+)
+
+# One page of the grid: the restaurants, the user's location (or None),
+# the offset of the page and the total. "Load more" asks for the page
+# after the cursor, any other change starts over from the first page.
+def query_grid_page(cuisine, location, price, sort_by, distance, user_location, search,
+                    load_more, cursor):
+    offset = (cursor or 0) if load_more else 0
+    # Distance filtering and sorting need the user's location; until the
+    # browser has shared it they are ignored
+    near = parse_user_location(user_location)
+    radius_km = distance if near and distance in DISTANCE_CHOICES else None
+    total, restaurants = repository.query_restaurants(cuisine, location, price, sort_by,
+                                                      search=search, offset=offset,
+                                                      limit=GRID_PAGE_SIZE, near=near,
+                                                      radius_km=radius_km)
+    return restaurants, near, offset, total
+
+def restaurant_distance(near, restaurant):
+    if near and restaurant.get('latitude') is not None and restaurant.get('longitude') is not None:
+        return distance_km(near[0], near[1], restaurant['latitude'], restaurant['longitude'])
+    return None
+
+# The results count, "Load more" style and new cursor once cursor of the
+# total restaurants are on screen
+def grid_page_status(cursor, total):
+    cursor = min(cursor, total)
+    count = f"Showing {cursor} of {total} restaurants" if total else "No restaurants found"
+    load_more_style = None if cursor < total else {'display': 'none'}
+    return count, load_more_style, cursor
+
+app.clientside_callback(
+    ClientsideFunction(namespace='grid', function_name='update'),
+    [Output('client-restaurants-grid', 'children'),
+     Output('client-results-count', 'children'),
+     Output('client-load-more-section', 'style'),
+     Output('client-grid-cursor', 'data')],
+    [Input('cuisine-filter', 'value'),
+     Input('location-filter', 'value'),
+     Input('price-filter', 'value'),
+     Input('sort-filter', 'value'),
+     Input('distance-filter', 'value'),
+     Input('user-location', 'data'),
+     Input('search-matches', 'data'),
+     Input('client-load-more', 'n_clicks')],
+    [State('catalog-data', 'data'),
+     State('client-grid-cursor', 'data')]
+)
+
+# Asks the browser for the user's position (assets/geolocation.js) when
+# "Near me" is clicked, or when a distance filter or sort is picked before
+# it is known
+app.clientside_callback(
+    ClientsideFunction(namespace='geo', function_name='locate'),
+    [Output('user-location', 'data'),
+     Output('locate-status', 'children')],
+    [Input('locate-button', 'n_clicks'),
+     Input('distance-filter', 'value'),
+     Input('sort-filter', 'value')],
+    State('user-location', 'data'),
+    prevent_initial_call=True
+)
+
+# Search needs the full-text index, so with the clientside grid the server
+# only sends back the ids of the matching restaurants (None for no search)
+@app.callback(
+    Output('search-matches', 'data'),
+    [Input('search-input', 'value'),
+     Input('search-button', 'n_clicks')],
+    prevent_initial_call=True
+)
+@metrics.timed
+def update_search_matches(search, search_clicks):
+    if not search or not search.strip():
+        return None
+    return [restaurant['id']
+            for restaurant in repository.query_restaurants(search=search, sort_by=None)[1]]
+
+# Not response cached: trending changes with the date as well as the data
+@app.callback(
+    Output('leaderboard-list', 'children'),
+    [Input('leaderboard-board', 'value'),
+     Input('cuisine-filter', 'value'),
+     Input('location-filter', 'value')]
+)
+@metrics.timed
+def update_leaderboard(board, cuisine, location):
+    if board not in LEADERBOARD_LABELS:
+        raise PreventUpdate
+    entries = repository.leaderboard(board, cuisine or 'all', location or 'all',
+                                     LEADERBOARD_SIZE)
+    if not entries:
+        return [html.Li("No restaurants here yet", className="leaderboard-empty text-muted")]
+    return [create_leaderboard_entry(board, restaurant, score) for restaurant, score in entries]
+
+def create_leaderboard_entry(board, restaurant, score):
+    if board == 'top_rated':
+        score = f"★ {score:.2f}"
+    elif board == 'most_reviewed':
+        score = f"{score} review{'s' if score != 1 else ''}"
+    else:
+        score = f"{score} this week"
+    return html.Li([
+        html.A(restaurant['name'], href=f"/restaurant/{restaurant['id']}"),
+        html.Span(f" · {restaurant['cuisine']}, {restaurant['location']}", className="text-muted"),
+        html.Span(score, className="leaderboard-score")
+    ])
+
+@app.callback(
+    [Output('reviews-list', 'children'),
+     Output('reviews-page-label', 'children'),
+     Output('reviews-prev', 'disabled'),
+     Output('reviews-next', 'disabled'),
+     Output('reviews-page', 'data')],
+    [Input('review-sort', 'value'),
+     Input('reviews-prev', 'n_clicks'),
+     Input('reviews-next', 'n_clicks')],
+    State('reviews-page', 'data')
+)
+@metrics.timed
+def update_reviews(order, prev_clicks, next_clicks, state):
+    if order not in REVIEW_ORDERS:
+        order = DEFAULT_REVIEW_ORDER
+    restaurant_id = state['restaurant_id']
+    review_count = repository.get_rating_stats(restaurant_id).count
+    page_count = max(1, -(-review_count // REVIEWS_PAGE_SIZE))
+    # Changing the sort order goes back to the first page
+    page = state['page']
+    if ctx.triggered_id == 'reviews-prev':
+        page -= 1
+    elif ctx.triggered_id == 'reviews-next':
+        page += 1
+    else:
+        page = 0
+    page = min(max(page, 0), page_count - 1)
+    reviews = repository.get_reviews(restaurant_id, order, offset=page * REVIEWS_PAGE_SIZE,
+                                     limit=REVIEWS_PAGE_SIZE)
+    if reviews:
+        children = [create_review_card(review) for review in reviews]
+    else:
+        children = [html.P("No reviews yet. Be the first to review this restaurant!")]
+    return (children, f"Page {page + 1} of {page_count}", page == 0,
+            page >= page_count - 1, {'restaurant_id': restaurant_id, 'page': page})
+
+@app.callback(
+    Output('review-restaurant-select', 'options'),
+    Input('review-restaurant-select', 'search_value'),
+    State('review-restaurant-select', 'value'),
+    prevent_initial_call=True
+)
+@metrics.timed
+def update_restaurant_options(search_value, selected):
+    return suggest_restaurant_options(search_value, selected)
+
+def suggest_restaurant_options(search_value, selected):
+    if not search_value:
+        raise PreventUpdate
+    # Keep the current selection in the options so its label still shows
+    options = create_restaurant_options([selected])
+    options += [{'label': restaurant['name'], 'value': restaurant['id']}
+                for restaurant in repository.suggest_restaurants(search_value,
+                                                                 limit=RESTAURANT_PICKER_LIMIT)
+                if restaurant['id'] != selected]
+    return options
+
+def validate_review(restaurant_id, reviewer_name, rating, review_text):
+    errors = []
+    if not restaurant_id or repository.get_restaurant(restaurant_id) is None:
+        errors.append("Please choose a restaurant.")
+    reviewer_name = (reviewer_name or '').strip()
+    if not reviewer_name:
+        errors.append("Please enter your name.")
+    elif len(reviewer_name) > MAX_REVIEWER_NAME_LENGTH:
+        errors.append(f"Names can be at most {MAX_REVIEWER_NAME_LENGTH} characters.")
+    if not valid_rating(rating):
+        errors.append("Please select a rating.")
+    review_text = (review_text or '').strip()
+    if not review_text:
+        errors.append("Please write your review.")
+    elif len(review_text) > MAX_REVIEW_TEXT_LENGTH:
+        errors.append(f"Reviews can be at most {MAX_REVIEW_TEXT_LENGTH} characters.")
+    if errors:
+        return None, errors
+    return {
+        'id': str(uuid.uuid4()),
+        'restaurant_id': restaurant_id,
+        'reviewer_name': reviewer_name,
+        'rating': rating,
+        'review_text': review_text,
+        'date': date.today().isoformat()
+    }, []
+
+@app.callback(
+    Output('review-feedback', 'children'),
+    Input('submit-review', 'n_clicks'),
+    [State('review-restaurant-select', 'value'),
+     State('reviewer-name', 'value'),
+     State('rating-select', 'value'),
+     State('review-text', 'value')],
+    prevent_initial_call=True
+)
+@metrics.timed
+def submit_review(n_clicks, restaurant_id, reviewer_name, rating, review_text):
+    review, errors = validate_review(restaurant_id, reviewer_name, rating, review_text)
+    if errors:
+        return html.Div([html.Div(error) for error in errors], className="alert alert-danger")
+    wait = math.ceil(rate_limiter.acquire('review', client_address()))
+    if wait:
+        return html.Div(f"You've posted several reviews in a short time. Please wait "
+                        f"{wait} second{'s' if wait != 1 else ''} before posting another.",
+                        className="alert alert-warning")
+    try:
+        review_writer.submit(review)
+    except queue.Full:
+        return html.Div("We're receiving a lot of reviews right now, please try again in a moment.",
+                        className="alert alert-warning")
+    return html.Div([
+        "Thanks for your review! It will appear on the ",
+        html.A("restaurant page", href=f"/restaurant/{restaurant_id}"),
+        " once it passes moderation. Reviews that look like spam, duplicate another "
+        "review or are mostly profanity are not published."
+    ], className="alert alert-success")
+
+@app.callback(
+    [Output('analytics-volume', 'figure'),
+     Output('analytics-trend', 'figure'),
+     Output('analytics-summary', 'data')],
+    [Input('analytics-cuisine', 'value'),
+     Input('analytics-location', 'value'),
+     Input('analytics-group', 'value'),
+     Input('analytics-period', 'value')]
+)
+@metrics.timed
+def update_analytics(cuisine, location, group_by, period):
+    if group_by not in ('cuisine', 'location') or period not in ROLLUP_PERIODS:
+        raise PreventUpdate
+    rows = repository.review_rollups(cuisine, location, period)
+    if not rows:
+        empty = create_empty_figure("No reviews match these filters")
+        return empty, empty, []
+    totals, frame = aggregate_rollups(rows, group_by)
+    volume = create_timeseries_figure(totals, group_by, 'review_count', "Review volume",
+                                      "Reviews", 'bar')
+    trend = create_timeseries_figure(totals, group_by, 'average_rating',
+                                     "Average rating over time", "Average rating", 'scatter')
+    trend['layout']['yaxis']['range'] = [1, 5]
+    groups = frame.groupby(group_by)[['review_count', 'rating_sum', 'rating_5']].sum()
+    summary = [{
+        'group': group,
+        'review_count': int(row['review_count']),
+        'average_rating': round(row['rating_sum'] / row['review_count'], 2),
+        'five_star_share': round(row['rating_5'] / row['review_count'], 3)
+    } for group, row in groups.sort_values('review_count', ascending=False).iterrows()]
+    return volume, trend, summary
+
+@app.callback(
+    Output('analytics-distribution', 'figure'),
+    [Input('analytics-restaurant', 'value'),
+     Input('analytics-cuisine', 'value'),
+     Input('analytics-location', 'value')]
+)
+@metrics.timed
+def update_rating_distribution(restaurant_id, cuisine, location):
+    restaurant = repository.get_restaurant(restaurant_id) if restaurant_id else None
+    if restaurant:
+        # Kept on the restaurant with its other rating aggregates
+        histogram = repository.get_rating_stats(restaurant_id).histogram
+        title = restaurant['name']
+    else:
+        # Quarters are the fewest rows to add up
+        rows = repository.review_rollups(cuisine, location, 'Q')
+        histogram = [sum(row[f'rating_{stars}'] for row in rows) for stars in range(1, 6)]
+        title = "All matching restaurants"
+    if not sum(histogram):
+        return create_empty_figure("No reviews yet")
+    return create_rating_distribution_figure(histogram, title)
+
+@app.callback(
+    Output('analytics-restaurant', 'options'),
+    Input('analytics-restaurant', 'search_value'),
+    State('analytics-restaurant', 'value'),
+    prevent_initial_call=True
+)
+@metrics.timed
+def update_analytics_restaurant_options(search_value, selected):
+    return suggest_restaurant_options(search_value, selected)
 
+# Development server. Debug mode (reloader and in-browser debugger) is off
+# unless DASH_DEBUG=true; production runs wsgi.py under gunicorn instead.
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run()
\ No newline at end of file
@@ -0,0 +1,32 @@
+// Fills the user-location store from the browser's Geolocation API for the
+// home page's "Near me" button and distance filter. Returns a promise, which
+// Dash waits on before applying the outputs.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    geo: {
+        locate: function (clicks, distance, sortBy, current) {
+            var noUpdate = window.dash_clientside.no_update;
+            var triggered = window.dash_clientside.callback_context.triggered || [];
+            var clicked = triggered.some(function (t) {
+                return t.prop_id === 'locate-button.n_clicks';
+            });
+            // A distance filter or sort only asks when there is no position yet
+            var wanted = clicked || (!current && ((distance != null && distance !== 'all') ||
+                                                  sortBy === 'distance'));
+            if (!wanted) {
+                return [noUpdate, noUpdate];
+            }
+            if (!navigator.geolocation) {
+                return [noUpdate, 'Your browser cannot share its location'];
+            }
+            return new Promise(function (resolve) {
+                navigator.geolocation.getCurrentPosition(function (position) {
+                    resolve([{latitude: position.coords.latitude,
+                              longitude: position.coords.longitude},
+                             'Showing distances from your location']);
+                }, function (error) {
+                    resolve([noUpdate, 'Could not get your location: ' + error.message]);
+                }, {timeout: 10000, maximumAge: 300000});
+            });
+        }
+    }
+});
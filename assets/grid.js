@@ -0,0 +1,162 @@
+// Clientside filtering and sorting of the home page grid for small
+// catalogues. The whole catalogue comes down once in the catalog-data store
+// (the page size and one record per restaurant with its pre-rendered card)
+// and is filtered, sorted and paged here with the same rules as
+// RestaurantIndex.query, so changing a dropdown costs no server round trip.
+// With GRID_PAYLOAD=data the records carry the card's fields instead of the
+// card, and the server-side grid sends pages of such records too; card()
+// builds the same component tree as app.create_restaurant_card from them.
+// Distances are computed step for step like geo.distance_km, so the radius
+// filter and nearest-first order match the server's GeoIndex.
+var KM_PER_DEGREE = Math.PI * 6371.0088 / 180;
+
+// A serialized dash_html_components element
+function htmlComponent(type, children, className, props) {
+    props = Object.assign({children: children}, props);
+    if (className) {
+        props.className = className;
+    }
+    return {type: type, namespace: 'dash_html_components', props: props};
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    grid: {
+        update: function (cuisine, location, price, sortBy, distance, userLocation,
+                          searchMatches, loadMoreClicks, catalog, cursor) {
+            var triggered = window.dash_clientside.callback_context.triggered || [];
+            var loadMore = triggered.some(function (t) {
+                return t.prop_id === 'client-load-more.n_clicks';
+            });
+            var matches = searchMatches ? new Set(searchMatches) : null;
+            var filters = [['cuisine', cuisine], ['location', location], ['price_range', price]];
+            var near = userLocation && typeof userLocation.latitude === 'number' &&
+                       typeof userLocation.longitude === 'number' ? userLocation : null;
+            var radius = near && typeof distance === 'number' ? distance : null;
+            // Squared distances in km, by restaurant id
+            var squared = new Map();
+            if (near) {
+                var kx = KM_PER_DEGREE * Math.cos(near.latitude * (Math.PI / 180));
+                catalog.restaurants.forEach(function (row) {
+                    if (row.latitude != null && row.longitude != null) {
+                        var dx = (row.longitude - near.longitude) * kx;
+                        var dy = (row.latitude - near.latitude) * KM_PER_DEGREE;
+                        squared.set(row.id, dx * dx + dy * dy);
+                    }
+                });
+            }
+            var byDistance = near && sortBy === 'distance';
+            var rows = catalog.restaurants.filter(function (row) {
+                if (matches && !matches.has(row.id)) {
+                    return false;
+                }
+                if ((radius !== null || byDistance) && !squared.has(row.id)) {
+                    return false;
+                }
+                if (radius !== null && squared.get(row.id) > radius * radius) {
+                    return false;
+                }
+                return filters.every(function (filter) {
+                    return filter[1] === 'all' || row[filter[0]] === filter[1];
+                });
+            });
+            var compare = byDistance ? function (a, b) {
+                return squared.get(a.id) - squared.get(b.id) || a.seq - b.seq;
+            } : window.dash_clientside.grid.orders[sortBy];
+            if (compare) {
+                rows.sort(compare);
+            }
+            var total = rows.length;
+            // "Load more" shows the next page as well, anything else starts over
+            var stop = Math.min((loadMore ? cursor || 0 : 0) + catalog.page_size, total);
+            var grid = window.dash_clientside.grid;
+            var cards = rows.slice(0, stop).map(function (row) {
+                var card = row.card || grid.card(row, catalog.image_sizes);
+                return squared.has(row.id) ? grid.withDistance(
+                    card, Math.sqrt(squared.get(row.id))) : card;
+            });
+            var count = total ? 'Showing ' + stop + ' of ' + total + ' restaurants'
+                              : 'No restaurants found';
+            return [cards, count, stop < total ? null : {display: 'none'}, stop];
+        },
+
+        // A page from app.update_grid_page as cards, after the ones on
+        // screen for "Load more"
+        render: function (page, current) {
+            var grid = window.dash_clientside.grid;
+            var cards = page.restaurants.map(function (row) {
+                var card = grid.card(row, page.image_sizes);
+                return row.distance ? grid.withBadge(card, row.distance) : card;
+            });
+            return page.append ? (current || []).concat(cards) : cards;
+        },
+
+        card: function (row, imageSizes) {
+            var image = {alt: row.name, sizes: imageSizes, className: 'card-img-top',
+                         'data-src': row.image.src};
+            if (row.image.srcSet) {
+                image['data-srcset'] = row.image.srcSet;
+            }
+            var stars = [];
+            for (var i = 0; i < 5; i++) {
+                stars.push(i < row.rating ? htmlComponent('Span', '★', 'star filled')
+                                          : htmlComponent('Span', '☆', 'star'));
+            }
+            return htmlComponent('Div', [
+                htmlComponent('Div', [
+                    htmlComponent('Img', null, null, image),
+                    htmlComponent('Div', [
+                        htmlComponent('H5', row.name, 'card-title'),
+                        htmlComponent('P', [
+                            htmlComponent('Span', row.cuisine + ' • ', 'cuisine'),
+                            htmlComponent('Span', row.location + ' • ', 'location'),
+                            htmlComponent('Span', row.price_range, 'price')
+                        ], 'card-subtitle'),
+                        htmlComponent('P', row.description, 'card-text'),
+                        htmlComponent('Div', [
+                            htmlComponent('Div', stars, 'star-rating'),
+                            htmlComponent('Span', ' (' + row.review_count + ' reviews)', 'review-count')
+                        ], 'rating-section'),
+                        htmlComponent('Div', [
+                            htmlComponent('A', 'View Details', 'btn btn-primary btn-sm',
+                                    {href: '/restaurant/' + row.id}),
+                            htmlComponent('A', 'Write Review', 'btn btn-outline-primary btn-sm',
+                                    {href: '/add-review?restaurant_id=' + row.id})
+                        ], 'card-actions')
+                    ], 'card-body')
+                ], 'card restaurant-card')
+            ], 'col-md-6 col-lg-4 mb-4');
+        },
+
+        // The card with a distance badge, as app.add_distance_badge adds it
+        withDistance: function (card, km) {
+            var metres = Math.floor(km * 100 + 0.5) * 10;
+            var text = metres < 1000 ? metres + ' m'
+                                     : (Math.floor(km * 10 + 0.5) / 10).toFixed(1) + ' km';
+            return window.dash_clientside.grid.withBadge(card, text);
+        },
+
+        withBadge: function (card, text) {
+            var badge = htmlComponent('Span', '📍 ' + text, 'distance-badge');
+            var inner = card.props.children[0];
+            inner = Object.assign({}, inner, {props: Object.assign({}, inner.props, {
+                children: [badge].concat(inner.props.children)
+            })});
+            return Object.assign({}, card, {props: Object.assign({}, card.props, {
+                children: [inner]
+            })});
+        },
+
+        // Ties keep catalogue order (seq), and name_desc only reverses the
+        // names, matching the server-side sort keys
+        orders: {
+            rating_desc: function (a, b) { return b.rating - a.rating || a.seq - b.seq; },
+            rating_asc: function (a, b) { return a.rating - b.rating || a.seq - b.seq; },
+            name_asc: function (a, b) {
+                return (a.name < b.name ? -1 : a.name > b.name ? 1 : 0) || a.seq - b.seq;
+            },
+            name_desc: function (a, b) {
+                return (a.name > b.name ? -1 : a.name < b.name ? 1 : 0) || a.seq - b.seq;
+            }
+        }
+    }
+});
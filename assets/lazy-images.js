@@ -0,0 +1,54 @@
+// Lazy loading for images rendered with data-src/data-srcset (see
+// create_card_image in app.py). Sources are moved into src/srcset once an
+// image comes within 200px of the viewport. React reuses <img> elements when
+// the grid changes, so a changed data-src is picked up again as well.
+(function () {
+    function load(img) {
+        if (img.dataset.srcset) {
+            img.srcset = img.dataset.srcset;
+        } else {
+            img.removeAttribute('srcset');
+        }
+        img.src = img.dataset.src;
+    }
+
+    var observer = 'IntersectionObserver' in window ? new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                load(entry.target);
+            }
+        });
+    }, {rootMargin: '200px'}) : null;
+
+    function watch(img) {
+        if (observer) {
+            observer.observe(img);
+        } else {
+            load(img);
+        }
+    }
+
+    new MutationObserver(function (mutations) {
+        mutations.forEach(function (mutation) {
+            if (mutation.type === 'attributes') {
+                watch(mutation.target);
+                return;
+            }
+            mutation.addedNodes.forEach(function (node) {
+                if (node.nodeType !== 1) {
+                    return;
+                }
+                if (node.matches('img[data-src]')) {
+                    watch(node);
+                }
+                node.querySelectorAll('img[data-src]').forEach(watch);
+            });
+        });
+    }).observe(document.documentElement, {
+        childList: true,
+        subtree: true,
+        attributes: true,
+        attributeFilter: ['data-src']
+    });
+})();
@@ -0,0 +1,98 @@
+import argparse
+import random
+import statistics
+import time
+from itertools import islice
+
+from benchmarks.harness import format_summary, peak_rss_mib, summarize, time_calls, write_results
+from benchmarks.synthetic import LOCATION_CENTERS, generate_restaurants
+from geo import GeoIndex, distance_km
+
+RADII_KM = (0.5, 1, 2)
+# Linear scans are slow on big catalogues, so only this many are timed
+SCAN_ITERATIONS = 20
+
+
+# Times GeoIndex "near me" queries on catalogues of increasing size: the k
+# nearest restaurants, the first page within a radius with its total (what
+# the home page grid asks for), everything within a radius, and a linear
+# scan for comparison. Query points are scattered around the neighbourhood
+# centres, where the restaurants are densest.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the geospatial index")
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help="comma-separated restaurant counts")
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--cell-km', type=float, help="grid cell size (default: GeoIndex's)")
+    parser.add_argument('--budget-ms', type=float, default=1.0,
+                        help="fail if the p95 of the 12 nearest on the largest catalogue exceeds this")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        points = [(restaurant['latitude'], restaurant['longitude'])
+                  for restaurant in generate_restaurants(size)]
+        start = time.perf_counter()
+        index = GeoIndex() if args.cell_km is None else GeoIndex(args.cell_km)
+        for i, (latitude, longitude) in enumerate(points):
+            index.add(str(i + 1), latitude, longitude)
+        build_seconds = time.perf_counter() - start
+        print(f"{size} restaurants indexed in {build_seconds:.2f}s")
+        timings, counts = _run(index, points, args.iterations)
+        for name, summary in timings.items():
+            found = f"  ({counts[name]:.0f} found)" if name in counts else ''
+            print(f"  {name:26} {format_summary(summary)}{found}")
+        results.append({'restaurants': size, 'build_seconds': round(build_seconds, 2),
+                        'timings': timings, 'mean_found': counts,
+                        'peak_rss_mib': peak_rss_mib()})
+    if args.output:
+        write_results(args.output, 'geo', vars(args), results)
+
+    p95 = results[-1]['timings']['nearest 12']['p95_ms']
+    if p95 > args.budget_ms:
+        raise SystemExit(f"nearest 12 p95 {p95:.3f}ms is over the {args.budget_ms}ms budget")
+
+
+def _run(index, points, iterations):
+    rng = random.Random(0)
+    centers = list(LOCATION_CENTERS.values())
+    queries = []
+    for _ in range(iterations):
+        latitude, longitude = rng.choice(centers)
+        queries.append((latitude + rng.uniform(-0.02, 0.02), longitude + rng.uniform(-0.02, 0.02)))
+
+    found = {}
+
+    def within(radius):
+        def query(i):
+            found.setdefault(f"within {radius} km", []).append(
+                len(index.within(*queries[i], radius)))
+        return query
+
+    def page_within(radius):
+        def query(i):
+            list(islice(index.nearest(*queries[i], radius), 12))
+            index.count_within(*queries[i], radius)
+        return query
+
+    def scan(i):
+        latitude, longitude = queries[i]
+        sorted((distance_km(latitude, longitude, *point), n) for n, point in enumerate(points))[:12]
+
+    timings = {
+        'nearest 12': lambda i: list(islice(index.nearest(*queries[i]), 12)),
+        'nearest 100': lambda i: list(islice(index.nearest(*queries[i]), 100)),
+    }
+    timings.update((f"first 12 within {radius} km", page_within(radius)) for radius in RADII_KM)
+    timings.update((f"within {radius} km", within(radius)) for radius in RADII_KM)
+    summaries = {}
+    for name, fn in timings.items():
+        fn(0)
+        summaries[name] = summarize(time_calls(fn, iterations))
+    summaries['linear scan nearest 12'] = summarize(time_calls(scan, min(iterations, SCAN_ITERATIONS)))
+    return summaries, {name: statistics.fmean(counts) for name, counts in found.items()}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import datetime
+import os
+import random
+import tempfile
+
+from benchmarks.harness import (build_repository, format_summary, peak_rss_mib, summarize, time_calls,
+                                write_results)
+from benchmarks.synthetic import CUISINES, LOCATIONS, generate_reviews
+from store import LEADERBOARDS, bayesian_average
+
+# Reviews dated in the last week added on top of the catalogue, so the
+# trending board has something to rank
+RECENT_REVIEWS = 5000
+# Sorting the whole catalogue is slow, so only this many are timed
+SORT_ITERATIONS = 20
+
+
+# Times reading the top 10 of each leaderboard (overall, for a cuisine and
+# for a cuisine in a location) on catalogues of increasing size in either
+# backend, and adding one review, which has to keep the boards up to date.
+# Sorting every restaurant by its Bayesian average is timed for comparison.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the leaderboards")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma-separated restaurant counts")
+    parser.add_argument('--reviews-per-restaurant', type=int, default=20)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(size) for size in args.sizes.split(',')):
+            repository = build_repository(size, size * args.reviews_per_restaurant, args.backend,
+                                          os.path.join(directory, f'{size}.db'))
+            repository.add_reviews(_recent_reviews(size))
+            print(f"{size} restaurants ({args.backend})")
+            timings = _run(repository, size, args.iterations)
+            for name, summary in timings.items():
+                print(f"  {name:44} {format_summary(summary)}")
+            results.append({'restaurants': size, 'timings': timings, 'peak_rss_mib': peak_rss_mib()})
+    if args.output:
+        write_results(args.output, 'leaderboards', vars(args), results)
+
+
+def _recent_reviews(restaurant_count):
+    today = datetime.date.today()
+    reviews = []
+    for i, review in enumerate(generate_reviews(RECENT_REVIEWS, restaurant_count, seed=2)):
+        review['id'] = f'recent-{i}'
+        review['date'] = (today - datetime.timedelta(days=i % 7)).isoformat()
+        reviews.append(review)
+    return reviews
+
+
+def _run(repository, size, iterations):
+    rng = random.Random(0)
+    scopes = {
+        'overall': lambda: ('all', 'all'),
+        'cuisine': lambda: (rng.choice(CUISINES), 'all'),
+        'cuisine and location': lambda: (rng.choice(CUISINES), rng.choice(LOCATIONS)),
+    }
+    timings = {}
+    for board in LEADERBOARDS:
+        for scope, pick in scopes.items():
+            def read(i, board=board, pick=pick):
+                repository.leaderboard(board, *pick())
+            read(0)
+            timings[f"{board} top 10, {scope}"] = summarize(time_calls(read, iterations))
+
+    reviews = list(generate_reviews(iterations, size, seed=3))
+    today = datetime.date.today().isoformat()
+
+    def add_review(i):
+        repository.add_reviews([dict(reviews[i], id=f'bench-{i}', date=today)])
+    timings['add one review'] = summarize(time_calls(add_review, iterations))
+
+    def sort_all(i):
+        stats = [(repository.get_rating_stats(restaurant['id']), restaurant['id'])
+                 for restaurant in repository.list_restaurants()]
+        sorted((-bayesian_average(stat), restaurant_id) for stat, restaurant_id in stats
+               if stat.count)[:10]
+    timings['sort all, top rated'] = summarize(time_calls(sort_all, min(iterations, SORT_ITERATIONS)))
+    return timings
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.synthetic import generate_restaurants, generate_reviews
+from repository import InMemoryRepository
+from store import ReviewColumns, ReviewIndex
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def _columns(reviews):
+    columns = ReviewColumns()
+    for review in reviews:
+        columns.append(review)
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory use of review representations")
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=1000000)
+    args = parser.parse_args()
+
+    def reviews():
+        return generate_reviews(args.reviews, args.restaurants)
+
+    restaurants = list(generate_restaurants(args.restaurants))
+    results = [
+        ("list of dicts (original)", _measure(lambda: list(reviews()))[1]),
+        ("ReviewColumns", _measure(lambda: _columns(reviews()))[1]),
+        ("ReviewIndex (columns + sort orders)", _measure(lambda: ReviewIndex(reviews()))[1]),
+        ("InMemoryRepository (everything)",
+         _measure(lambda: InMemoryRepository(restaurants, reviews()))[1]),
+    ]
+    baseline = results[0][1]
+    print(f"{args.reviews} reviews over {args.restaurants} restaurants")
+    for name, size in results:
+        print(f"{name:38} {size / 2**20:9.1f} MiB  {size / args.reviews:7.1f} B/review  "
+              f"{size / baseline:6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.harness import (build_repository, format_summary, peak_rss_mib, summarize, time_calls,
+                                write_results)
+from benchmarks.synthetic import generate_reviews
+from moderation import Moderator, analyze, backfill
+from review_writer import ReviewWriter
+
+
+# Times review moderation: analyzing one review, the submit() call a
+# request thread makes (which must stay in the microseconds), reviews
+# going from submit() to published through the write-behind queue, and a
+# backfill of the whole catalogue with each number of worker processes.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the review moderation pipeline")
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=200000)
+    parser.add_argument('--submitted', type=int, default=20000,
+                        help="reviews pushed through the review writer")
+    parser.add_argument('--workers', default=f"1,{os.cpu_count()}",
+                        help="comma-separated worker process counts for the backfill")
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        repository = build_repository(args.restaurants, args.reviews, 'sqlite',
+                                      os.path.join(directory, 'bench.db'))
+        reviews = list(generate_reviews(args.submitted, args.restaurants, seed=1))
+        timings = {
+            'analyze': summarize(time_calls(lambda i: analyze(reviews[i % len(reviews)]), 10000)),
+        }
+        writer = ReviewWriter(repository, Moderator(repository), max_pending=len(reviews))
+        fresh = iter([dict(review, id=f"bench-{review['id']}") for review in reviews])
+        start = time.perf_counter()
+        timings['submit'] = summarize(time_calls(lambda i: writer.submit(next(fresh)), len(reviews)))
+        writer.flush()
+        published = len(reviews) / (time.perf_counter() - start)
+        print(f"{len(reviews)} reviews submitted and published at {published:,.0f} reviews/s "
+              f"({writer.written} written, {writer.flagged} held back)")
+        for name, summary in timings.items():
+            print(f"  {name:10} {format_summary(summary)}")
+
+        backfills = {}
+        for workers in (int(workers) for workers in args.workers.split(',')):
+            # Start each run from unmoderated reviews
+            with repository._connect() as conn:
+                conn.execute("UPDATE reviews SET sentiment = NULL, text_hash = NULL")
+            start = time.perf_counter()
+            moderator, done = backfill(repository, workers, args.batch_size)
+            seconds = time.perf_counter() - start
+            backfills[workers] = round(done / seconds)
+            print(f"backfill with {workers} worker(s): {done} reviews in {seconds:.1f}s "
+                  f"({done / seconds:,.0f} reviews/s), {sum(moderator.rejected.values())} rejected")
+
+    if args.output:
+        write_results(args.output, 'moderation', vars(args), [{
+            'restaurants': args.restaurants, 'timings': timings,
+            'published_per_second': round(published), 'backfill_per_second': backfills,
+            'peak_rss_mib': peak_rss_mib()}])
+
+
+if __name__ == '__main__':
+    main()
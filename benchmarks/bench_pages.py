@@ -0,0 +1,109 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import app
+from benchmarks.harness import (build_repository, callback_context, format_summary,
+                                install_repository, peak_rss_mib, summarize, time_calls,
+                                write_results)
+from benchmarks.synthetic import CUISINES, LOCATION_CENTERS, LOCATIONS, PRICE_RANGES
+
+SORT_ORDERS = ['rating_desc', 'rating_asc', 'name_asc', 'name_desc']
+SEARCHES = [None, None, None, 'pizza', 'spicy curry', 'fresh sus']
+
+
+# Times the page builders and callbacks directly, without HTTP, for
+# catalogues of increasing size. "cold" runs clear the fragment cache first.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page builders and callbacks")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma-separated restaurant counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument('--reviews-per-restaurant', type=int, default=10)
+    parser.add_argument('--max-reviews', type=int, default=10000000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        review_count = min(size * args.reviews_per_restaurant, args.max_reviews)
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            repository = build_repository(size, review_count, args.backend,
+                                          os.path.join(directory, 'bench.db'))
+            load_seconds = time.perf_counter() - start
+            print(f"{size} restaurants / {review_count} reviews ({args.backend}) "
+                  f"loaded in {load_seconds:.1f}s")
+            install_repository(app, repository)
+            timings = _run(size, args.iterations)
+        for name, summary in timings.items():
+            print(f"  {name:38} {format_summary(summary)}")
+        results.append({'restaurants': size, 'reviews': review_count,
+                        'load_seconds': round(load_seconds, 2), 'timings': timings,
+                        'peak_rss_mib': peak_rss_mib()})
+    if args.output:
+        write_results(args.output, 'pages', vars(args), results)
+
+
+def _run(size, iterations):
+    rng = random.Random(0)
+    ids = [str(rng.randint(1, size)) for _ in range(iterations)]
+    filters = [(rng.choice(['all'] + CUISINES), rng.choice(['all', 'all'] + LOCATIONS),
+                rng.choice(['all', 'all'] + PRICE_RANGES), rng.choice(SORT_ORDERS),
+                rng.choice(SEARCHES)) for _ in range(iterations)]
+    # "Near me" searches from around the neighbourhood centres, within a
+    # radius or nearest first
+    points = [(rng.choice(list(LOCATION_CENTERS.values())), rng.choice(app.DISTANCE_CHOICES),
+               rng.choice(['distance', 'rating_desc'])) for _ in range(iterations)]
+
+    def cold(fn):
+        def call(i):
+            app.fragment_cache.clear()
+            fn(i)
+        return call
+
+    def grid(i, triggered='cuisine-filter', cursor=0):
+        cuisine, location, price, sort_by, search = filters[i]
+        with callback_context(triggered):
+            app.update_restaurants_grid(cuisine, location, price, sort_by, 'all', None, search,
+                                        None, None, cursor)
+
+    def load_more(i):
+        grid(i, 'load-more', app.GRID_PAGE_SIZE)
+
+    def near_me(i, radius=True):
+        (latitude, longitude), distance, sort_by = points[i]
+        with callback_context('distance-filter'):
+            app.update_restaurants_grid('all', 'all', 'all', sort_by if radius else 'distance',
+                                        distance if radius else 'all',
+                                        {'latitude': latitude, 'longitude': longitude},
+                                        None, None, None, 0)
+
+    timings = {
+        'calculate_average_rating': lambda i: app.calculate_average_rating(ids[i]),
+        'create_restaurant_detail_page': lambda i: app.create_restaurant_detail_page(ids[i]),
+        'display_page home (cold)': cold(lambda i: app.display_page('/', '')),
+        'display_page home (warm)': lambda i: app.display_page('/', ''),
+        'display_page restaurant (cold)': cold(lambda i: app.display_page(f'/restaurant/{ids[i]}', '')),
+        'display_page restaurant (warm)': lambda i: app.display_page(f'/restaurant/{ids[0]}', ''),
+        'update_restaurants_grid (cold)': cold(grid),
+        'update_restaurants_grid (warm)': grid,
+        'update_restaurants_grid load more': load_more,
+        'update_restaurants_grid within radius': near_me,
+        'update_restaurants_grid nearest first': lambda i: near_me(i, radius=False),
+        'update_analytics (monthly)': lambda i: app.update_analytics(
+            filters[i][0], 'all', 'location', 'M'),
+    }
+    results = {}
+    for name, fn in timings.items():
+        # One untimed call, so warm runs start warm
+        fn(0)
+        results[name] = summarize(time_calls(fn, iterations))
+    return results
+
+
+if __name__ == '__main__':
+    main()
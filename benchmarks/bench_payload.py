@@ -0,0 +1,116 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+
+import app
+from benchmarks.harness import (build_repository, format_summary, install_repository, peak_rss_mib,
+                                summarize, time_calls, write_results)
+from benchmarks.load_test import callback_body
+from benchmarks.synthetic import CUISINES, LOCATIONS, PRICE_RANGES
+from cache import LRUCache
+
+SORT_ORDERS = ['rating_desc', 'rating_asc', 'name_asc', 'name_desc']
+ENCODINGS = {'identity': 'identity', 'gzip': 'gzip', 'br': 'gzip, deflate, br'}
+
+
+# Sends grid callbacks through a Flask test client in both GRID_PAYLOAD
+# modes, accepting no compression, gzip or brotli, and reports the bytes
+# sent and the latency, compression included. Covers a filter change, a
+# "Load more" and the home page with the whole catalogue in it (the
+# clientside grid, for a catalogue of --catalogue restaurants). The
+# response cache and the cache of compressed bodies are off, so every
+# request is built and compressed.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark grid payload sizes and compression")
+    parser.add_argument('--sizes', default='10000', help="comma-separated restaurant counts")
+    parser.add_argument('--reviews-per-restaurant', type=int, default=10)
+    parser.add_argument('--catalogue', type=int, default=app.CLIENTSIDE_GRID_LIMIT,
+                        help="restaurants in the clientside catalogue")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    app.response_cache.backend = None
+    app.rate_limiter.limits = dict.fromkeys(app.rate_limiter.limits, (0, 0))
+    app.response_compression.cache = LRUCache(0)
+    results = []
+    sizes = [(int(size), False) for size in args.sizes.split(',')] + [(args.catalogue, True)]
+    for size, clientside in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            install_repository(app, build_repository(size, size * args.reviews_per_restaurant,
+                                                     'memory', os.path.join(directory, 'bench.db')))
+            app.CLIENTSIDE_GRID_LIMIT = size if clientside else 0
+            print(f"{size} restaurants" + (" (clientside catalogue)" if clientside else ""))
+            timings, sizes_sent = _run(args.iterations if not clientside else 20, clientside)
+        for name, summary in timings.items():
+            print(f"  {name:36} {format_summary(summary)}  {sizes_sent[name]:>10,.0f} bytes")
+        results.append({'restaurants': size, 'clientside': clientside, 'timings': timings,
+                        'bytes': sizes_sent, 'peak_rss_mib': peak_rss_mib()})
+    if args.output:
+        write_results(args.output, 'payload', vars(args), results)
+
+
+def _run(iterations, clientside):
+    rng = random.Random(0)
+    client = app.app.server.test_client()
+    filters = [(rng.choice(['all'] + CUISINES), rng.choice(['all', 'all'] + LOCATIONS),
+                rng.choice(['all', 'all'] + PRICE_RANGES), rng.choice(SORT_ORDERS))
+               for _ in range(iterations)]
+    cursors = [app.GRID_PAGE_SIZE * rng.randint(1, 5) for _ in range(iterations)]
+    timings, sizes_sent = {}, {}
+    for payload in ('components', 'data'):
+        app.GRID_PAYLOAD = payload
+        app.fragment_cache.clear()
+        if clientside:
+            scenarios = {'home page': lambda i: callback_body(
+                ['page-content.children'], [('url', 'pathname', '/')], [('url', 'search', '')],
+                ['url.pathname'])}
+        else:
+            scenarios = {
+                'filter change': lambda i: _grid_body(payload, filters[i], None),
+                'load more': lambda i: _grid_body(payload, filters[i], cursors[i]),
+            }
+        for scenario, build in scenarios.items():
+            # Warm the fragment cache, so each encoding sees the same cards
+            for i in range(iterations):
+                client.post('/_dash-update-component', json=build(i))
+            for encoding, accept in ENCODINGS.items():
+                name = f"{scenario}, {payload}, {encoding}"
+                sent = []
+
+                def request(i):
+                    response = client.post('/_dash-update-component', json=build(i),
+                                           headers={'Accept-Encoding': accept})
+                    assert response.status_code == 200, response.status_code
+                    sent.append(len(response.get_data()))
+                timings[name] = summarize(time_calls(request, iterations))
+                sizes_sent[name] = statistics.fmean(sent)
+    return timings, sizes_sent
+
+
+# A grid callback as dash-renderer sends it for either payload mode; a
+# cursor makes it a "Load more"
+def _grid_body(payload, filters, cursor):
+    prefix, output = ('data-', 'data-grid-page.data') if payload == 'data' else \
+        ('', 'restaurants-grid.children')
+    cuisine, location, price, sort_by = filters
+    return callback_body(
+        [output, f'{prefix}results-count.children', f'{prefix}load-more-section.style',
+         f'{prefix}grid-cursor.data'],
+        [('cuisine-filter', 'value', cuisine),
+         ('location-filter', 'value', location),
+         ('price-filter', 'value', price),
+         ('sort-filter', 'value', sort_by),
+         ('distance-filter', 'value', 'all'),
+         ('user-location', 'data', None),
+         ('search-input', 'value', None),
+         ('search-button', 'n_clicks', None),
+         (f'{prefix}load-more', 'n_clicks', 1 if cursor else None)],
+        [(f'{prefix}grid-cursor', 'data', cursor or 0)],
+        [f'{prefix}load-more.n_clicks' if cursor else 'cuisine-filter.value'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import statistics
+import time
+
+from benchmarks.harness import percentile
+from benchmarks.synthetic import generate_restaurants, generate_reviews
+from search import SearchIndex
+
+# Queries typed one keystroke at a time, the way the hero search box sees them
+QUERIES = ['pizza', 'spicy curry', 'fresh sushi chef', 'kalo', 'cozy wine bar', 'zzzz']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the restaurant search index")
+    parser.add_argument('--restaurants', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=1000000)
+    parser.add_argument('--budget-ms', type=float, default=5.0,
+                        help="fail if the p95 keystroke latency exceeds this")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    for restaurant in generate_restaurants(args.restaurants):
+        index.add_restaurant(restaurant)
+    for review in generate_reviews(args.reviews, args.restaurants):
+        index.add_review(review)
+    print(f"indexed {args.restaurants} restaurants / {args.reviews} reviews "
+          f"({len(index)} words) in {time.perf_counter() - start:.1f}s")
+
+    # The first pass also builds the cached bitmaps of common words
+    cold = _type_queries(index, verbose=False)
+    warm = _type_queries(index, verbose=True)
+    print(f"cold keystrokes: {_summary(cold)}")
+    print(f"warm keystrokes: {_summary(warm)}")
+    p95 = percentile(warm, 0.95)
+    if p95 > args.budget_ms:
+        raise SystemExit(f"warm p95 {p95:.2f}ms is over the {args.budget_ms}ms budget")
+
+
+def _type_queries(index, verbose):
+    latencies = []
+    for query in QUERIES:
+        for end in range(1, len(query) + 1):
+            start = time.perf_counter()
+            matches = index.search(query[:end])
+            elapsed = (time.perf_counter() - start) * 1000
+            latencies.append(elapsed)
+        if verbose:
+            print(f"{query!r:22} {len(matches or ()):>8} matches  last keystroke {elapsed:.2f}ms")
+    return latencies
+
+
+def _summary(latencies):
+    return (f"{len(latencies)}  p50 {statistics.median(latencies):.2f}ms  "
+            f"p95 {percentile(latencies, 0.95):.2f}ms  max {max(latencies):.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
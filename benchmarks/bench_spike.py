@@ -0,0 +1,118 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import app
+from benchmarks.harness import (build_repository, format_summary, install_repository, peak_rss_mib,
+                                summarize, write_results)
+from benchmarks.load_test import callback_body
+from benchmarks.synthetic import CUISINES, LOCATIONS, PRICE_RANGES
+
+SORT_ORDERS = ['rating_desc', 'rating_asc', 'name_asc', 'name_desc']
+
+
+# A traffic spike: --threads clients send the same request at the same
+# moment, for a restaurant page and a grid page nobody has asked for yet,
+# over --rounds rounds. Run with request coalescing and without it (each
+# request builds its own answer), reporting the latencies, the wall time of
+# a round, and how many times per round the callback ran and a page
+# fragment was built.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark request coalescing under a spike")
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='sqlite')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        install_repository(app, build_repository(args.restaurants, args.reviews, args.backend,
+                                                 os.path.join(directory, 'bench.db')))
+        # Every thread posts from the same address; the limits are per client
+        app.rate_limiter.limits = dict.fromkeys(app.rate_limiter.limits, (0, 0))
+        timings = {}
+        for coalescing in (True, False):
+            mode = 'coalesced' if coalescing else 'separate'
+            if not coalescing:
+                app.fragment_cache._flights.do = lambda key, fn: fn()
+                app.response_cache._wait_for = lambda key: None
+            for scenario, build in (('restaurant page', _restaurant_page), ('grid', _grid)):
+                app.response_cache.backend.clear()
+                app.fragment_cache.clear()
+                latencies, rounds, runs, builds = _run(args, build, random.Random(0))
+                name = f"{scenario}, {mode}"
+                timings[name] = summarize(latencies)
+                timings[f"{name} round"] = summarize(rounds)
+                print(f"{name}: {runs / args.rounds:.1f} callback runs and "
+                      f"{builds / args.rounds:.1f} fragment builds per round")
+                print(f"  request {format_summary(timings[name])}")
+                print(f"  round   {format_summary(timings[f'{name} round'])}")
+
+    if args.output:
+        write_results(args.output, 'spike', vars(args), [{
+            'restaurants': args.restaurants, 'timings': timings, 'peak_rss_mib': peak_rss_mib()}])
+
+
+def _run(args, build, rng):
+    latencies, rounds = [], []
+    runs_before = app.response_cache.misses
+    builds_before = app.fragment_cache.misses - app.fragment_cache.coalesced
+    for _ in range(args.rounds):
+        body = build(rng, args.restaurants)
+        barrier = threading.Barrier(args.threads + 1)
+        own = []
+        lock = threading.Lock()
+
+        def worker():
+            client = app.app.server.test_client()
+            barrier.wait()
+            start = time.perf_counter()
+            response = client.post('/_dash-update-component', json=body)
+            assert response.status_code == 200, response.status_code
+            with lock:
+                own.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        rounds.append((time.perf_counter() - start) * 1000)
+        latencies.extend(own)
+    runs = app.response_cache.misses - runs_before
+    builds = app.fragment_cache.misses - app.fragment_cache.coalesced - builds_before
+    return latencies, rounds, runs, builds
+
+
+def _restaurant_page(rng, restaurant_count):
+    return callback_body(['page-content.children'],
+                         [('url', 'pathname', f"/restaurant/{rng.randint(1, restaurant_count)}")],
+                         [('url', 'search', '')], ['url.pathname'])
+
+
+def _grid(rng, restaurant_count):
+    return callback_body(
+        ['restaurants-grid.children', 'results-count.children', 'load-more-section.style',
+         'grid-cursor.data'],
+        [('cuisine-filter', 'value', rng.choice(['all'] + CUISINES)),
+         ('location-filter', 'value', rng.choice(['all'] + LOCATIONS)),
+         ('price-filter', 'value', rng.choice(['all'] + PRICE_RANGES)),
+         ('sort-filter', 'value', rng.choice(SORT_ORDERS)),
+         ('distance-filter', 'value', 'all'),
+         ('user-location', 'data', None),
+         ('search-input', 'value', None),
+         ('search-button', 'n_clicks', None),
+         ('load-more', 'n_clicks', None)],
+        [('grid-cursor', 'data', 0)],
+        ['cuisine-filter.value'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import write_results
+
+# Modules only some features need. A worker that imports the app must not
+# have loaded any of them.
+DEFERRED_MODULES = ['pandas', 'plotly.express', 'plotly.graph_objects', 'pyarrow']
+
+# Run in a fresh interpreter: imports the app and reports how long that
+# took, the peak RSS and which of the deferred modules got loaded
+_PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'seconds': seconds,
+    'peak_rss_mib': peak / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    'loaded': [name for name in {deferred!r} if name in sys.modules],
+}}))
+'''
+
+
+# Cold-start cost of a worker: the time to import the app in a new
+# interpreter and the memory it holds afterwards, over several runs, plus
+# the slowest imports from python -X importtime. Fails if the median import
+# time or peak RSS is over budget, or if a deferred module was imported.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app startup time and memory")
+    parser.add_argument('--module', default='app', help="module to import (default: app)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    parser.add_argument('--budget-ms', type=float, default=1000.0,
+                        help="fail if the median import time exceeds this")
+    parser.add_argument('--budget-rss-mib', type=float, default=90.0,
+                        help="fail if the median peak RSS exceeds this")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    # The in-memory sample data, so the database size does not count
+    env = dict(os.environ, RESTAURANT_DB='')
+    probe = _PROBE.format(module=args.module, deferred=DEFERRED_MODULES)
+    runs = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, '-c', probe], env=env, capture_output=True,
+                                text=True, check=True)
+        runs.append(json.loads(result.stdout.splitlines()[-1]))
+
+    importtime = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {args.module}'],
+                                env=env, capture_output=True, text=True, check=True).stderr
+    slowest = sorted(_parse_importtime(importtime), key=lambda entry: -entry[1])[:args.top]
+
+    seconds = statistics.median(run['seconds'] for run in runs)
+    peak_rss = statistics.median(run['peak_rss_mib'] for run in runs)
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    print(f"import {args.module}: median {seconds * 1000:.0f}ms over {args.runs} runs "
+          f"(min {min(run['seconds'] for run in runs) * 1000:.0f}ms), peak RSS {peak_rss:.1f} MiB")
+    print("slowest imports (cumulative):")
+    for name, cumulative in slowest:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+    if args.output:
+        write_results(args.output, 'startup', vars(args), {
+            'import_ms': round(seconds * 1000, 1),
+            'peak_rss_mib': round(peak_rss, 1),
+            'deferred_modules_loaded': loaded,
+            'slowest_imports_ms': {name: round(cumulative / 1000, 1) for name, cumulative in slowest},
+        })
+
+    failures = []
+    if loaded:
+        failures.append(f"deferred modules imported at startup: {', '.join(loaded)}")
+    if seconds * 1000 > args.budget_ms:
+        failures.append(f"median import time {seconds * 1000:.0f}ms is over the "
+                        f"{args.budget_ms:.0f}ms budget")
+    if peak_rss > args.budget_rss_mib:
+        failures.append(f"peak RSS {peak_rss:.1f} MiB is over the {args.budget_rss_mib:.0f} MiB budget")
+    if failures:
+        raise SystemExit('\n'.join(failures))
+
+
+# Yields (module, cumulative microseconds) from -X importtime output
+def _parse_importtime(output):
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        yield name.strip(), int(cumulative)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+
+# Latency statistics compared between runs
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+# Compares two results files written with --output by bench_pages,
+# load_test or bench_startup, e.g. one from main and one from a branch, and exits non-zero
+# if any latency got worse by more than the threshold
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="percentage slowdown reported as a regression")
+    args = parser.parse_args()
+
+    baseline, candidate = _load(args.baseline), _load(args.candidate)
+    if baseline['benchmark'] != candidate['benchmark']:
+        raise SystemExit(f"cannot compare {baseline['benchmark']} with {candidate['benchmark']} results")
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    if baseline['benchmark'] == 'startup':
+        return _compare_startup(baseline['results'], candidate['results'], args.threshold)
+    regressions = 0
+    old_timings, new_timings = _timings(baseline), _timings(candidate)
+    for name, new in new_timings.items():
+        old = old_timings.get(name)
+        if old is None:
+            continue
+        changes = []
+        for stat in COMPARED:
+            change = (new[stat] - old[stat]) / old[stat] * 100 if old[stat] else 0.0
+            flag = ''
+            if change > args.threshold:
+                regressions += 1
+                flag = ' !'
+            changes.append(f"{stat[:3]} {old[stat]:8.3f} -> {new[stat]:8.3f}ms ({change:+6.1f}%){flag}")
+        print(f"{name:50} " + '  '.join(changes))
+    if regressions:
+        raise SystemExit(f"{regressions} latencies regressed by more than {args.threshold}%")
+
+
+def _compare_startup(old, new, threshold):
+    regressions = 0
+    for key, unit in (('import_ms', 'ms'), ('peak_rss_mib', ' MiB')):
+        change = (new[key] - old[key]) / old[key] * 100
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = ' !'
+        print(f"{key:14} {old[key]:8.1f} -> {new[key]:8.1f}{unit} ({change:+6.1f}%){flag}")
+    if regressions:
+        raise SystemExit(f"{regressions} startup costs regressed by more than {threshold}%")
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# {name: summary} for every latency summary in a results file
+def _timings(document):
+    results = document['results']
+    if document['benchmark'] == 'load_test':
+        return results['latency']
+    return {f"{result['restaurants']} restaurants: {name}": summary
+            for result in results for name, summary in result['timings'].items()}
+
+
+if __name__ == '__main__':
+    main()
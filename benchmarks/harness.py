@@ -0,0 +1,122 @@
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+from benchmarks.synthetic import generate_restaurants, generate_reviews
+from repository import InMemoryRepository, SQLiteRepository
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+
+# Latencies in milliseconds summarized the way every benchmark reports them
+def summarize(latencies):
+    return {
+        'count': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies), 4),
+        'p50_ms': round(statistics.median(latencies), 4),
+        'p95_ms': round(percentile(latencies, 0.95), 4),
+        'p99_ms': round(percentile(latencies, 0.99), 4),
+        'max_ms': round(max(latencies), 4),
+    }
+
+
+def format_summary(summary):
+    return (f"{summary['count']:>6}  p50 {summary['p50_ms']:8.3f}ms  p95 {summary['p95_ms']:8.3f}ms  "
+            f"p99 {summary['p99_ms']:8.3f}ms  max {summary['max_ms']:8.3f}ms")
+
+
+# Calls fn(i) for i in range(iterations), returning each call's latency in ms
+def time_calls(fn, iterations):
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+# Synthetic catalogue in the chosen backend. SQLite databases are bulk
+# loaded into path, which must not exist yet.
+def build_repository(restaurant_count, review_count, backend='memory', path=None):
+    restaurants = generate_restaurants(restaurant_count)
+    reviews = generate_reviews(review_count, restaurant_count)
+    if backend == 'memory':
+        return InMemoryRepository(restaurants, reviews)
+    repository = SQLiteRepository(path)
+    with repository.bulk_load():
+        repository.bulk_insert_restaurants(restaurants)
+        chunk = []
+        for review in reviews:
+            chunk.append(review)
+            if len(chunk) == 50000:
+                repository.bulk_insert_reviews(chunk)
+                chunk = []
+        repository.bulk_insert_reviews(chunk)
+    return repository
+
+
+# Points the app module's repository and caches at repository, so the page
+# builders and callbacks run against the synthetic catalogue
+def install_repository(app, repository):
+    app.repository = repository
+    app.review_writer.repository = repository
+    app.review_writer.moderator.repository = repository
+    if app.response_cache.backend is not None:
+        app.response_cache.backend.clear()
+    app.fragment_cache.clear()
+
+
+# Makes dash.ctx report triggered_id while a callback function is called
+# directly rather than through the Dash endpoint
+@contextmanager
+def callback_context(triggered_id, prop='value'):
+    token = context_value.set(AttributeDict(
+        triggered_inputs=[{'prop_id': f"{triggered_id}.{prop}", 'value': None}]))
+    try:
+        yield
+    finally:
+        context_value.reset(token)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Writes results with enough context (commit, machine, parameters) to
+# compare runs later with benchmarks.compare
+def write_results(path, benchmark, parameters, results):
+    document = {
+        'benchmark': benchmark,
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        'parameters': parameters,
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    print(f"results written to {path}")
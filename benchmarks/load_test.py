@@ -0,0 +1,248 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import app
+from benchmarks.harness import (build_repository, format_summary, install_repository,
+                                peak_rss_mib, summarize, write_results)
+from benchmarks.synthetic import CUISINES, LOCATION_CENTERS, LOCATIONS, PRICE_RANGES
+
+SORT_ORDERS = ['rating_desc', 'rating_asc', 'name_asc', 'name_desc']
+SEARCHES = ['pizza', 'spicy curry', 'fresh sus', 'kalo', 'cozy wine bar']
+
+# Share of each request type in the mix, roughly what a browsing session sends
+REQUEST_MIX = {
+    'grid': 35,
+    'nearby': 5,
+    'page': 25,
+    'reviews': 15,
+    'search': 10,
+    'restaurant_options': 5,
+    'submit_review': 5,
+}
+
+
+# Sends a mix of callback requests to /_dash-update-component through Flask
+# test clients, one per thread, so the whole request path (routing, JSON,
+# the response cache) is measured without a network in between
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Dash callback endpoint")
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--requests', type=int, default=5000, help="total requests")
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-response-cache', action='store_true',
+                        help="bypass the response cache")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        repository = build_repository(args.restaurants, args.reviews, args.backend,
+                                      os.path.join(directory, 'bench.db'))
+        install_repository(app, repository)
+        # Every thread posts from the same address; the limits are per client
+        app.rate_limiter.limits = dict.fromkeys(app.rate_limiter.limits, (0, 0))
+        if args.no_response_cache:
+            app.response_cache.backend = None
+        results = _run(args)
+        app.review_writer.flush()
+
+    print(f"{args.requests} requests, {args.threads} threads: "
+          f"{results['throughput_rps']:,.0f} requests/s, "
+          f"{results['errors']} errors, peak RSS {results['peak_rss_mib']} MiB")
+    for name, summary in results['latency'].items():
+        print(f"  {name:20} {format_summary(summary)}")
+    if args.output:
+        write_results(args.output, 'load_test', vars(args), results)
+
+
+def _run(args):
+    requests_per_thread = args.requests // args.threads
+    latencies = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads + 1)
+
+    def worker(number):
+        rng = random.Random(args.seed * 1000 + number)
+        client = app.app.server.test_client()
+        kinds = rng.choices(list(REQUEST_MIX), weights=list(REQUEST_MIX.values()),
+                            k=requests_per_thread)
+        own = defaultdict(list)
+        failed = 0
+        barrier.wait()
+        for kind in kinds:
+            body = REQUEST_BUILDERS[kind](rng, args.restaurants)
+            start = time.perf_counter()
+            response = client.post('/_dash-update-component', json=body)
+            own[kind].append((time.perf_counter() - start) * 1000)
+            # 204 is a PreventUpdate
+            if response.status_code not in (200, 204):
+                failed += 1
+        with lock:
+            for kind, values in own.items():
+                latencies[kind].extend(values)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    every = [latency for values in latencies.values() for latency in values]
+    latency = {'all': summarize(every)}
+    latency.update((kind, summarize(latencies[kind])) for kind in REQUEST_MIX if latencies[kind])
+    return {
+        'requests': len(every),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(every) / elapsed, 1),
+        'errors': sum(errors),
+        'latency': latency,
+        'response_cache': {'hits': app.response_cache.hits, 'misses': app.response_cache.misses,
+                           'coalesced': app.response_cache.coalesced},
+        'fragments_coalesced': app.fragment_cache.coalesced,
+        'peak_rss_mib': peak_rss_mib(),
+    }
+
+
+# Request body of a callback, as dash-renderer sends it. outputs are
+# "component-id.property" strings; inputs and state (id, property, value).
+def callback_body(outputs, inputs, state=(), changed=()):
+    targets = [dict(zip(('id', 'property'), output.split('.'))) for output in outputs]
+    return {
+        'output': outputs[0] if len(outputs) == 1 else f"..{'...'.join(outputs)}..",
+        'outputs': targets[0] if len(targets) == 1 else targets,
+        'inputs': [{'id': id, 'property': prop, 'value': value} for id, prop, value in inputs],
+        'state': [{'id': id, 'property': prop, 'value': value} for id, prop, value in state],
+        'changedPropIds': list(changed),
+    }
+
+
+def _grid(rng, restaurant_count):
+    load_more = rng.random() < 0.2
+    changed = 'load-more.n_clicks' if load_more else 'cuisine-filter.value'
+    return callback_body(
+        ['restaurants-grid.children', 'results-count.children', 'load-more-section.style',
+         'grid-cursor.data'],
+        [('cuisine-filter', 'value', rng.choice(['all'] + CUISINES)),
+         ('location-filter', 'value', rng.choice(['all', 'all'] + LOCATIONS)),
+         ('price-filter', 'value', rng.choice(['all', 'all'] + PRICE_RANGES)),
+         ('sort-filter', 'value', rng.choice(SORT_ORDERS)),
+         ('distance-filter', 'value', 'all'),
+         ('user-location', 'data', None),
+         ('search-input', 'value', None),
+         ('search-button', 'n_clicks', None),
+         ('load-more', 'n_clicks', 1 if load_more else None)],
+        [('grid-cursor', 'data', app.GRID_PAGE_SIZE if load_more else 0)],
+        [changed])
+
+
+# "Near me" from somewhere around a neighbourhood centre, by distance or
+# within a radius
+def _nearby(rng, restaurant_count):
+    latitude, longitude = rng.choice(list(LOCATION_CENTERS.values()))
+    location = {'latitude': latitude + rng.uniform(-0.01, 0.01),
+                'longitude': longitude + rng.uniform(-0.01, 0.01)}
+    return callback_body(
+        ['restaurants-grid.children', 'results-count.children', 'load-more-section.style',
+         'grid-cursor.data'],
+        [('cuisine-filter', 'value', rng.choice(['all', 'all'] + CUISINES)),
+         ('location-filter', 'value', 'all'),
+         ('price-filter', 'value', 'all'),
+         ('sort-filter', 'value', rng.choice(['distance', 'rating_desc'])),
+         ('distance-filter', 'value', rng.choice(['all'] + list(app.DISTANCE_CHOICES))),
+         ('user-location', 'data', location),
+         ('search-input', 'value', None),
+         ('search-button', 'n_clicks', None),
+         ('load-more', 'n_clicks', None)],
+        [('grid-cursor', 'data', 0)],
+        ['user-location.data'])
+
+
+def _search(rng, restaurant_count):
+    query = rng.choice(SEARCHES)
+    query = query[:rng.randint(1, len(query))]
+    return callback_body(
+        ['restaurants-grid.children', 'results-count.children', 'load-more-section.style',
+         'grid-cursor.data'],
+        [('cuisine-filter', 'value', 'all'),
+         ('location-filter', 'value', 'all'),
+         ('price-filter', 'value', 'all'),
+         ('sort-filter', 'value', 'rating_desc'),
+         ('distance-filter', 'value', 'all'),
+         ('user-location', 'data', None),
+         ('search-input', 'value', query),
+         ('search-button', 'n_clicks', None),
+         ('load-more', 'n_clicks', None)],
+        [('grid-cursor', 'data', 0)],
+        ['search-input.value'])
+
+
+def _page(rng, restaurant_count):
+    pathname = rng.choice(['/', '/add-review', f'/restaurant/{_restaurant_id(rng, restaurant_count)}',
+                           f'/restaurant/{_restaurant_id(rng, restaurant_count)}'])
+    return callback_body(['page-content.children'], [('url', 'pathname', pathname)],
+                         [('url', 'search', '')], ['url.pathname'])
+
+
+def _reviews(rng, restaurant_count):
+    button = rng.choice(['reviews-next', 'reviews-prev', 'review-sort'])
+    prop = 'value' if button == 'review-sort' else 'n_clicks'
+    return callback_body(
+        ['reviews-list.children', 'reviews-page-label.children', 'reviews-prev.disabled',
+         'reviews-next.disabled', 'reviews-page.data'],
+        [('review-sort', 'value', rng.choice(['newest', 'highest', 'lowest'])),
+         ('reviews-prev', 'n_clicks', 1),
+         ('reviews-next', 'n_clicks', 1)],
+        [('reviews-page', 'data', {'restaurant_id': _restaurant_id(rng, restaurant_count),
+                                   'page': rng.randint(0, 2)})],
+        [f'{button}.{prop}'])
+
+
+def _restaurant_options(rng, restaurant_count):
+    query = rng.choice(SEARCHES)
+    return callback_body(
+        ['review-restaurant-select.options'],
+        [('review-restaurant-select', 'search_value', query[:rng.randint(1, len(query))])],
+        [('review-restaurant-select', 'value', None)],
+        ['review-restaurant-select.search_value'])
+
+
+def _submit_review(rng, restaurant_count):
+    return callback_body(
+        ['review-feedback.children'],
+        [('submit-review', 'n_clicks', 1)],
+        [('review-restaurant-select', 'value', _restaurant_id(rng, restaurant_count)),
+         ('reviewer-name', 'value', 'Load Test'),
+         ('rating-select', 'value', rng.randint(1, 5)),
+         ('review-text', 'value', "Generated by the load test.")],
+        ['submit-review.n_clicks'])
+
+
+def _restaurant_id(rng, restaurant_count):
+    return str(rng.randint(1, restaurant_count))
+
+
+REQUEST_BUILDERS = {
+    'grid': _grid,
+    'nearby': _nearby,
+    'page': _page,
+    'reviews': _reviews,
+    'search': _search,
+    'restaurant_options': _restaurant_options,
+    'submit_review': _submit_review,
+}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import datetime
+import random
+from itertools import accumulate
+
+CUISINES = ['French', 'Japanese', 'Italian', 'Indian', 'American', 'Mexican',
+            'Thai', 'Chinese', 'Greek', 'Spanish', 'Korean', 'Vietnamese']
+LOCATIONS = ['Downtown', 'Midtown', 'Little Italy', 'Uptown', 'Financial District',
+             'Harbor', 'Old Town', 'University', 'Riverside', 'Chinatown']
+PRICE_RANGES = ['$', '$$', '$$$', '$$$$']
+# Where each location's restaurants cluster, and how far they spread (the
+# standard deviation, in degrees of latitude; about 1.5 km)
+LOCATION_CENTERS = {
+    'Downtown': (40.7128, -74.0060), 'Midtown': (40.7549, -73.9840),
+    'Little Italy': (40.7191, -73.9973), 'Uptown': (40.8116, -73.9465),
+    'Financial District': (40.7075, -74.0113), 'Harbor': (40.7033, -74.0170),
+    'Old Town': (40.7336, -74.0027), 'University': (40.7295, -73.9965),
+    'Riverside': (40.8007, -73.9706), 'Chinatown': (40.7158, -73.9970),
+}
+LOCATION_SPREAD = 0.0135
+
+_FOOD_WORDS = ['pizza', 'sushi', 'ramen', 'curry', 'steak', 'pasta', 'taco', 'burger',
+               'noodle', 'dumpling', 'salad', 'wine', 'cocktail', 'dessert', 'brunch',
+               'service', 'atmosphere', 'chef', 'fresh', 'spicy', 'delicious', 'cozy',
+               'friendly', 'slow', 'expensive', 'value', 'portion', 'crust', 'sauce']
+_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'te', 'su', 'no', 'vi', 'da', 'ze', 'po', 'ri',
+              'an', 'el', 'or', 'us', 'ti', 'ma', 'ne', 'bo']
+
+
+# Food words first so they are the most frequent ones, then made-up words
+def _make_vocabulary(rng, size):
+    words = set(_FOOD_WORDS)
+    while len(words) < size:
+        words.add(''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words - set(_FOOD_WORDS))
+    rng.shuffle(words)
+    return _FOOD_WORDS + words
+
+
+def _sentence(rng, vocabulary, weights, length):
+    return ' '.join(rng.choices(vocabulary, cum_weights=weights, k=length)).capitalize() + '.'
+
+
+# Deterministic catalogue of restaurants and reviews shaped like the sample
+# data in app.py, for benchmarks. Word frequencies follow a Zipf-like curve.
+# Coordinates come from a generator of their own, so the other fields are
+# the same as before restaurants had any.
+def generate_restaurants(count, seed=0, vocabulary_size=20000):
+    rng = random.Random(seed)
+    geo_rng = random.Random(seed + 2)
+    vocabulary = _make_vocabulary(rng, vocabulary_size)
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for i in range(count):
+        cuisine = rng.choice(CUISINES)
+        location = rng.choice(LOCATIONS)
+        latitude, longitude = LOCATION_CENTERS[location]
+        yield {
+            'id': str(i + 1),
+            'name': ' '.join(rng.choices(vocabulary, cum_weights=weights, k=2)).title(),
+            'cuisine': cuisine,
+            'location': location,
+            'price_range': rng.choice(PRICE_RANGES),
+            'image': 'https://images.unsplash.com/photo-1517248135467-4c7edcad34c4?w=400&h=300&fit=crop',
+            'description': _sentence(rng, vocabulary, weights, 12),
+            'phone': '(555) %03d-%04d' % (rng.randrange(1000), rng.randrange(10000)),
+            'address': '%d %s St, %s' % (rng.randint(1, 999), rng.choice(vocabulary).title(), location),
+            # A degree of longitude is shorter than one of latitude here
+            'latitude': round(geo_rng.gauss(latitude, LOCATION_SPREAD), 6),
+            'longitude': round(geo_rng.gauss(longitude, LOCATION_SPREAD * 1.32), 6)
+        }
+
+
+def generate_reviews(count, restaurant_count, seed=0, vocabulary_size=20000):
+    rng = random.Random(seed + 1)
+    vocabulary = _make_vocabulary(random.Random(seed), vocabulary_size)
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    start = datetime.date(2020, 1, 1).toordinal()
+    for i in range(count):
+        # Skew review volume towards a minority of popular restaurants
+        restaurant = int(restaurant_count * rng.random() ** 2) + 1
+        yield {
+            'id': 'r%d' % i,
+            'restaurant_id': str(restaurant),
+            'reviewer_name': '%s %s' % (rng.choice(vocabulary).title(), rng.choice(vocabulary).title()),
+            'rating': rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 4, 4))[0],
+            'review_text': _sentence(rng, vocabulary, weights, rng.randint(8, 30)),
+            'date': datetime.date.fromordinal(start + rng.randrange(1800)).isoformat()
+        }
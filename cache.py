@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+# Thread-safe least-recently-used mapping with a fixed number of entries.
+# With maxbytes the values must be byte strings, and the least recently
+# used ones are also evicted to keep their total length within it.
+class LRUCache:
+    def __init__(self, maxsize=1024, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        # Total length of the values, when maxbytes is set
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if self.maxbytes is not None:
+                if len(value) > self.maxbytes:
+                    return
+                self.nbytes += len(value) - len(self._data.get(key, b''))
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (
+                    self.maxbytes is not None and self.nbytes > self.maxbytes):
+                self._evicted(self._data.popitem(last=False)[1])
+
+    def delete(self, key):
+        with self._lock:
+            self._evicted(self._data.pop(key, None))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def _evicted(self, value):
+        if self.maxbytes is not None and value is not None:
+            self.nbytes -= len(value)
+
+
+# Byte strings stored as files in a directory, so every worker process on
+# the machine shares them. Same get/set interface as LRUCache; keys are
+# strings. Once more than maxsize files have been written, the least
+# recently written ones are pruned.
+class FileCache:
+    PRUNE_EVERY = 256
+
+    def __init__(self, directory, maxsize=100000):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.cache'))
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        # Written to a temporary file and renamed, so readers in other
+        # processes never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                self._remove(entry.path)
+
+    def _prune(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.cache')]
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.maxsize]:
+            self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        # Another worker may have pruned it first
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# Opens the cache described by spec: 'memory' (or empty) for an LRUCache
+# in this process, holding at most maxbytes of values if given, a
+# directory path for a FileCache shared between processes, or 'off' for no
+# cache (None)
+def open_cache(spec, maxsize, maxbytes=None):
+    if spec == 'off':
+        return None
+    if not spec or spec == 'memory':
+        return LRUCache(maxsize, maxbytes)
+    return FileCache(spec, maxsize)
+
+
+# Converts a Dash component tree to the plain dicts and lists it serializes
+# to. Dash sends those as-is, without walking the component objects again.
+# Components serialize themselves through to_plotly_json, so plotly's JSON
+# encoder (whose module pulls in numpy helpers and Pillow) is not needed.
+def serialize_component(component):
+    return json.loads(json.dumps(component, default=_component_json))
+
+
+def _component_json(value):
+    to_json = getattr(value, 'to_plotly_json', None)
+    if to_json is None:
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+    return to_json()
+
+
+# Runs one call per key at a time: callers that ask for a key while a call
+# for it is running wait for that call and get its result (or exception)
+# instead of making their own
+class SingleFlight:
+    def __init__(self):
+        # Callers that shared another's call
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                call.set_result(fn())
+            except BaseException as error:
+                call.set_exception(error)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+        return call.result()
+
+
+# Cache of rendered layout fragments. Each key holds one entry tagged with
+# the data version it was built from; asking with a newer version rebuilds
+# it, so bumping a restaurant's version is all the invalidation needed.
+# Concurrent misses for the same key and version share one build.
+class FragmentCache:
+    def __init__(self, maxsize=1024):
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize)
+        self._flights = SingleFlight()
+
+    @property
+    def coalesced(self):
+        return self._flights.coalesced
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, key, version, build):
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return self._flights.do((key, version), lambda: self._build(key, version, build))
+
+    def _build(self, key, version, build):
+        fragment = serialize_component(build())
+        self._cache.set(key, (version, fragment))
+        return fragment
+
+    def invalidate(self, key):
+        self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,75 @@
+import gzip
+import hashlib
+
+import flask
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response types worth compressing; images and fonts already are
+COMPRESSIBLE_TYPES = frozenset(('application/json', 'text/html', 'text/css', 'text/javascript',
+                                'application/javascript', 'image/svg+xml', 'text/plain'))
+
+
+# Compresses text responses (callback JSON above all) on the fly with
+# brotli, when it is installed and the client accepts it, or gzip. Levels
+# are picked for speed: a page of grid cards compresses about as well at
+# brotli 5 as at 11, in a fraction of the time. Compressed bodies are kept
+# by digest, so responses the response cache answers again and again are
+# compressed once. Responses smaller than min_size, streamed ones (files)
+# and ones already encoded (precompressed assets) go out as they are.
+# Compressed responses get a weak ETag, since the bytes differ from the
+# identity body's.
+class ResponseCompression:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, cache_size=1024):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = LRUCache(cache_size)
+        # Preferred first, when the client accepts several equally
+        self.codings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        # Bytes of the responses compressed, before and after
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # Must be registered before hooks whose after_request needs the
+    # uncompressed body (the response cache), since Flask runs those hooks
+    # in reverse order
+    def init_app(self, server):
+        server.after_request(self._after_request)
+
+    def compress(self, body, coding):
+        if coding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, self.gzip_level, mtime=0)
+
+    def _after_request(self, response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        accepted = flask.request.accept_encodings
+        coding = max(self.codings, key=lambda coding: accepted[coding])
+        if not accepted[coding]:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        key = (hashlib.blake2b(body, digest_size=16).digest(), coding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self.compress(body, coding)
+            self.cache.set(key, compressed)
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = coding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,300 @@
+import heapq
+import math
+from array import array
+
+# Mean Earth radius; one degree of latitude is about 111.2 km
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+# Kilometres per degree of longitude at a latitude
+def km_per_degree_longitude(lat):
+    return KM_PER_DEGREE * math.cos(math.radians(lat))
+
+
+# Distance in km from (lat, lon) to another point, by the equirectangular
+# approximation around the first one. Across a city it is within a fraction
+# of a percent of the great-circle distance. GeoIndex and assets/grid.js
+# compute it the same way, step for step, so a restaurant found within 2 km
+# never shows as 2.1 km away. Does not wrap around the antimeridian.
+def distance_km(lat, lon, other_lat, other_lon):
+    dx = (other_lon - lon) * km_per_degree_longitude(lat)
+    dy = (other_lat - lat) * KM_PER_DEGREE
+    return math.sqrt(dx * dx + dy * dy)
+
+
+# Points bucketed in a grid of cells about cell_km square (exactly square
+# at the latitude of the first point added). Radius queries look only at
+# the cells overlapping the circle; nearest() walks rings of cells outwards
+# from the query point, skipping straight to the occupied area when the
+# point is outside it. Coordinates are kept in flat arrays indexed by the
+# point's position, and each cell holds a list of positions.
+class GeoIndex:
+    def __init__(self, cell_km=0.05):
+        self.cell_km = cell_km
+        self._lat_step = cell_km / KM_PER_DEGREE
+        self._lon_step = None
+        self._ids = []
+        self._lats = array('d')
+        self._lons = array('d')
+        self._positions = {}
+        self._cells = {}
+        # Smallest and largest row and column ever occupied
+        self._bounds = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, point_id):
+        return point_id in self._positions
+
+    def add(self, point_id, lat, lon):
+        if point_id in self._positions:
+            self.remove(point_id)
+        if self._lon_step is None:
+            self._lon_step = self.cell_km / max(km_per_degree_longitude(lat), KM_PER_DEGREE / 100)
+        position = len(self._ids)
+        self._ids.append(point_id)
+        self._lats.append(lat)
+        self._lons.append(lon)
+        self._positions[point_id] = position
+        row, col = cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, []).append(position)
+        if self._bounds is None:
+            self._bounds = [row, row, col, col]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], row), max(bounds[1], row)
+            bounds[2], bounds[3] = min(bounds[2], col), max(bounds[3], col)
+
+    def remove(self, point_id):
+        position = self._positions.pop(point_id, None)
+        if position is None:
+            return
+        # The arrays keep the slot; it is simply no longer in any cell
+        cell = self._cell(self._lats[position], self._lons[position])
+        positions = self._cells[cell]
+        positions.remove(position)
+        if not positions:
+            del self._cells[cell]
+        self._ids[position] = None
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self._lat_step), math.floor(lon / self._lon_step)
+
+    # The occupied cells overlapping the box around (lat, lon) reaching
+    # span_lat and span_lon degrees out, as ((row, col), positions)
+    def _cells_near(self, lat, lon, span_lat, span_lon):
+        if not self._cells:
+            return []
+        min_row, min_col = self._cell(lat - span_lat, lon - span_lon)
+        max_row, max_col = self._cell(lat + span_lat, lon + span_lon)
+        bounds = self._bounds
+        min_row, max_row = max(min_row, bounds[0]), min(max_row, bounds[1])
+        min_col, max_col = max(min_col, bounds[2]), min(max_col, bounds[3])
+        if min_row > max_row or min_col > max_col:
+            return []
+        # A big circle over a sparse index has more cells in its box than
+        # there are occupied cells, so walk those instead
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            return [(cell, positions) for cell, positions in self._cells.items()
+                    if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col]
+        get = self._cells.get
+        cells = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                positions = get((row, col))
+                if positions:
+                    cells.append(((row, col), positions))
+        return cells
+
+    def _spans(self, lat, radius_km):
+        kx = km_per_degree_longitude(lat)
+        return radius_km / KM_PER_DEGREE, radius_km / kx if kx > 1e-9 else 180.0
+
+    # (distance in km, id) for every point within radius_km, nearest first;
+    # equal distances keep the order the points were added in
+    def within(self, lat, lon, radius_km):
+        kx = km_per_degree_longitude(lat)
+        ky = KM_PER_DEGREE
+        lats, lons = self._lats, self._lons
+        limit = radius_km * radius_km
+        hits = []
+        for _, positions in self._cells_near(lat, lon, *self._spans(lat, radius_km)):
+            for position in positions:
+                dx = (lons[position] - lon) * kx
+                dy = (lats[position] - lat) * ky
+                squared = dx * dx + dy * dy
+                if squared <= limit:
+                    hits.append((squared, position))
+        hits.sort()
+        ids = self._ids
+        return [(math.sqrt(squared), ids[position]) for squared, position in hits]
+
+    # The number of points within radius_km, as within() would return, or
+    # of those whose id is in matching
+    def count_within(self, lat, lon, radius_km, matching=None):
+        if matching is None:
+            return sum(len(positions) for positions in self._circle(lat, lon, radius_km))
+        ids = self._ids
+        return sum(1 for positions in self._circle(lat, lon, radius_km)
+                   for position in positions if ids[position] in matching)
+
+    # The ids of the points within radius_km, as a set in no order
+    def ids_within(self, lat, lon, radius_km):
+        ids = self._ids
+        return {ids[position] for positions in self._circle(lat, lon, radius_km)
+                for position in positions}
+
+    # Yields lists of the positions of the points within radius_km. Cells
+    # wholly inside the circle are yielded as they are, without computing
+    # any distance; each row of cells has one run of them, found from the
+    # circle's width at the row's far edge. Only the cells on the edge are
+    # checked point by point.
+    def _circle(self, lat, lon, radius_km):
+        if not self._cells:
+            return
+        kx = km_per_degree_longitude(lat)
+        ky = KM_PER_DEGREE
+        lats, lons = self._lats, self._lons
+        lat_step, lon_step = self._lat_step, self._lon_step
+        limit = radius_km * radius_km
+        span_lat, span_lon = self._spans(lat, radius_km)
+        min_row, max_row, min_col, max_col = self._bounds
+        min_row = max(min_row, math.floor((lat - span_lat) / lat_step))
+        max_row = min(max_row, math.floor((lat + span_lat) / lat_step))
+
+        def close(positions):
+            inside = []
+            for position in positions:
+                dx = (lons[position] - lon) * kx
+                dy = (lats[position] - lat) * ky
+                if dx * dx + dy * dy <= limit:
+                    inside.append(position)
+            return inside
+
+        if kx < 1e-9 or (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            # Sparse, as in _cells_near: checking every point is cheaper
+            for _, positions in self._cells_near(lat, lon, span_lat, span_lon):
+                yield close(positions)
+            return
+        get = self._cells.get
+        for row in range(min_row, max_row + 1):
+            south = row * lat_step
+            north = south + lat_step
+            near_dy = max(south - lat, lat - north, 0.0) * ky
+            if near_dy * near_dy > limit:
+                continue
+            reach = math.sqrt(limit - near_dy * near_dy) / kx
+            first = max(min_col, math.floor((lon - reach) / lon_step))
+            last = min(max_col, math.floor((lon + reach) / lon_step))
+            # Shrunk a little, so rounding never takes in a cell whose
+            # corner is just outside
+            far_dy = max(lat - south, north - lat) * ky
+            if far_dy * far_dy < limit:
+                inside = math.sqrt(limit - far_dy * far_dy) / kx * (1 - 1e-9)
+                first_inside = math.ceil((lon - inside) / lon_step)
+                last_inside = math.floor((lon + inside) / lon_step) - 1
+            else:
+                first_inside, last_inside = 0, -1
+            for col in range(first, last + 1):
+                positions = get((row, col))
+                if positions:
+                    yield positions if first_inside <= col <= last_inside else close(positions)
+
+    # (distance in km, id) for those of point_ids in the index (and within
+    # max_km), nearest first and with ties as in within(): for ranking a
+    # few candidates without searching the grid
+    def rank(self, point_ids, lat, lon, max_km=None):
+        kx = km_per_degree_longitude(lat)
+        ky = KM_PER_DEGREE
+        lats, lons, ids = self._lats, self._lons, self._ids
+        limit = math.inf if max_km is None else max_km * max_km
+        hits = []
+        for point_id in point_ids:
+            position = self._positions.get(point_id)
+            if position is None:
+                continue
+            dx = (lons[position] - lon) * kx
+            dy = (lats[position] - lat) * ky
+            squared = dx * dx + dy * dy
+            if squared <= limit:
+                hits.append((squared, position))
+        hits.sort()
+        return [(math.sqrt(squared), ids[position]) for squared, position in hits]
+
+    # Yields (distance in km, id) for every point (or those within max_km),
+    # nearest first, with ties as in within(). Lazy: taking the first k
+    # only searches the cells around the query point.
+    def nearest(self, lat, lon, max_km=None):
+        if not self._cells:
+            return
+        kx = km_per_degree_longitude(lat)
+        ky = KM_PER_DEGREE
+        # Every cell in ring n (n cells out from the query point's cell) is
+        # at least n - 1 cell widths away
+        width = min(self._lat_step * ky, self._lon_step * kx)
+        limit = math.inf if max_km is None else max_km * max_km
+        lats, lons, ids = self._lats, self._lons, self._ids
+        center_row, center_col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        heap = []
+
+        def push(positions):
+            for position in positions:
+                dx = (lons[position] - lon) * kx
+                dy = (lats[position] - lat) * ky
+                squared = dx * dx + dy * dy
+                if squared <= limit:
+                    heapq.heappush(heap, (squared, position))
+
+        # Rings that do not reach the occupied area are empty
+        ring = max(0, min_row - center_row, center_row - max_row,
+                   min_col - center_col, center_col - max_col)
+        last_ring = max(center_row - min_row, max_row - center_row,
+                        center_col - min_col, max_col - center_col)
+        lookups = 0
+        get = self._cells.get
+        while ring <= last_ring:
+            cells = _ring_cells(center_row, center_col, ring, self._bounds)
+            lookups += len(cells)
+            if lookups > len(self._cells):
+                # Sparse points: it is cheaper to take all those not
+                # visited yet in one go than to keep walking empty cells
+                for (row, col), positions in self._cells.items():
+                    if max(abs(row - center_row), abs(col - center_col)) >= ring:
+                        push(positions)
+                break
+            for cell in cells:
+                positions = get(cell)
+                if positions:
+                    push(positions)
+            # Anything this close is nearer than whatever the next rings hold
+            reached = ring * width
+            while heap and heap[0][0] <= reached * reached:
+                squared, position = heapq.heappop(heap)
+                yield math.sqrt(squared), ids[position]
+            if reached * reached > limit:
+                return
+            ring += 1
+        while heap:
+            squared, position = heapq.heappop(heap)
+            yield math.sqrt(squared), ids[position]
+
+
+# The cells at Chebyshev distance ring from (row, col) that are inside
+# bounds (min_row, max_row, min_col, max_col)
+def _ring_cells(row, col, ring, bounds):
+    min_row, max_row, min_col, max_col = bounds
+    if ring == 0:
+        return [(row, col)]
+    cells = []
+    first_col, last_col = max(col - ring, min_col), min(col + ring, max_col)
+    for edge_row in (row - ring, row + ring):
+        if min_row <= edge_row <= max_row:
+            cells.extend((edge_row, c) for c in range(first_col, last_col + 1))
+    first_row, last_row = max(row - ring + 1, min_row), min(row + ring - 1, max_row)
+    for edge_col in (col - ring, col + ring):
+        if min_col <= edge_col <= max_col:
+            cells.extend((r, edge_col) for r in range(first_row, last_row + 1))
+    return cells
@@ -0,0 +1,22 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:server
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '8050')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+accesslog = '-'
+
+# Import the app once in the master so workers share its memory pages;
+# database connections and the review writer thread are opened per process
+# after the fork
+preload_app = True
+
+
+# Write out reviews still queued in the worker before it goes away
+def worker_exit(server, worker):
+    from wsgi import review_writer
+    review_writer.flush()
@@ -0,0 +1,171 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import urllib.request
+
+import flask
+
+from repository import open_repository
+
+# Widths generated for every image. Cards offer variants up to
+# CARD_MAX_WIDTH (a 2x card), the restaurant page hero up to HERO_MAX_WIDTH.
+IMAGE_WIDTHS = (400, 800, 1200)
+CARD_MAX_WIDTH = 800
+HERO_MAX_WIDTH = 1200
+
+# Variant files are named after a hash of the source image, so a URL always
+# serves the same bytes and browsers may cache it for good
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+JPEG_QUALITY = 82
+
+# Seconds between checks of whether the manifest changed on disk
+MANIFEST_CHECK_INTERVAL = 1
+
+
+# Local copies of restaurant images, resized once at ingest into a fixed set
+# of widths. manifest.json maps each source URL to the variants made from
+# it; images not ingested yet are served from their source URL. Running
+# workers reload the manifest when an ingest rewrites it, and version()
+# changes with it, so callers can key cached markup on it.
+class ImageStore:
+    def __init__(self, directory, url_path='/images'):
+        self.directory = directory
+        self.url_path = url_path
+        self._manifest_path = os.path.join(directory, 'manifest.json')
+        self._manifest = {}
+        self._manifest_mtime = 0
+        self._checked_at = None
+        self._refresh()
+
+    def __contains__(self, source):
+        self._refresh()
+        return source in self._manifest
+
+    # The modification time of the manifest, 0 if there is none yet
+    def version(self):
+        self._refresh()
+        return self._manifest_mtime
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < MANIFEST_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self._manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            with open(self._manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        self._manifest, self._manifest_mtime = manifest, mtime
+
+    # Serves the variants with long-lived cache headers
+    def init_app(self, server):
+        def serve_image(filename):
+            response = flask.send_from_directory(os.path.abspath(self.directory), filename,
+                                                 max_age=IMAGE_MAX_AGE)
+            response.headers['Cache-Control'] = f'public, max-age={IMAGE_MAX_AGE}, immutable'
+            return response
+
+        server.add_url_rule(f'{self.url_path}/<path:filename>', 'serve_image', serve_image)
+
+    # Returns {'src': ..., 'srcSet': ...} for an html.Img offering the local
+    # variants up to max_width, or just the source URL if there are none
+    def sources(self, source, max_width):
+        self._refresh()
+        variants = self._manifest.get(source)
+        if not variants:
+            return {'src': source}
+        variants = sorted((int(width), f"{self.url_path}/{name}")
+                          for width, name in variants.items())
+        chosen = [variant for variant in variants if variant[0] <= max_width] or variants[:1]
+        return {
+            'src': chosen[-1][1],
+            'srcSet': ', '.join(f"{url} {width}w" for width, url in chosen)
+        }
+
+    # Downloads (or reads) source, writes its variants and records them in
+    # the manifest. Does nothing if it was ingested before.
+    def ingest(self, source):
+        if source in self._manifest:
+            return False
+        # Pillow is only needed to ingest, not to serve
+        from PIL import Image
+
+        data = _read_source(source)
+        key = hashlib.sha256(data).hexdigest()[:20]
+        image = Image.open(io.BytesIO(data)).convert('RGB')
+        variants = {}
+        for width in IMAGE_WIDTHS:
+            # Never upscale; small originals produce fewer variants
+            width = min(width, image.width)
+            if width in variants:
+                continue
+            name = f"{key}-{width}.jpg"
+            variant = image.resize((width, round(image.height * width / image.width)),
+                                   Image.LANCZOS)
+            self._write(name, lambda f: variant.save(f, 'JPEG', quality=JPEG_QUALITY,
+                                                      optimize=True, progressive=True))
+            variants[width] = name
+        self._manifest[source] = variants
+        self._write('manifest.json',
+                    lambda f: f.write(json.dumps(self._manifest, indent=1).encode()))
+        return True
+
+    def _write(self, name, write):
+        # Through a temporary file, so workers never serve a partial file
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, os.path.join(self.directory, name))
+
+
+def _read_source(source):
+    if source.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(source, timeout=30) as response:
+            return response.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+# Ingests the image of every restaurant in the repository. Failures are
+# reported and skipped; those restaurants keep their source URL.
+def ingest_restaurant_images(repository, store):
+    ingested = failed = 0
+    for restaurant in repository.list_restaurants():
+        source = restaurant.get('image')
+        if not source or source in store:
+            continue
+        try:
+            store.ingest(source)
+            ingested += 1
+        except Exception as e:
+            failed += 1
+            print(f"{restaurant['id']}: could not ingest {source}: {e}")
+    print(f"ingested {ingested} images, {failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download and resize restaurant images")
+    parser.add_argument('--db', default=os.environ.get('RESTAURANT_DB'),
+                        help="SQLite database file (default: $RESTAURANT_DB)")
+    parser.add_argument('--image-dir', default=os.environ.get('IMAGE_DIR', 'images'))
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("no database: pass --db or set RESTAURANT_DB")
+    ingest_restaurant_images(open_repository(args.db), ImageStore(args.image_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date
+from itertools import islice
+
+from images import ImageStore, ingest_restaurant_images
+from moderation import backfill
+from repository import RESTAURANT_FIELDS, REVIEW_FIELDS, SQLiteRepository
+
+REQUIRED_RESTAURANT_FIELDS = ('id', 'name', 'cuisine', 'location', 'price_range')
+REQUIRED_REVIEW_FIELDS = ('id', 'restaurant_id', 'reviewer_name', 'review_text')
+# Optional numeric restaurant fields and the largest magnitude allowed
+COORDINATE_LIMITS = {'latitude': 90.0, 'longitude': 180.0}
+
+# Rejected rows reported individually; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+# Bulk loads restaurants and reviews from CSV, JSONL or Parquet files into
+# the SQLite database the app runs on (RESTAURANT_DB). Files are streamed in
+# chunks, so memory use does not grow with their size.
+def main():
+    parser = argparse.ArgumentParser(description="Import restaurants and reviews into the database")
+    parser.add_argument('--db', default=os.environ.get('RESTAURANT_DB'),
+                        help="SQLite database file (default: $RESTAURANT_DB)")
+    parser.add_argument('--restaurants', action='append', default=[],
+                        help="restaurants file (.csv, .jsonl or .parquet), repeatable")
+    parser.add_argument('--reviews', action='append', default=[],
+                        help="reviews file (.csv, .jsonl or .parquet), repeatable")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--images', metavar='IMAGE_DIR',
+                        help="also download and resize restaurant images into this directory")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="only recompute aggregates and indexes, e.g. after an interrupted import")
+    parser.add_argument('--moderate', action='store_true',
+                        help="then run the reviews not moderated yet through moderation")
+    parser.add_argument('--remove-rejected', action='store_true',
+                        help="with --moderate, delete the reviews moderation rejects")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="processes for --moderate (default: one per CPU)")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("no database: pass --db or set RESTAURANT_DB")
+
+    repository = SQLiteRepository(args.db)
+    start = time.perf_counter()
+    if args.rebuild:
+        repository.rebuild()
+        print(f"rebuilt in {time.perf_counter() - start:.1f}s")
+    elif args.restaurants or args.reviews:
+        _import_files(repository, args)
+    if args.moderate:
+        _moderate(repository, args.workers, args.chunk_size, args.remove_rejected)
+    if args.images:
+        ingest_restaurant_images(repository, ImageStore(args.images))
+
+
+def _import_files(repository, args):
+    start = time.perf_counter()
+    # Restaurants go first so reviews can be checked against them
+    with repository.bulk_load():
+        for path in args.restaurants:
+            _import(path, clean_restaurant, repository.bulk_insert_restaurants, args.chunk_size)
+        for path in args.reviews:
+            _import(path, clean_review, repository.bulk_insert_reviews, args.chunk_size)
+        # Leaving the block runs the rebuild
+        rebuild_start = time.perf_counter()
+    print(f"rebuilt aggregates and indexes in {time.perf_counter() - rebuild_start:.1f}s, "
+          f"total {time.perf_counter() - start:.1f}s")
+
+
+# Runs the reviews already in the database through moderation, with the
+# analysis spread over worker processes
+def _moderate(repository, workers, batch_size, remove_rejected):
+    start = time.perf_counter()
+
+    def progress(done):
+        elapsed = time.perf_counter() - start
+        print(f"moderated {done} reviews, {done / elapsed:,.0f} reviews/s", end='\r', flush=True)
+
+    moderator, done = backfill(repository, workers, batch_size, remove_rejected, progress)
+    rejected = ', '.join(f"{count} {reason}" for reason, count in moderator.rejected.items())
+    print(f"moderated {done} reviews in {time.perf_counter() - start:.1f}s: "
+          f"{moderator.accepted} accepted, {rejected} "
+          f"({'removed' if remove_rejected else 'kept'})")
+
+
+def _import(path, clean, insert, chunk_size):
+    read = inserted = rejected = 0
+    start = time.perf_counter()
+    rows = read_rows(path)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        chunk = []
+        for line, row in batch:
+            try:
+                chunk.append(clean(row))
+            except (KeyError, TypeError, ValueError) as e:
+                rejected += 1
+                if rejected <= MAX_REPORTED_ERRORS:
+                    print(f"{path}:{line}: {e}", file=sys.stderr)
+        read += len(batch)
+        inserted += insert(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {read} rows, {read / elapsed:,.0f} rows/s", end='\r', flush=True)
+    elapsed = time.perf_counter() - start
+    # Valid rows that were not inserted were duplicates (or, for reviews,
+    # referred to a restaurant that does not exist)
+    skipped = read - rejected - inserted
+    print(f"{path}: {read} rows in {elapsed:.1f}s ({read / max(elapsed, 1e-9):,.0f} rows/s): "
+          f"{inserted} inserted, {rejected} invalid, {skipped} skipped")
+
+
+# Yields (line or row number, dict) for each record in the file
+def read_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return _read_csv(path)
+    if extension in ('.jsonl', '.ndjson'):
+        return _read_jsonl(path)
+    if extension == '.parquet':
+        return _read_parquet(path)
+    raise SystemExit(f"{path}: unsupported file type {extension!r}")
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                row = e
+            yield line, row
+
+
+def _read_parquet(path):
+    # pandas.read_parquet loads the whole file; pyarrow (which pandas uses
+    # for Parquet anyway) can hand it over one record batch at a time
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("reading Parquet files needs pyarrow: pip install pyarrow")
+    row_number = 0
+    for batch in pq.ParquetFile(path).iter_batches():
+        for row in batch.to_pylist():
+            row_number += 1
+            yield row_number, row
+
+
+def _text(row, field, required):
+    value = row.get(field)
+    if value is None:
+        value = ''
+    if not isinstance(value, str):
+        value = str(value)
+    value = value.strip()
+    if required and not value:
+        raise ValueError(f"missing {field}")
+    return value
+
+
+def clean_restaurant(row):
+    if not isinstance(row, dict):
+        raise ValueError(f"not a record: {row}")
+    restaurant = {field: _text(row, field, field in REQUIRED_RESTAURANT_FIELDS)
+                  for field in RESTAURANT_FIELDS if field not in COORDINATE_LIMITS}
+    for field, limit in COORDINATE_LIMITS.items():
+        restaurant[field] = _coordinate(row, field, limit)
+    if (restaurant['latitude'] is None) != (restaurant['longitude'] is None):
+        raise ValueError("latitude and longitude must be given together")
+    return {field: restaurant[field] for field in RESTAURANT_FIELDS}
+
+
+# Empty and NaN (a missing value in Parquet) mean no coordinate
+def _coordinate(row, field, limit):
+    text = _text(row, field, False)
+    if not text:
+        return None
+    value = float(text)
+    if value != value:
+        return None
+    if not -limit <= value <= limit:
+        raise ValueError(f"invalid {field} {row.get(field)!r}")
+    return value
+
+
+def clean_review(row):
+    if not isinstance(row, dict):
+        raise ValueError(f"not a record: {row}")
+    review = {field: _text(row, field, True) for field in REQUIRED_REVIEW_FIELDS}
+    rating = float(row.get('rating'))
+    if rating not in (1, 2, 3, 4, 5):
+        raise ValueError(f"invalid rating {row.get('rating')!r}")
+    review['rating'] = int(rating)
+    review['date'] = date.fromisoformat(_text(row, 'date', True)).isoformat()
+    # No sentiment yet: --moderate fills it in
+    return {field: review.get(field) for field in REVIEW_FIELDS}
+
+
+if __name__ == '__main__':
+    main()
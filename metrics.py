@@ -0,0 +1,234 @@
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import wraps
+
+import flask
+
+UPDATE_COMPONENT_PATH = '/_dash-update-component'
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# With a directory, each worker writes its numbers there at most this often
+# (and whenever /metrics is scraped), and /metrics reports the sum over all
+# workers
+SNAPSHOT_INTERVAL = 5.0
+
+
+# Process-local request metrics, exposed in the Prometheus text format on
+# /metrics:
+#   - callback latency and response size per callback, measured around the
+#     whole /_dash-update-component request (so including serialization)
+#   - time spent in the functions decorated with timed()
+#   - values read from other objects when scraped (cache hits, review
+#     writer counters), added with collect()
+# Server-Timing headers with the same timings can be turned on separately.
+# When disabled, timed() returns the function unchanged and no hooks are
+# installed, so there is no overhead.
+class Metrics:
+    def __init__(self, enabled=False, server_timing=False, directory=None):
+        self.enabled = enabled or server_timing
+        self.server_timing = server_timing
+        self.directory = directory
+        self._families = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._last_snapshot = 0.0
+        self.describe('restaurant_callback_duration_seconds', 'histogram',
+                      "Time to answer a callback request, including serialization",
+                      'callback', LATENCY_BUCKETS)
+        self.describe('restaurant_callback_response_bytes', 'histogram',
+                      "Size of callback responses as sent", 'callback', SIZE_BUCKETS)
+        self.describe('restaurant_function_duration_seconds', 'histogram',
+                      "Time spent in page builders and callback functions", 'function',
+                      LATENCY_BUCKETS)
+
+    def describe(self, name, kind, help, label=None, buckets=None):
+        self._families[name] = (kind, help, label, buckets)
+
+    # Adds metrics read when scraped: collect() returns {label value: number}
+    # for a family with a label, or a number
+    def collect(self, name, kind, help, label, collect):
+        self.describe(name, kind, help, label)
+        self._collectors.append((name, collect))
+
+    # Decorator recording the duration of every call of fn
+    def timed(self, fn):
+        if not self.enabled:
+            return fn
+        name = fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._timing(name, time.perf_counter() - start)
+
+        return wrapper
+
+    def _timing(self, name, seconds):
+        self.observe('restaurant_function_duration_seconds', name, seconds)
+        if self.server_timing and flask.has_request_context():
+            timings = flask.g.setdefault('server_timing', {})
+            total, calls = timings.get(name, (0.0, 0))
+            timings[name] = (total + seconds, calls + 1)
+
+    def observe(self, name, label, value):
+        buckets = self._families[name][3]
+        with self._lock:
+            histogram = self._histograms.get((name, label))
+            if histogram is None:
+                # Count per bucket (the last one is +Inf), sum, count
+                histogram = self._histograms[(name, label)] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def init_app(self, server, path='/metrics'):
+        if not self.enabled:
+            return
+        # Registered before the other hooks, so responses they answer from a
+        # cache are timed too, and the size is measured after the others
+        # have changed the response
+        server.before_request_funcs.setdefault(None, []).insert(0, self._before_request)
+        server.after_request_funcs.setdefault(None, []).insert(0, self._after_request)
+        server.add_url_rule(path, 'metrics', self._serve)
+
+    def _before_request(self):
+        if flask.request.path.endswith(UPDATE_COMPONENT_PATH):
+            flask.g.metrics_start = time.perf_counter()
+
+    def _after_request(self, response):
+        start = flask.g.pop('metrics_start', None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        callback = _callback_name(response)
+        self.observe('restaurant_callback_duration_seconds', callback, seconds)
+        size = response.calculate_content_length()
+        if size is not None:
+            self.observe('restaurant_callback_response_bytes', callback, size)
+        if self.server_timing:
+            response.headers['Server-Timing'] = _server_timing(seconds)
+        if self.directory and time.monotonic() - self._last_snapshot > SNAPSHOT_INTERVAL:
+            self._write_snapshot()
+        return response
+
+    def _serve(self):
+        snapshot = self.snapshot()
+        if self.directory:
+            self._write_snapshot(snapshot)
+            snapshot = _merge(self._read_snapshots())
+        return flask.Response(self.render(snapshot), mimetype='text/plain; version=0.0.4')
+
+    # This process's numbers as plain data: {'histograms': {name: {label:
+    # [buckets, sum, count]}}, 'values': {name: {label: number}}}
+    def snapshot(self):
+        histograms = {}
+        with self._lock:
+            for (name, label), (counts, total, count) in self._histograms.items():
+                histograms.setdefault(name, {})[label] = [list(counts), total, count]
+        values = {}
+        for name, collect in self._collectors:
+            collected = collect()
+            values[name] = collected if isinstance(collected, dict) else {'': collected}
+        return {'histograms': histograms, 'values': values}
+
+    def render(self, snapshot):
+        lines = []
+        for name, (kind, help, label, buckets) in self._families.items():
+            samples = (snapshot['histograms'] if kind == 'histogram' else snapshot['values']).get(name)
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label_value, sample in sorted(samples.items()):
+                labels = f'{label}="{_escape(label_value)}"' if label else ''
+                if kind != 'histogram':
+                    lines.append(f"{name}{{{labels}}} {sample}" if labels else f"{name} {sample}")
+                    continue
+                counts, total, count = sample
+                prefix = f"{labels}," if labels else ''
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def _write_snapshot(self, snapshot=None):
+        self._last_snapshot = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot or self.snapshot(), f)
+        os.replace(tmp, os.path.join(self.directory, f"metrics-{os.getpid()}.json"))
+
+    def _read_snapshots(self):
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    yield json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+
+
+# Callback requests are labelled with their first output; failed ones
+# (which may not name a real callback) all go under "error"
+def _callback_name(response):
+    if response.status_code >= 400:
+        return 'error'
+    body = flask.request.get_json(silent=True) or {}
+    outputs = body.get('outputs')
+    first = outputs[0] if isinstance(outputs, list) and outputs else outputs
+    if not isinstance(first, dict):
+        return 'unknown'
+    component_id = first.get('id')
+    if isinstance(component_id, dict):
+        component_id = json.dumps(component_id, sort_keys=True)
+    return f"{component_id}.{first.get('property')}"
+
+
+def _server_timing(seconds):
+    entries = [f"total;dur={seconds * 1000:.2f}"]
+    if flask.g.get('response_cache_hit'):
+        entries.append('response-cache;desc="hit"')
+    for name, (total, calls) in flask.g.pop('server_timing', {}).items():
+        entries.append(f'{name};dur={total * 1000:.2f};desc="{calls} calls"' if calls > 1
+                       else f"{name};dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+
+# Sums the snapshots of all workers
+def _merge(snapshots):
+    merged = {'histograms': {}, 'values': {}}
+    for snapshot in snapshots:
+        for name, samples in snapshot['histograms'].items():
+            family = merged['histograms'].setdefault(name, {})
+            for label, (counts, total, count) in samples.items():
+                current = family.get(label)
+                if current is None:
+                    family[label] = [list(counts), total, count]
+                else:
+                    current[0] = [a + b for a, b in zip(current[0], counts)]
+                    current[1] += total
+                    current[2] += count
+        for name, samples in snapshot['values'].items():
+            family = merged['values'].setdefault(name, {})
+            for label, value in samples.items():
+                family[label] = family.get(label, 0) + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import math
+import re
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+
+from search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Why a review was turned away, in the order they are checked
+REJECT_REASONS = ('spam', 'profanity', 'duplicate')
+
+# Texts with fewer words than this ("Great food!") are too common to count
+# as duplicates of each other, so they get no text hash
+MIN_DUPLICATE_WORDS = 5
+# The same text posted to more restaurants than this is spam
+MAX_COPIES = 3
+# Reviews per chunk handed to a worker process
+CHUNK_SIZE = 2000
+
+_LINK_RE = re.compile(r'https?://|www\.|\b[\w.+-]+@[\w-]+\.\w{2,}\b', re.IGNORECASE)
+_REPEATED_CHARACTER_RE = re.compile(r'(\S)\1{9,}')
+# Texts of this many words or more are spam if one word is over half of them
+_REPEATED_WORD_MIN_WORDS = 8
+
+_PROFANITY = ('arse', 'arsehole', 'ass', 'asshole', 'bastard', 'bitch', 'bullshit', 'crap',
+              'damn', 'dick', 'fuck', 'fucked', 'fucking', 'piss', 'pissed', 'shit', 'shitty')
+_PROFANITY_RE = re.compile(r'\b(?:%s)\b' % '|'.join(_PROFANITY), re.IGNORECASE)
+# Reviews where at least this share of the words are profane are rejected;
+# below it the words are masked
+_MAX_PROFANITY_SHARE = 0.25
+
+# Sentiment lexicon: word weights, and words that flip the next few
+_POSITIVE = dict.fromkeys((
+    'amazing', 'awesome', 'beautiful', 'best', 'delicious', 'delightful', 'excellent',
+    'exceptional', 'fantastic', 'fresh', 'friendly', 'generous', 'great', 'helpful',
+    'impeccable', 'incredible', 'love', 'loved', 'lovely', 'outstanding', 'perfect',
+    'perfection', 'recommend', 'superb', 'tasty', 'wonderful', 'yummy'), 2)
+_POSITIVE.update(dict.fromkeys((
+    'clean', 'cozy', 'enjoyed', 'fine', 'fun', 'good', 'nice', 'pleasant', 'quick',
+    'reasonable', 'solid', 'value', 'warm', 'welcoming'), 1))
+_NEGATIVE = dict.fromkeys((
+    'awful', 'disgusting', 'dreadful', 'horrible', 'inedible', 'poisoning', 'rude',
+    'terrible', 'worst'), -2)
+_NEGATIVE.update(dict.fromkeys((
+    'bad', 'bland', 'burnt', 'cold', 'dirty', 'disappointed', 'disappointing', 'expensive',
+    'greasy', 'mediocre', 'noisy', 'overpriced', 'poor', 'slow', 'soggy', 'stale',
+    'undercooked', 'unfriendly'), -1))
+_SENTIMENT_WEIGHTS = {**_POSITIVE, **_NEGATIVE}
+# Pairs of words weighted together, for words that mean little alone
+# ("a long wait", but "can't wait to come back")
+_PHRASE_WEIGHTS = dict.fromkeys((('long', 'wait'), ('long', 'waits'), ('waited', 'forever')), -1)
+# tokenize() splits "wasn't" into "wasn" and "t"
+_NEGATIONS = frozenset(('not', 'no', 'never', 'nothing', 'hardly', 'barely', 'without',
+                        'isn', 'wasn', 'aren', 'weren', 'don', 'didn', 'doesn', 'couldn',
+                        'wouldn', 'won', 'cannot'))
+_NEGATION_REACH = 3
+# Scores are squashed into (-1, 1) with x / sqrt(x * x + _SENTIMENT_ALPHA),
+# so a couple of strong words already give a clear score
+_SENTIMENT_ALPHA = 15
+# Scores at least this far from 0 are labelled positive or negative
+_SENTIMENT_LABEL_THRESHOLD = 0.25
+
+
+# 63-bit hash of the words of a review text, ignoring case, punctuation and
+# spacing; fits an array('q') and a SQLite INTEGER, and is never 0
+def text_hash(text):
+    digest = hashlib.blake2b(' '.join(tokenize(text)).encode(), digest_size=8).digest()
+    return (int.from_bytes(digest, 'big') >> 1) or 1
+
+
+# Masks profane words, keeping their first letter. Returns the text and the
+# number of words masked.
+def censor(text):
+    return _PROFANITY_RE.subn(lambda match: match.group()[0] + '*' * (len(match.group()) - 1), text)
+
+
+# Sentiment of a text from -1 (negative) to 1 (positive), from a small word
+# and phrase lexicon with negation ("not good"), rounded to 2 decimals
+def sentiment_score(words):
+    score = 0
+    negated = 0
+    previous = None
+    for word in words:
+        if word in _NEGATIONS:
+            negated = _NEGATION_REACH
+            previous = word
+            continue
+        weight = _SENTIMENT_WEIGHTS.get(word)
+        if weight is None:
+            weight = _PHRASE_WEIGHTS.get((previous, word))
+        if weight is not None:
+            score += -weight if negated else weight
+        negated = max(negated - 1, 0)
+        previous = word
+    return round(score / math.sqrt(score * score + _SENTIMENT_ALPHA), 2)
+
+
+def sentiment_label(score):
+    if score is None:
+        return None
+    if score >= _SENTIMENT_LABEL_THRESHOLD:
+        return 'positive'
+    if score <= -_SENTIMENT_LABEL_THRESHOLD:
+        return 'negative'
+    return 'mixed'
+
+
+# Links or contact details, a character repeated 10 times or more, or one
+# word making up most of a longer text
+def looks_like_spam(text, words):
+    if _LINK_RE.search(text) or _REPEATED_CHARACTER_RE.search(text):
+        return True
+    if len(words) >= _REPEATED_WORD_MIN_WORDS:
+        count = Counter(words).most_common(1)[0][1]
+        return count * 2 > len(words)
+    return False
+
+
+# The checks that need nothing but the review itself. Returns the review
+# with profanity masked and sentiment and text_hash added, and the reject
+# reason ('spam' or 'profanity') or None. A plain function, so batches of
+# reviews can go to a process pool.
+def analyze(review):
+    text = review['review_text']
+    words = tokenize(text)
+    review = dict(review)
+    review['sentiment'] = sentiment_score(words)
+    review['text_hash'] = text_hash(text) if len(words) >= MIN_DUPLICATE_WORDS else None
+    if looks_like_spam(text, words):
+        return review, 'spam'
+    review['review_text'], masked = censor(text)
+    if masked and masked >= _MAX_PROFANITY_SHARE * len(words):
+        return review, 'profanity'
+    return review, None
+
+
+def analyze_batch(reviews):
+    return [analyze(review) for review in reviews]
+
+
+# Checks new reviews before they are published: spam, profanity and
+# duplicates (the same words already posted about the restaurant, or
+# posted about more than MAX_COPIES restaurants recently), and adds a
+# sentiment score. With an executor (e.g. a ProcessPoolExecutor) the
+# per-review analysis runs there in chunks; the duplicate checks need the
+# repository and the recent texts, so they stay in the calling thread.
+# Not thread-safe: each ReviewWriter or backfill has its own.
+class Moderator:
+    def __init__(self, repository, executor=None, window=100000):
+        self.repository = repository
+        self.executor = executor
+        # Restaurants each recent text hash was posted about, oldest first
+        self.window = window
+        self._copies = OrderedDict()
+        # Counters since startup
+        self.accepted = 0
+        self.rejected = dict.fromkeys(REJECT_REASONS, 0)
+
+    # Returns (accepted reviews, [(review, reason), ...] rejected). Accepted
+    # reviews are enriched copies, ready for repository.add_reviews.
+    def moderate(self, reviews):
+        return self.finish(self.start(reviews))
+
+    # moderate() in two steps, so the next batch can be analyzed while the
+    # previous one is finished and written: start() sends the reviews to
+    # the executor (or analyzes them right away without one) and finish()
+    # takes what it returned and runs the duplicate checks. Batches must be
+    # finished in the order they were started.
+    def start(self, reviews):
+        if self.executor is None or len(reviews) <= CHUNK_SIZE:
+            return [analyze_batch(reviews)]
+        return [self.executor.submit(analyze_batch, reviews[i:i + CHUNK_SIZE])
+                for i in range(0, len(reviews), CHUNK_SIZE)]
+
+    def finish(self, started):
+        results = list(chain.from_iterable(
+            chunk.result() if isinstance(chunk, Future) else chunk for chunk in started))
+        duplicates = self.repository.duplicate_review_ids(
+            [review for review, reason in results if reason is None and review['text_hash']])
+        seen = set()
+        accepted, rejected = [], []
+        for review, reason in results:
+            if reason is None and review['text_hash']:
+                key = (review['restaurant_id'], review['text_hash'])
+                if review['id'] in duplicates or key in seen:
+                    reason = 'duplicate'
+                elif self._copy_count(review) > MAX_COPIES:
+                    reason = 'spam'
+                seen.add(key)
+            if reason is None:
+                accepted.append(review)
+            else:
+                rejected.append((review, reason))
+                self.rejected[reason] += 1
+                logger.info("rejected review %s of restaurant %s: %s",
+                            review['id'], review['restaurant_id'], reason)
+        self.accepted += len(accepted)
+        return accepted, rejected
+
+    # The number of restaurants the review's text has recently been posted
+    # about, including this one
+    def _copy_count(self, review):
+        restaurants = self._copies.pop(review['text_hash'], None) or set()
+        restaurants.add(review['restaurant_id'])
+        self._copies[review['text_hash']] = restaurants
+        if len(self._copies) > self.window:
+            self._copies.popitem(last=False)
+        return len(restaurants)
+
+
+# Moderates the reviews in a SQLiteRepository that have not been yet (bulk
+# imports, or reviews from before moderation), batch_size at a time, with
+# the analysis spread over that many worker processes. Accepted reviews
+# get their masked text, sentiment and text hash written back; rejected
+# ones are removed with remove_rejected, or else kept (and hashed, so their
+# copies are still found). progress is called with the number done after
+# each batch. Returns the moderator, for its counters, and that number.
+def backfill(repository, workers=1, batch_size=20000, remove_rejected=False, progress=None):
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    moderator = Moderator(repository, executor)
+    done = after_seq = 0
+    started = None
+    try:
+        while True:
+            batch = repository.unmoderated_reviews(after_seq, batch_size)
+            # The workers analyze this batch while the previous one is written
+            upcoming = None
+            if batch:
+                after_seq = batch[-1][0]
+                upcoming = moderator.start([review for _, review in batch]), len(batch)
+            if started is not None:
+                accepted, rejected = moderator.finish(started[0])
+                repository.update_reviews(accepted + [review for review, _ in rejected])
+                if remove_rejected:
+                    repository.remove_reviews([review['id'] for review, _ in rejected])
+                done += started[1]
+                if progress is not None:
+                    progress(done)
+            if upcoming is None:
+                break
+            started = upcoming
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return moderator, done
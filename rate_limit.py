@@ -0,0 +1,91 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import flask
+
+from response_cache import UPDATE_COMPONENT_PATH
+
+logger = logging.getLogger(__name__)
+
+
+# Token buckets per client for a few named limits, each (rate, burst): a
+# client may average rate requests per second and make up to burst at
+# once. A rate of 0 turns the limit off. Buckets live in this process, so
+# with several workers a client gets up to that many times the rate.
+# Clients beyond max_clients push out the least recently seen ones, whose
+# buckets start full again when they come back.
+class RateLimiter:
+    def __init__(self, limits, max_clients=100000, clock=time.monotonic):
+        self.limits = dict(limits)
+        self.max_clients = max_clients
+        self._clock = clock
+        # (limit, client) -> (tokens, time they were counted)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        # Requests turned away, per limit
+        self.throttled = dict.fromkeys(self.limits, 0)
+
+    # Takes a token from the client's bucket for the limit. Returns 0 if
+    # there was one, or else the seconds until there will be.
+    def acquire(self, limit, client):
+        rate, burst = self.limits[limit]
+        if not rate:
+            return 0
+        key = (limit, client)
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets.pop(key, None)
+            tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+                self.throttled[limit] += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    # Holds every callback request to the given limit; the ones over it get
+    # a 429 with a Retry-After header, and Dash leaves their outputs as
+    # they were
+    def init_app(self, server, limit):
+        def before_request():
+            if not flask.request.path.endswith(UPDATE_COMPONENT_PATH):
+                return None
+            wait = self.acquire(limit, client_address())
+            if not wait:
+                return None
+            response = flask.Response("Too many requests, slow down", status=429,
+                                      mimetype='text/plain')
+            response.headers['Retry-After'] = str(math.ceil(wait))
+            return response
+
+        server.before_request(before_request)
+
+
+# The client's IP address. Behind reverse proxies this is the proxy's
+# unless the app trusts their X-Forwarded-For (TRUSTED_PROXIES in app.py).
+def client_address():
+    return flask.request.remote_addr or 'unknown'
+
+
+# Logs a warning, once per process, when a request comes through a reverse
+# proxy (it has X-Forwarded-For) while the app trusts none: every client
+# then has the proxy's address and shares its buckets
+def warn_untrusted_proxies(server):
+    warned = False
+
+    def before_request():
+        nonlocal warned
+        if not warned and 'X-Forwarded-For' in flask.request.headers:
+            warned = True
+            logger.warning("requests come through a reverse proxy, but TRUSTED_PROXIES is not "
+                           "set: rate limits treat every client as the proxy (%s)",
+                           client_address())
+
+    server.before_request(before_request)
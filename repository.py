@@ -0,0 +1,1076 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
+
+from geo import GeoIndex
+from search import SearchIndex, tokenize, MIN_PREFIX_LENGTH
+from store import (BAYESIAN_PRIOR_MEAN, BAYESIAN_PRIOR_WEIGHT, FILTER_FIELDS, ROLLUP_FIELDS, ROLLUP_PERIODS,
+                   TRENDING_DAYS, Leaderboards, RatingAggregates, RatingStats, RestaurantIndex, ReviewIndex,
+                   REVIEW_ORDERS, ReviewRollups, check_review)
+
+RESTAURANT_FIELDS = ('id', 'name', 'cuisine', 'location', 'price_range', 'image',
+                     'description', 'phone', 'address', 'latitude', 'longitude')
+REVIEW_FIELDS = ('id', 'restaurant_id', 'reviewer_name', 'rating', 'review_text', 'date',
+                 'sentiment')
+# Also stored with each review, but only used to find duplicates
+_REVIEW_COLUMNS = REVIEW_FIELDS + ('text_hash',)
+
+# Storage API used by the page builders and callbacks. Restaurants and
+# reviews go in and come out as plain dicts with the fields above.
+class Repository:
+    def get_restaurant(self, restaurant_id):
+        raise NotImplementedError
+
+    def list_restaurants(self):
+        raise NotImplementedError
+
+    def add_restaurant(self, restaurant):
+        raise NotImplementedError
+
+    def add_review(self, review):
+        self.add_reviews([review])
+
+    # All or nothing: a batch with a duplicate id or a review that fails
+    # store.check_review raises ValueError (SQLite: or IntegrityError) and
+    # stores none of it
+    def add_reviews(self, reviews):
+        raise NotImplementedError
+
+    def remove_review(self, review_id):
+        raise NotImplementedError
+
+    # The ids of those reviews whose restaurant already has a review with
+    # the same text_hash (see moderation.text_hash), as a set
+    def duplicate_review_ids(self, reviews):
+        raise NotImplementedError
+
+    def get_rating_stats(self, restaurant_id):
+        raise NotImplementedError
+
+    # Changes whenever the restaurant or any of its reviews change
+    def restaurant_version(self, restaurant_id):
+        raise NotImplementedError
+
+    # Changes whenever a restaurant is added
+    def catalog_version(self):
+        raise NotImplementedError
+
+    # Changes whenever anything is written, by this process or, for shared
+    # stores, any other one
+    def data_version(self):
+        raise NotImplementedError
+
+    # order is None for insertion order, or one of store.REVIEW_ORDERS:
+    # 'newest', 'highest' or 'lowest' (rating, then newest first). Any
+    # other value gives insertion order, like an unknown sort key does in
+    # query_restaurants.
+    def get_reviews(self, restaurant_id, order=None, offset=0, limit=None):
+        raise NotImplementedError
+
+    # Returns (total, restaurants) for one page of the filtered, searched and
+    # sorted catalogue. near is a (latitude, longitude) point: with
+    # radius_km only restaurants within that many km of it are included,
+    # and sort_by='distance' puts the nearest first (restaurants without
+    # coordinates are then left out). Without near, 'distance' keeps
+    # catalogue order like any other unknown sort key.
+    def query_restaurants(self, cuisine='all', location='all', price='all',
+                          sort_by='rating_desc', search=None, offset=0, limit=None,
+                          near=None, radius_km=None):
+        raise NotImplementedError
+
+    # Returns {field: [(value, restaurant count), ...]} for each of
+    # store.FILTER_FIELDS, sorted by value
+    def facets(self):
+        raise NotImplementedError
+
+    # Restaurants whose name matches query (last word as a prefix), by name
+    def suggest_restaurants(self, query, limit=20):
+        raise NotImplementedError
+
+    # The best limit restaurants on a leaderboard (one of store.LEADERBOARDS:
+    # 'top_rated' by Bayesian average, 'most_reviewed' or 'trending', by
+    # reviews dated in the last store.TRENDING_DAYS days), overall or for a
+    # cuisine and/or location, as (restaurant, score) pairs. Restaurants
+    # without a score (no reviews, or none this week) are left out; ties go
+    # to the restaurant added first.
+    def leaderboard(self, board, cuisine='all', location='all', limit=10):
+        raise NotImplementedError
+
+    # Review counts and rating totals per period (one of
+    # store.ROLLUP_PERIODS), cuisine and location, as dicts with
+    # store.ROLLUP_FIELDS ordered by date, the first day of the period.
+    # Reviews of restaurants not in the catalogue are left out.
+    def review_rollups(self, cuisine='all', location='all', period='D'):
+        raise NotImplementedError
+
+
+# Keeps everything in process memory, with the aggregates and indexes from
+# store.py and search.py kept in step on every write. Reviews are stored
+# column-wise (store.ReviewColumns) rather than as one dict each.
+class InMemoryRepository(Repository):
+    def __init__(self, restaurants=(), reviews=()):
+        self._lock = threading.RLock()
+        self._aggregates = RatingAggregates()
+        self._index = RestaurantIndex(self._aggregates)
+        self._search = SearchIndex()
+        self._name_search = SearchIndex(fields=('name',))
+        self._reviews = ReviewIndex()
+        self._rollups = ReviewRollups()
+        self._geo = GeoIndex()
+        self._leaderboards = Leaderboards(self._aggregates)
+        self._versions = {}
+        self._catalog_version = 0
+        self._data_version = 0
+        for restaurant in restaurants:
+            self.add_restaurant(restaurant)
+        self.add_reviews(reviews)
+
+    def get_restaurant(self, restaurant_id):
+        return self._index.get(restaurant_id)
+
+    def list_restaurants(self):
+        with self._lock:
+            return [self._index.get(restaurant_id)
+                    for restaurant_id in self._index.query(sort_by=None)[1]]
+
+    def add_restaurant(self, restaurant):
+        # Categorical values are interned so every restaurant shares one
+        # string per distinct cuisine, location and price range
+        restaurant = dict(restaurant)
+        for field in FILTER_FIELDS:
+            restaurant[field] = sys.intern(restaurant[field])
+        with self._lock:
+            self._index.add(restaurant)
+            if restaurant.get('latitude') is None or restaurant.get('longitude') is None:
+                self._geo.remove(restaurant['id'])
+            else:
+                self._geo.add(restaurant['id'], restaurant['latitude'], restaurant['longitude'])
+            self._search.add_restaurant(restaurant)
+            self._name_search.add_restaurant(restaurant)
+            self._leaderboards.add_restaurant(restaurant)
+            self._leaderboards.refresh()
+            self._bump(restaurant['id'])
+            self._catalog_version += 1
+
+    def add_reviews(self, reviews):
+        reviews = list(reviews)
+        with self._lock:
+            # Check the whole batch first so a bad review leaves nothing half
+            # applied, matching the SQLite transaction
+            ids = set()
+            for review in reviews:
+                if review['id'] in self._reviews or review['id'] in ids:
+                    raise ValueError(f"duplicate review id {review['id']!r}")
+                check_review(review)
+                ids.add(review['id'])
+            for review in reviews:
+                self._reviews.add(review)
+                self._aggregates.add(review)
+                self._index.rating_changed(review['restaurant_id'])
+                self._search.add_review(review)
+                restaurant = self._index.get(review['restaurant_id'])
+                if restaurant is not None:
+                    self._rollups.add(review, restaurant)
+                self._leaderboards.review_added(review)
+                self._bump(review['restaurant_id'])
+            self._leaderboards.refresh()
+
+    def remove_review(self, review_id):
+        with self._lock:
+            review = self._reviews.remove(review_id)
+            if review is None:
+                return None
+            self._aggregates.remove(review)
+            self._index.rating_changed(review['restaurant_id'])
+            self._search.remove_review(review)
+            restaurant = self._index.get(review['restaurant_id'])
+            if restaurant is not None:
+                self._rollups.remove(review, restaurant)
+            self._leaderboards.review_removed(review)
+            self._leaderboards.refresh()
+            self._bump(review['restaurant_id'])
+            return review
+
+    def duplicate_review_ids(self, reviews):
+        with self._lock:
+            return {review['id'] for review in reviews
+                    if self._reviews.has_text(review['restaurant_id'], review['text_hash'])}
+
+    def _bump(self, restaurant_id):
+        self._versions[restaurant_id] = self._versions.get(restaurant_id, 0) + 1
+        self._data_version += 1
+
+    def get_rating_stats(self, restaurant_id):
+        return self._aggregates.get(restaurant_id)
+
+    def restaurant_version(self, restaurant_id):
+        return self._versions.get(restaurant_id, 0)
+
+    def catalog_version(self):
+        return self._catalog_version
+
+    def data_version(self):
+        return self._data_version
+
+    def get_reviews(self, restaurant_id, order=None, offset=0, limit=None):
+        with self._lock:
+            return self._reviews.page(restaurant_id, order if order in REVIEW_ORDERS else None,
+                                      offset, limit)
+
+    def query_restaurants(self, cuisine='all', location='all', price='all',
+                          sort_by='rating_desc', search=None, offset=0, limit=None,
+                          near=None, radius_km=None):
+        with self._lock:
+            matches = self._search.search(search)
+            if near is not None and sort_by == 'distance':
+                total, restaurant_ids = self._query_nearest(cuisine, location, price, matches,
+                                                            near, radius_km, offset, limit)
+            else:
+                if near is not None and radius_km is not None:
+                    matches = _intersect(self._geo.ids_within(near[0], near[1], radius_km),
+                                         matches)
+                total, restaurant_ids = self._index.query(cuisine, location, price, sort_by,
+                                                          within=matches, offset=offset,
+                                                          limit=limit)
+            return total, [self._index.get(restaurant_id) for restaurant_id in restaurant_ids]
+
+    def _query_nearest(self, cuisine, location, price, matches, near, radius_km, offset, limit):
+        matched = self._index.match(cuisine, location, price, within=matches)
+        total = None
+        if matched is not None and radius_km is None and len(self._geo) == len(self._index):
+            # Every restaurant has coordinates, so all of them count
+            total = len(matched)
+        return _nearest_page(self._geo, near, radius_km, matched, offset, limit, total)
+
+    def facets(self):
+        with self._lock:
+            return {field: sorted(self._index.facet_counts(field).items())
+                    for field in FILTER_FIELDS}
+
+    def suggest_restaurants(self, query, limit=20):
+        with self._lock:
+            matches = self._name_search.search(query)
+            if matches is None:
+                return []
+            restaurant_ids = self._index.query(sort_by='name_asc', within=matches, limit=limit)[1]
+            return [self._index.get(restaurant_id) for restaurant_id in restaurant_ids]
+
+    def review_rollups(self, cuisine='all', location='all', period='D'):
+        with self._lock:
+            return self._rollups.rows(cuisine, location, period)
+
+    def leaderboard(self, board, cuisine='all', location='all', limit=10):
+        with self._lock:
+            return [(self._index.get(restaurant_id), score) for restaurant_id, score
+                    in self._leaderboards.top(board, cuisine, location, limit)]
+
+
+# The ids (an iterable) that are also in matches, a container or None for
+# no restriction, as a set
+def _intersect(ids, matches):
+    if matches is None:
+        return set(ids)
+    return {restaurant_id for restaurant_id in ids if restaurant_id in matches}
+
+
+# Up to this many candidates are put in distance order directly rather than
+# by searching the GeoIndex
+_RANK_LIMIT = 5000
+
+
+# (total, ids) for one page of the restaurants nearest to near (within
+# radius_km, if given) whose ids are in matched, a set, or all of them for
+# None. Small sets are ranked directly; otherwise the page is taken from
+# GeoIndex.nearest(), which stops searching once it is full. total is
+# counted unless the caller already knows it.
+def _nearest_page(geo, near, radius_km, matched, offset, limit, total=None):
+    stop = None if limit is None else offset + limit
+    if matched is not None and len(matched) <= _RANK_LIMIT:
+        ranked = geo.rank(matched, near[0], near[1], radius_km)
+        return len(ranked), [restaurant_id for _, restaurant_id in ranked[offset:stop]]
+    if total is None and matched is None:
+        total = len(geo) if radius_km is None else geo.count_within(near[0], near[1], radius_km)
+    elif total is None and radius_km is None:
+        total = sum(1 for restaurant_id in matched if restaurant_id in geo)
+    elif total is None:
+        total = geo.count_within(near[0], near[1], radius_km, matching=matched)
+    stop = total if stop is None else min(stop, total)
+    restaurant_ids = (restaurant_id for _, restaurant_id in geo.nearest(near[0], near[1], radius_km)
+                      if matched is None or restaurant_id in matched)
+    return total, list(islice(restaurant_ids, offset, stop))
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS restaurants (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    cuisine TEXT NOT NULL,
+    location TEXT NOT NULL,
+    price_range TEXT NOT NULL,
+    image TEXT,
+    description TEXT,
+    phone TEXT,
+    address TEXT,
+    latitude REAL,
+    longitude REAL,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0,
+    avg_rating REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS restaurants_cuisine ON restaurants (cuisine);
+CREATE INDEX IF NOT EXISTS restaurants_location ON restaurants (location);
+CREATE INDEX IF NOT EXISTS restaurants_price_range ON restaurants (price_range);
+CREATE INDEX IF NOT EXISTS restaurants_name ON restaurants (name, seq);
+CREATE INDEX IF NOT EXISTS restaurants_avg_rating ON restaurants (avg_rating, seq);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    restaurant_id TEXT NOT NULL,
+    reviewer_name TEXT NOT NULL,
+    rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5),
+    review_text TEXT NOT NULL,
+    date TEXT NOT NULL,
+    sentiment REAL,
+    text_hash INTEGER
+);
+CREATE INDEX IF NOT EXISTS reviews_restaurant ON reviews (restaurant_id, seq);
+CREATE INDEX IF NOT EXISTS reviews_restaurant_date ON reviews (restaurant_id, date, seq);
+CREATE INDEX IF NOT EXISTS reviews_restaurant_highest ON reviews (restaurant_id, rating, date, seq);
+CREATE INDEX IF NOT EXISTS reviews_restaurant_lowest
+    ON reviews (restaurant_id, rating, date DESC, seq DESC);
+CREATE INDEX IF NOT EXISTS reviews_restaurant_text ON reviews (restaurant_id, text_hash)
+    WHERE text_hash IS NOT NULL;
+
+-- Rating aggregates live on the restaurant row and are maintained by
+-- triggers, in the same transaction as the review write. avg_rating is
+-- rounded half up with integer division, like RatingStats.average.
+CREATE TRIGGER IF NOT EXISTS reviews_stats_insert AFTER INSERT ON reviews BEGIN
+    UPDATE restaurants SET
+        review_count = review_count + 1,
+        rating_sum = rating_sum + new.rating,
+        rating_1 = rating_1 + (new.rating = 1),
+        rating_2 = rating_2 + (new.rating = 2),
+        rating_3 = rating_3 + (new.rating = 3),
+        rating_4 = rating_4 + (new.rating = 4),
+        rating_5 = rating_5 + (new.rating = 5),
+        avg_rating = (20 * (rating_sum + new.rating) + review_count + 1)
+            / (2 * (review_count + 1)) / 10.0,
+        version = version + 1
+    WHERE id = new.restaurant_id;
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_stats_delete AFTER DELETE ON reviews BEGIN
+    UPDATE restaurants SET
+        review_count = review_count - 1,
+        rating_sum = rating_sum - old.rating,
+        rating_1 = rating_1 - (old.rating = 1),
+        rating_2 = rating_2 - (old.rating = 2),
+        rating_3 = rating_3 - (old.rating = 3),
+        rating_4 = rating_4 - (old.rating = 4),
+        rating_5 = rating_5 - (old.rating = 5),
+        avg_rating = CASE WHEN review_count > 1
+            THEN (20 * (rating_sum - old.rating) + review_count - 1)
+                / (2 * (review_count - 1)) / 10.0
+            ELSE 0 END,
+        version = version + 1
+    WHERE id = old.restaurant_id;
+END;
+
+-- Restaurant counts per filter value, maintained by triggers
+CREATE TABLE IF NOT EXISTS facets (
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (field, value)
+);
+CREATE TRIGGER IF NOT EXISTS restaurants_facets_insert AFTER INSERT ON restaurants BEGIN
+    INSERT INTO facets (field, value, count) VALUES
+        ('cuisine', new.cuisine, 1), ('location', new.location, 1),
+        ('price_range', new.price_range, 1)
+    ON CONFLICT (field, value) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS restaurants_facets_delete AFTER DELETE ON restaurants BEGIN
+    UPDATE facets SET count = count - 1
+    WHERE (field = 'cuisine' AND value = old.cuisine)
+       OR (field = 'location' AND value = old.location)
+       OR (field = 'price_range' AND value = old.price_range);
+    DELETE FROM facets WHERE count <= 0;
+END;
+
+-- Reviews per period, cuisine and location, maintained by triggers for the
+-- analytics page (see store.ReviewRollups). period is one of
+-- store.ROLLUP_PERIODS and date the first day of the period.
+CREATE TABLE IF NOT EXISTS review_rollups (
+    period TEXT NOT NULL,
+    date TEXT NOT NULL,
+    cuisine TEXT NOT NULL,
+    location TEXT NOT NULL,
+    review_count INTEGER NOT NULL,
+    rating_sum INTEGER NOT NULL,
+    rating_1 INTEGER NOT NULL,
+    rating_2 INTEGER NOT NULL,
+    rating_3 INTEGER NOT NULL,
+    rating_4 INTEGER NOT NULL,
+    rating_5 INTEGER NOT NULL,
+    PRIMARY KEY (period, date, cuisine, location)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS reviews_rollups_insert AFTER INSERT ON reviews BEGIN
+    INSERT INTO review_rollups
+    SELECT p.period, p.date, r.cuisine, r.location, 1, new.rating, new.rating = 1,
+           new.rating = 2, new.rating = 3, new.rating = 4, new.rating = 5
+    FROM (%s) p, restaurants r
+    WHERE r.id = new.restaurant_id
+    ON CONFLICT (period, date, cuisine, location) DO UPDATE SET
+        review_count = review_count + 1,
+        rating_sum = rating_sum + excluded.rating_sum,
+        rating_1 = rating_1 + excluded.rating_1,
+        rating_2 = rating_2 + excluded.rating_2,
+        rating_3 = rating_3 + excluded.rating_3,
+        rating_4 = rating_4 + excluded.rating_4,
+        rating_5 = rating_5 + excluded.rating_5;
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_rollups_delete AFTER DELETE ON reviews BEGIN
+    UPDATE review_rollups SET
+        review_count = review_count - 1,
+        rating_sum = rating_sum - old.rating,
+        rating_1 = rating_1 - (old.rating = 1),
+        rating_2 = rating_2 - (old.rating = 2),
+        rating_3 = rating_3 - (old.rating = 3),
+        rating_4 = rating_4 - (old.rating = 4),
+        rating_5 = rating_5 - (old.rating = 5)
+    WHERE (period, date) IN (%s)
+      AND (cuisine, location) =
+        (SELECT cuisine, location FROM restaurants WHERE id = old.restaurant_id);
+    DELETE FROM review_rollups WHERE (period, date) IN (%s) AND review_count <= 0;
+END;
+
+-- Counters that change with the data, e.g. for cache invalidation
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0);
+CREATE TRIGGER IF NOT EXISTS restaurants_catalog_insert AFTER INSERT ON restaurants BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'catalog_version';
+END;
+CREATE TRIGGER IF NOT EXISTS restaurants_data_insert AFTER INSERT ON restaurants BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_data_insert AFTER INSERT ON reviews BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_data_delete AFTER DELETE ON reviews BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+END;
+-- Moderating reviews already published changes what their pages show
+CREATE TRIGGER IF NOT EXISTS reviews_data_update AFTER UPDATE OF review_text, sentiment
+ON reviews BEGIN
+    UPDATE restaurants SET version = version + 1 WHERE id = new.restaurant_id;
+    UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+END;
+
+-- Full-text search over restaurant fields and review text
+CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_fts USING fts5(
+    name, cuisine, description, content='restaurants', content_rowid='seq');
+CREATE TRIGGER IF NOT EXISTS restaurants_fts_insert AFTER INSERT ON restaurants BEGIN
+    INSERT INTO restaurants_fts (rowid, name, cuisine, description)
+    VALUES (new.seq, new.name, new.cuisine, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS restaurants_fts_delete AFTER DELETE ON restaurants BEGIN
+    INSERT INTO restaurants_fts (restaurants_fts, rowid, name, cuisine, description)
+    VALUES ('delete', old.seq, old.name, old.cuisine, old.description);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+    review_text, content='reviews', content_rowid='seq');
+CREATE TRIGGER IF NOT EXISTS reviews_fts_insert AFTER INSERT ON reviews BEGIN
+    INSERT INTO reviews_fts (rowid, review_text) VALUES (new.seq, new.review_text);
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_fts_delete AFTER DELETE ON reviews BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, review_text)
+    VALUES ('delete', old.seq, old.review_text);
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_fts_update AFTER UPDATE OF review_text ON reviews
+WHEN old.review_text IS NOT new.review_text BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, review_text)
+    VALUES ('delete', old.seq, old.review_text);
+    INSERT INTO reviews_fts (rowid, review_text) VALUES (new.seq, new.review_text);
+END;
+'''
+
+# SQL for the first day of each store.ROLLUP_PERIODS period containing the
+# date in {column}, as store.period_start computes it
+_SQL_PERIOD_STARTS = {
+    'D': "{column}",
+    'W': "date({column}, '-' || ((strftime('%w', {column}) + 6) % 7) || ' days')",
+    'M': "substr({column}, 1, 8) || '01'",
+    'Q': "printf('%s-%02d-01', substr({column}, 1, 4), (substr({column}, 6, 2) - 1) / 3 * 3 + 1)",
+}
+
+
+# A (period, date) row for each period, for the rollup triggers
+def _sql_period_starts(column):
+    return ' UNION ALL '.join(
+        f"SELECT '{period}' AS period, {expression.format(column=column)} AS date"
+        for period, expression in _SQL_PERIOD_STARTS.items())
+
+
+_SCHEMA %= (_sql_period_starts('new.date'), _sql_period_starts('old.date'),
+            _sql_period_starts('old.date'))
+
+# store.bayesian_average in SQL. Both divide the same integers as doubles,
+# so the scores and their order are identical.
+_SQL_BAYESIAN_AVERAGE = (f"((rating_sum + {BAYESIAN_PRIOR_MEAN * BAYESIAN_PRIOR_WEIGHT}.0) "
+                         f"/ (review_count + {BAYESIAN_PRIOR_WEIGHT}))")
+
+# The score of each leaderboard but trending, which counts recent reviews
+_SQL_LEADERBOARD_SCORES = {
+    'top_rated': _SQL_BAYESIAN_AVERAGE,
+    'most_reviewed': 'review_count',
+}
+
+# Leaderboards read the first rows of one of these: overall, by cuisine
+# (also used with a location) and by location
+_SCHEMA += ''.join(
+    f"CREATE INDEX IF NOT EXISTS restaurants_{board}{suffix} ON restaurants "
+    f"({prefix}{score} DESC, seq) WHERE review_count > 0;\n"
+    for board, score in _SQL_LEADERBOARD_SCORES.items()
+    for suffix, prefix in (('', ''), ('_cuisine', 'cuisine, '), ('_location', 'location, ')))
+
+# Trending reads the first rows of trending, which holds each restaurant's
+# reviews dated in trending_window (the last store.TRENDING_DAYS days as of
+# its last_day) and is kept up to date by triggers. When the date changes,
+# the first read moves the window and sums the new one from
+# daily_review_counts, reviews per restaurant and day, which triggers also
+# maintain.
+_SCHEMA += '''
+CREATE TABLE IF NOT EXISTS daily_review_counts (
+    day TEXT NOT NULL,
+    restaurant_id TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, restaurant_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trending_window (
+    first_day TEXT NOT NULL,
+    last_day TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trending (
+    restaurant_id TEXT PRIMARY KEY,
+    cuisine TEXT NOT NULL,
+    location TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trending_score ON trending (score DESC, seq);
+CREATE INDEX IF NOT EXISTS trending_cuisine ON trending (cuisine, score DESC, seq);
+CREATE INDEX IF NOT EXISTS trending_location ON trending (location, score DESC, seq);
+CREATE TRIGGER IF NOT EXISTS reviews_trending_insert AFTER INSERT ON reviews BEGIN
+    INSERT INTO daily_review_counts (day, restaurant_id, n)
+    VALUES (new.date, new.restaurant_id, 1)
+    ON CONFLICT (day, restaurant_id) DO UPDATE SET n = n + 1;
+    INSERT INTO trending (restaurant_id, cuisine, location, seq, score)
+    SELECT r.id, r.cuisine, r.location, r.seq, 1 FROM restaurants r, trending_window w
+    WHERE r.id = new.restaurant_id AND new.date BETWEEN w.first_day AND w.last_day
+    ON CONFLICT (restaurant_id) DO UPDATE SET score = score + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_trending_delete AFTER DELETE ON reviews BEGIN
+    UPDATE daily_review_counts SET n = n - 1
+    WHERE day = old.date AND restaurant_id = old.restaurant_id;
+    DELETE FROM daily_review_counts
+    WHERE day = old.date AND restaurant_id = old.restaurant_id AND n <= 0;
+    UPDATE trending SET score = score - 1
+    WHERE restaurant_id = old.restaurant_id
+      AND old.date BETWEEN (SELECT first_day FROM trending_window)
+                       AND (SELECT last_day FROM trending_window);
+    DELETE FROM trending WHERE restaurant_id = old.restaurant_id AND score <= 0;
+END;
+'''
+
+_SQL_ORDERS = {
+    'rating_desc': 'avg_rating DESC, seq',
+    'rating_asc': 'avg_rating, seq',
+    'name_asc': 'name, seq',
+    'name_desc': 'name DESC, seq',
+}
+
+# Each of these is served by one of the reviews_restaurant* indexes
+_SQL_REVIEW_ORDERS = {
+    None: 'seq',
+    'newest': 'date DESC, seq DESC',
+    'highest': 'rating DESC, date DESC, seq DESC',
+    'lowest': 'rating, date DESC, seq DESC',
+}
+
+# Columns added to tables after they were first released
+_ADDED_COLUMNS = {
+    'restaurants': (('latitude', 'REAL'), ('longitude', 'REAL')),
+    'reviews': (('sentiment', 'REAL'), ('text_hash', 'INTEGER')),
+}
+
+_FILTER_COLUMNS = (('cuisine', 'cuisine'), ('location', 'location'), ('price', 'price_range'))
+
+
+# Stores restaurants and reviews in a SQLite database in WAL mode, so any
+# number of worker processes can share one file. Each thread of each
+# process gets its own connection. Distance queries use a GeoIndex held by
+# each process, which catches up with restaurants added by any process
+# when the catalogue version changes.
+class SQLiteRepository(Repository):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._geo = GeoIndex()
+        self._geo_lock = threading.Lock()
+        self._geo_version = None
+        self._geo_seq = 0
+        with self._connect() as conn:
+            # Databases created before some of the columns existed get them
+            # first, so the schema can index them
+            for table, added in _ADDED_COLUMNS.items():
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column, kind in added:
+                    if columns and column not in columns:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            conn.executescript(_SCHEMA)
+            # Databases created before the facets table existed
+            if not conn.execute("SELECT EXISTS (SELECT 1 FROM facets)").fetchone()[0]:
+                _rebuild_facets(conn)
+            # ... and before the review rollups did
+            if not conn.execute("SELECT EXISTS (SELECT 1 FROM review_rollups)").fetchone()[0]:
+                _rebuild_rollups(conn)
+            # ... and before the daily review counts did
+            if not conn.execute("SELECT EXISTS (SELECT 1 FROM daily_review_counts)").fetchone()[0]:
+                _rebuild_daily_review_counts(conn)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not cross a fork, so a worker forked from a
+        # preloaded parent opens its own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_restaurant(self, restaurant_id):
+        row = self._connect().execute(
+            f"SELECT {', '.join(RESTAURANT_FIELDS)} FROM restaurants WHERE id = ?",
+            (restaurant_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_restaurants(self):
+        rows = self._connect().execute(
+            f"SELECT {', '.join(RESTAURANT_FIELDS)} FROM restaurants ORDER BY seq")
+        return [dict(row) for row in rows]
+
+    def add_restaurant(self, restaurant):
+        with self._connect() as conn:
+            _insert_restaurants(conn, [restaurant])
+
+    def add_reviews(self, reviews):
+        reviews = list(reviews)
+        # The CHECK constraint would let 4.0 and True through
+        for review in reviews:
+            check_review(review)
+        with self._connect() as conn:
+            _insert_reviews(conn, reviews)
+
+    def remove_review(self, review_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(REVIEW_FIELDS)} FROM reviews WHERE id = ?",
+                (review_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM reviews WHERE id = ?", (review_id,))
+            return dict(row)
+
+    def duplicate_review_ids(self, reviews):
+        conn = self._connect()
+        return {review['id'] for review in reviews if conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM reviews WHERE restaurant_id = ? AND text_hash = ?)",
+            (review['restaurant_id'], review['text_hash'])).fetchone()[0]}
+
+    def get_rating_stats(self, restaurant_id):
+        row = self._connect().execute(
+            "SELECT review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5 "
+            "FROM restaurants WHERE id = ?", (restaurant_id,)).fetchone()
+        stats = RatingStats()
+        if row:
+            stats.count, stats.total = row[0], row[1]
+            stats.histogram = list(row[2:])
+        return stats
+
+    def restaurant_version(self, restaurant_id):
+        row = self._connect().execute(
+            "SELECT version FROM restaurants WHERE id = ?", (restaurant_id,)).fetchone()
+        return row[0] if row else 0
+
+    def catalog_version(self):
+        return self._connect().execute(
+            "SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()[0]
+
+    # Bumped by triggers, so writes from every worker process count
+    def data_version(self):
+        return self._connect().execute(
+            "SELECT value FROM meta WHERE key = 'data_version'").fetchone()[0]
+
+    def get_reviews(self, restaurant_id, order=None, offset=0, limit=None):
+        rows = self._connect().execute(
+            f"SELECT {', '.join(REVIEW_FIELDS)} FROM reviews WHERE restaurant_id = ? "
+            f"ORDER BY {_SQL_REVIEW_ORDERS.get(order, _SQL_REVIEW_ORDERS[None])} LIMIT ? OFFSET ?",
+            (restaurant_id, -1 if limit is None else limit, offset))
+        return [dict(row) for row in rows]
+
+    def query_restaurants(self, cuisine='all', location='all', price='all',
+                          sort_by='rating_desc', search=None, offset=0, limit=None,
+                          near=None, radius_km=None):
+        where, params = [], []
+        for value, column in zip((cuisine, location, price), _FILTER_COLUMNS):
+            if value != 'all':
+                where.append(f"{column[1]} = ?")
+                params.append(value)
+        # Every word has to match the restaurant itself or one of its
+        # reviews; the last word matches as a prefix, as in SearchIndex
+        terms = tokenize(search)
+        for i, term in enumerate(terms):
+            pattern = '"%s"' % term
+            if i == len(terms) - 1 and len(term) >= MIN_PREFIX_LENGTH:
+                pattern += '*'
+            where.append("(seq IN (SELECT rowid FROM restaurants_fts WHERE restaurants_fts MATCH ?)"
+                         " OR id IN (SELECT r.restaurant_id FROM reviews_fts"
+                         " JOIN reviews r ON r.seq = reviews_fts.rowid WHERE reviews_fts MATCH ?))")
+            params.extend((pattern, pattern))
+        conn = self._connect()
+        if near is not None and sort_by == 'distance':
+            return self._query_nearest(conn, where, params, near, radius_km, offset, limit)
+        if near is not None and radius_km is not None:
+            nearby = self._geo_index().ids_within(near[0], near[1], radius_km)
+            where.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(nearby)))
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        total = conn.execute(f"SELECT COUNT(*) FROM restaurants {clause}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(RESTAURANT_FIELDS)} FROM restaurants {clause} "
+            f"ORDER BY {_SQL_ORDERS.get(sort_by, 'seq')} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset])
+        return total, [dict(row) for row in rows]
+
+    # Nearest first, with the order from the GeoIndex and the filters
+    # checked in SQL: in one query for all the points in the circle, or
+    # without a radius in growing batches of the nearest points until the
+    # page is full
+    def _query_nearest(self, conn, where, params, near, radius_km, offset, limit):
+        geo = self._geo_index()
+        if not where:
+            total, restaurant_ids = _nearest_page(geo, near, radius_km, None, offset, limit)
+        elif radius_km is not None:
+            nearby = geo.ids_within(near[0], near[1], radius_km)
+            rows = conn.execute(
+                f"SELECT id FROM restaurants WHERE {' AND '.join(where)} "
+                f"AND id IN (SELECT value FROM json_each(?))", params + [json.dumps(list(nearby))])
+            matched = {row[0] for row in rows}
+            total, restaurant_ids = _nearest_page(geo, near, radius_km, matched, offset, limit)
+        else:
+            clause = ' AND '.join(where + ["latitude IS NOT NULL AND longitude IS NOT NULL"])
+            total = conn.execute(f"SELECT COUNT(*) FROM restaurants WHERE {clause}",
+                                 params).fetchone()[0]
+            stop = total if limit is None else min(offset + limit, total)
+            hits = (restaurant_id for _, restaurant_id in geo.nearest(near[0], near[1]))
+            restaurant_ids = []
+            batch_size = max(stop, 64)
+            while len(restaurant_ids) < stop:
+                batch = list(islice(hits, batch_size))
+                if not batch:
+                    break
+                rows = conn.execute(
+                    f"SELECT id FROM restaurants WHERE {' AND '.join(where)} "
+                    f"AND id IN (SELECT value FROM json_each(?))", params + [json.dumps(batch)])
+                matched = {row[0] for row in rows}
+                restaurant_ids.extend(restaurant_id for restaurant_id in batch
+                                      if restaurant_id in matched)
+                batch_size *= 2
+            restaurant_ids = restaurant_ids[offset:stop]
+        rows = conn.execute(
+            f"SELECT {', '.join(RESTAURANT_FIELDS)} FROM restaurants "
+            f"WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(restaurant_ids),))
+        restaurants = {row['id']: dict(row) for row in rows}
+        return total, [restaurants[restaurant_id] for restaurant_id in restaurant_ids]
+
+    # This process's GeoIndex, after adding the restaurants inserted since
+    # it was last brought up to date
+    def _geo_index(self):
+        version = self.catalog_version()
+        with self._geo_lock:
+            if version != self._geo_version:
+                rows = self._connect().execute(
+                    "SELECT seq, id, latitude, longitude FROM restaurants WHERE seq > ? "
+                    "ORDER BY seq", (self._geo_seq,))
+                for seq, restaurant_id, latitude, longitude in rows:
+                    if latitude is not None and longitude is not None:
+                        self._geo.add(restaurant_id, latitude, longitude)
+                    self._geo_seq = seq
+                self._geo_version = version
+        return self._geo
+
+    def facets(self):
+        facets = {field: [] for field in FILTER_FIELDS}
+        rows = self._connect().execute(
+            "SELECT field, value, count FROM facets ORDER BY field, value")
+        for field, value, count in rows:
+            facets[field].append((value, count))
+        return facets
+
+    def suggest_restaurants(self, query, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        patterns = ['"%s"' % term for term in terms]
+        if len(terms[-1]) >= MIN_PREFIX_LENGTH:
+            patterns[-1] += '*'
+        rows = self._connect().execute(
+            f"SELECT {', '.join(RESTAURANT_FIELDS)} FROM restaurants WHERE seq IN "
+            f"(SELECT rowid FROM restaurants_fts WHERE restaurants_fts MATCH ?) "
+            f"ORDER BY name, seq LIMIT ?",
+            ('name : (%s)' % ' AND '.join(patterns), limit))
+        return [dict(row) for row in rows]
+
+    def review_rollups(self, cuisine='all', location='all', period='D'):
+        where, params = ["period = ?"], [period]
+        for value, column in zip((cuisine, location), ('cuisine', 'location')):
+            if value != 'all':
+                where.append(f"{column} = ?")
+                params.append(value)
+        rows = self._connect().execute(
+            f"SELECT {', '.join(ROLLUP_FIELDS)} FROM review_rollups WHERE {' AND '.join(where)} "
+            f"ORDER BY date, cuisine, location", params)
+        return [dict(row) for row in rows]
+
+    def leaderboard(self, board, cuisine='all', location='all', limit=10):
+        where, params = [], []
+        for value, column in ((cuisine, 'cuisine'), (location, 'location')):
+            if value != 'all':
+                where.append(f"{column} = ?")
+                params.append(value)
+        fields = ', '.join(RESTAURANT_FIELDS)
+        if board == 'trending':
+            self._move_trending_window()
+            index = 'trending_' + ('cuisine' if cuisine != 'all'
+                                   else 'location' if location != 'all' else 'score')
+            where = [f"t.{condition}" for condition in where]
+            rows = self._connect().execute(
+                f"SELECT {', '.join('r.' + field for field in RESTAURANT_FIELDS)}, t.score "
+                f"FROM trending t INDEXED BY {index} JOIN restaurants r ON r.id = t.restaurant_id "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+                f"ORDER BY t.score DESC, t.seq LIMIT ?", params + [limit])
+        else:
+            # Named, because the planner would rather take the cuisine or
+            # location index of the other board and sort
+            index = f"restaurants_{board}" + ('_cuisine' if cuisine != 'all'
+                                              else '_location' if location != 'all' else '')
+            score = _SQL_LEADERBOARD_SCORES[board]
+            rows = self._connect().execute(
+                f"SELECT {fields}, {score} AS score FROM restaurants INDEXED BY {index} "
+                f"WHERE {' AND '.join(['review_count > 0'] + where)} "
+                f"ORDER BY {score} DESC, seq LIMIT ?", params + [limit])
+        return [({field: row[field] for field in RESTAURANT_FIELDS}, row['score']) for row in rows]
+
+    # Moves the trending window to end today, if it does not yet. Only the
+    # first worker to read a board on a new day sums the window; the
+    # others find it moved.
+    def _move_trending_window(self):
+        today = date.today()
+        conn = self._connect()
+        row = conn.execute("SELECT last_day FROM trending_window").fetchone()
+        if row is not None and row[0] == today.isoformat():
+            return
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT last_day FROM trending_window").fetchone()
+            if row is not None and row[0] == today.isoformat():
+                return
+            _rebuild_trending(conn, today)
+
+    # Loads the data into an empty database; several workers may race to
+    # do this at startup, and only the first one to get the lock does
+    def seed(self, restaurants, reviews):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM restaurants)").fetchone()[0]:
+                return False
+            _insert_restaurants(conn, restaurants)
+            _insert_reviews(conn, reviews)
+            return True
+
+
+    # For large imports: triggers and secondary indexes are dropped while the
+    # rows go in through bulk_insert_*, one transaction per chunk, and
+    # rebuild() puts them back afterwards, even if the import fails
+    @contextmanager
+    def bulk_load(self):
+        conn = self._connect()
+        with conn:
+            objects = conn.execute(
+                "SELECT type, name FROM sqlite_master "
+                "WHERE type IN ('trigger', 'index') AND sql IS NOT NULL").fetchall()
+            for kind, name in objects:
+                conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+        try:
+            yield self
+        finally:
+            self.rebuild()
+
+    # Returns how many were inserted; ids already in the database are skipped
+    def bulk_insert_restaurants(self, restaurants):
+        with self._connect() as conn:
+            return conn.executemany(
+                f"INSERT OR IGNORE INTO restaurants ({', '.join(RESTAURANT_FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(RESTAURANT_FIELDS))})",
+                ([restaurant.get(field) for field in RESTAURANT_FIELDS]
+                 for restaurant in restaurants)).rowcount
+
+    # Returns how many were inserted; duplicate ids and reviews of unknown
+    # restaurants are skipped
+    def bulk_insert_reviews(self, reviews):
+        with self._connect() as conn:
+            return conn.executemany(
+                f"INSERT OR IGNORE INTO reviews ({', '.join(_REVIEW_COLUMNS)}) "
+                f"SELECT {', '.join('?' * len(_REVIEW_COLUMNS))} "
+                f"WHERE EXISTS (SELECT 1 FROM restaurants WHERE id = ?)",
+                ([review.get(field) for field in _REVIEW_COLUMNS] + [review['restaurant_id']]
+                 for review in reviews)).rowcount
+
+    # Reviews that have not been through moderation (they have no
+    # sentiment), oldest first, as (seq, review) with seq above after_seq
+    def unmoderated_reviews(self, after_seq=0, limit=10000):
+        rows = self._connect().execute(
+            f"SELECT seq, {', '.join(REVIEW_FIELDS)} FROM reviews "
+            f"WHERE seq > ? AND sentiment IS NULL ORDER BY seq LIMIT ?", (after_seq, limit))
+        return [(row[0], dict(row)) for row in rows]
+
+    # Writes the text, sentiment and text hash of moderated reviews back
+    def update_reviews(self, reviews):
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE reviews SET review_text = ?, sentiment = ?, text_hash = ? WHERE id = ?",
+                ((review['review_text'], review['sentiment'], review.get('text_hash'), review['id'])
+                 for review in reviews))
+
+    # Returns how many of the review ids were removed
+    def remove_reviews(self, review_ids):
+        with self._connect() as conn:
+            return conn.executemany("DELETE FROM reviews WHERE id = ?",
+                                    ((review_id,) for review_id in review_ids)).rowcount
+
+    # Recreates missing triggers and indexes, then recomputes the rating
+    # aggregates, facets, review rollups, daily review counts and full-text
+    # indexes from the tables in one pass
+    def rebuild(self):
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        with conn:
+            conn.execute(
+                "UPDATE restaurants SET (review_count, rating_sum, rating_1, rating_2, rating_3, "
+                "rating_4, rating_5) = (SELECT COUNT(*), COALESCE(SUM(rating), 0), "
+                "COALESCE(SUM(rating = 1), 0), COALESCE(SUM(rating = 2), 0), "
+                "COALESCE(SUM(rating = 3), 0), COALESCE(SUM(rating = 4), 0), "
+                "COALESCE(SUM(rating = 5), 0) "
+                "FROM reviews WHERE reviews.restaurant_id = restaurants.id)")
+            conn.execute(
+                "UPDATE restaurants SET version = version + 1, avg_rating = CASE "
+                "WHEN review_count > 0 "
+                "THEN (20 * rating_sum + review_count) / (2 * review_count) / 10.0 "
+                "ELSE 0 END")
+            _rebuild_facets(conn)
+            _rebuild_rollups(conn)
+            _rebuild_daily_review_counts(conn)
+            conn.execute("INSERT INTO restaurants_fts (restaurants_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('rebuild')")
+            conn.execute("UPDATE meta SET value = value + 1 "
+                         "WHERE key IN ('catalog_version', 'data_version')")
+
+
+def _rebuild_facets(conn):
+    conn.execute("DELETE FROM facets")
+    for field in FILTER_FIELDS:
+        conn.execute(f"INSERT INTO facets (field, value, count) "
+                     f"SELECT '{field}', {field}, COUNT(*) FROM restaurants GROUP BY {field}")
+
+
+# Daily rollups from the reviews, then the longer periods from the days
+def _rebuild_rollups(conn):
+    conn.execute("DELETE FROM review_rollups")
+    conn.execute(
+        "INSERT INTO review_rollups SELECT 'D', r.date, s.cuisine, s.location, COUNT(*), "
+        "SUM(r.rating), SUM(r.rating = 1), SUM(r.rating = 2), SUM(r.rating = 3), "
+        "SUM(r.rating = 4), SUM(r.rating = 5) "
+        "FROM reviews r JOIN restaurants s ON s.id = r.restaurant_id "
+        "GROUP BY r.date, s.cuisine, s.location")
+    for period in ROLLUP_PERIODS[1:]:
+        start = _SQL_PERIOD_STARTS[period].format(column='date')
+        conn.execute(
+            f"INSERT INTO review_rollups SELECT '{period}', {start} AS start, cuisine, location, "
+            f"SUM(review_count), SUM(rating_sum), SUM(rating_1), SUM(rating_2), SUM(rating_3), "
+            f"SUM(rating_4), SUM(rating_5) FROM review_rollups WHERE period = 'D' "
+            f"GROUP BY start, cuisine, location")
+
+
+# The daily counts from the reviews. The trending window is emptied, so the
+# next read sums it again.
+def _rebuild_daily_review_counts(conn):
+    conn.execute("DELETE FROM daily_review_counts")
+    conn.execute("INSERT INTO daily_review_counts SELECT date, restaurant_id, COUNT(*) "
+                 "FROM reviews GROUP BY date, restaurant_id")
+    conn.execute("DELETE FROM trending_window")
+    conn.execute("DELETE FROM trending")
+
+
+def _rebuild_trending(conn, today):
+    first_day = date.fromordinal(today.toordinal() - TRENDING_DAYS + 1).isoformat()
+    conn.execute("DELETE FROM trending_window")
+    conn.execute("INSERT INTO trending_window VALUES (?, ?)", (first_day, today.isoformat()))
+    conn.execute("DELETE FROM trending")
+    conn.execute(
+        "INSERT INTO trending SELECT r.id, r.cuisine, r.location, r.seq, SUM(d.n) "
+        "FROM daily_review_counts d JOIN restaurants r ON r.id = d.restaurant_id "
+        "WHERE d.day BETWEEN ? AND ? GROUP BY r.id", (first_day, today.isoformat()))
+
+
+def _insert_restaurants(conn, restaurants):
+    conn.executemany(
+        f"INSERT INTO restaurants ({', '.join(RESTAURANT_FIELDS)}) "
+        f"VALUES ({', '.join('?' * len(RESTAURANT_FIELDS))})",
+        ([restaurant.get(field) for field in RESTAURANT_FIELDS] for restaurant in restaurants))
+
+
+def _insert_reviews(conn, reviews):
+    conn.executemany(
+        f"INSERT INTO reviews ({', '.join(_REVIEW_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(_REVIEW_COLUMNS))})",
+        ([review.get(field) for field in _REVIEW_COLUMNS] for review in reviews))
+
+
+# Opens the repository described by database: a SQLite file path, or
+# None/'' for an in-memory store. New stores are seeded with the given data.
+def open_repository(database=None, restaurants=(), reviews=()):
+    if not database:
+        return InMemoryRepository(restaurants, reviews)
+    repository = SQLiteRepository(database)
+    repository.seed(restaurants, reviews)
+    return repository
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import threading
+
+import flask
+
+UPDATE_COMPONENT_PATH = '/_dash-update-component'
+# Seconds a request waits for an identical one in progress before building
+# its own response
+COALESCE_TIMEOUT = 10
+
+
+# Caches the responses of side-effect-free Dash callbacks. The key is the
+# whole request body (outputs, inputs, state and which input changed) plus
+# the data version, so any write to the repository moves every callback to
+# fresh keys and stale entries just age out of the backend. Responses carry
+# an ETag and a matching If-None-Match gets a 304; the match is weak,
+# since compression.py weakens the ETags of the responses it compresses.
+# Identical requests that arrive while the first is still being answered
+# wait for its response instead of each running the callback.
+class ResponseCache:
+    def __init__(self, backend, version, outputs=()):
+        self.backend = backend
+        self.version = version
+        # First output ("component-id.property") of each cacheable callback
+        self.outputs = set(outputs)
+        self.hits = 0
+        self.misses = 0
+        # Requests answered with the response of an identical one in progress
+        self.coalesced = 0
+        # Key -> event set once the request building it is done
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, server):
+        server.before_request(self._before_request)
+        server.after_request(self._after_request)
+        server.teardown_request(self._teardown_request)
+
+    def _key(self):
+        if self.backend is None or not flask.request.path.endswith(UPDATE_COMPONENT_PATH):
+            return None
+        body = flask.request.get_json(silent=True)
+        if not body:
+            return None
+        outputs = body.get('outputs')
+        first = outputs[0] if isinstance(outputs, list) else outputs
+        if not first or f"{first['id']}.{first['property']}" not in self.outputs:
+            return None
+        key = json.dumps(body, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(f"{self.version()}:{key}".encode()).hexdigest()
+
+    def _before_request(self):
+        key = self._key()
+        if key is None:
+            return None
+        flask.g.response_cache_key = key
+        if flask.request.if_none_match.contains_weak(key):
+            self.hits += 1
+            flask.g.response_cache_hit = True
+            return self._finish(flask.Response(status=304), key)
+        body = self.backend.get(key)
+        if body is not None:
+            self.hits += 1
+        else:
+            body = self._wait_for(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.coalesced += 1
+        flask.g.response_cache_hit = True
+        return self._finish(flask.Response(body, mimetype='application/json'), key)
+
+    # Waits for the identical request in progress, if any, and returns the
+    # body it stored. Returns None when there is none (this request then
+    # builds the response, and releases the ones waiting for it when it is
+    # done) or when it stored nothing in time (PreventUpdate, an error).
+    def _wait_for(self, key):
+        with self._lock:
+            done = self._in_flight.get(key)
+            if done is None:
+                self._in_flight[key] = threading.Event()
+                flask.g.response_cache_leader = key
+                return None
+        if not done.wait(COALESCE_TIMEOUT):
+            return None
+        return self.backend.get(key)
+
+    # Runs after _after_request has stored the body, whatever happened
+    def _teardown_request(self, error):
+        key = flask.g.pop('response_cache_leader', None)
+        if key is not None:
+            with self._lock:
+                self._in_flight.pop(key).set()
+
+    def _after_request(self, response):
+        key = flask.g.pop('response_cache_key', None)
+        if key is None or response.status_code != 200:
+            return response
+        self.backend.set(key, response.get_data())
+        return self._finish(response, key)
+
+    @staticmethod
+    def _finish(response, key):
+        # A response served from the cache must not be stored again by
+        # _after_request
+        flask.g.pop('response_cache_key', None)
+        response.set_etag(key)
+        # Any write changes the key, so clients have to revalidate each time
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
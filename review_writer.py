@@ -0,0 +1,109 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Write-behind queue for new reviews. submit() only enqueues, so request
+# threads never wait on storage or moderation; a background thread drains
+# the queue, runs each batch past the moderator (see moderation.py) and
+# hands the reviews it accepts to repository.add_reviews, which applies
+# them (reviews and aggregates) in a single transaction.
+class ReviewWriter:
+    def __init__(self, repository, moderator=None, flush_interval=0.005, max_batch=1000,
+                 max_pending=100000):
+        self.repository = repository
+        self.moderator = moderator
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue(max_pending)
+        # Counters since startup: accepted by submit(), turned away because
+        # the queue was full, held back by moderation, written, and failed
+        # to moderate or write
+        self.submitted = 0
+        self.rejected = 0
+        self.flagged = 0
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    # Raises queue.Full when the backlog is at max_pending
+    def submit(self, review):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(review)
+        except queue.Full:
+            self.rejected += 1
+            raise
+        self.submitted += 1
+
+    def pending(self):
+        return self._queue.qsize()
+
+    # Blocks until everything submitted so far has been written
+    def flush(self):
+        self._queue.join()
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='review-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                accepted = self._moderate(batch)
+                if accepted:
+                    self._write(accepted)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # The reviews of the batch the moderator lets through, enriched. Reviews
+    # are not published unchecked: if moderation fails, they are dropped.
+    def _moderate(self, batch):
+        if self.moderator is None:
+            return batch
+        try:
+            accepted, rejected = self.moderator.moderate(batch)
+        except Exception:
+            logger.exception("failed to moderate %d reviews", len(batch))
+            self.failed += len(batch)
+            return []
+        self.flagged += len(rejected)
+        return accepted
+
+    def _write(self, batch):
+        try:
+            self.repository.add_reviews(batch)
+            self.written += len(batch)
+            return
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("failed to write review %s", batch[0].get('id'))
+                self.failed += 1
+                return
+        # add_reviews stores all of a batch or none of it, so retrying one at
+        # a time writes each review once and only the bad ones fail
+        for review in batch:
+            self._write([review])
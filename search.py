@@ -0,0 +1,200 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Restaurant fields that are searchable besides the review text
+SEARCH_FIELDS = ('name', 'cuisine', 'description')
+
+# Prefixes shorter than this only match whole words, and a prefix never
+# expands to more than MAX_PREFIX_TERMS words (the most common ones win)
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_TERMS = 64
+
+# Words in at least this many restaurants keep a cached bitmap that is
+# updated in place; rarer words have theirs built per query
+BITMAP_CACHE_MIN_POSTING = 512
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.casefold()) if text else []
+
+
+# Restaurant ids matched by a search, held as a bitmap over the index's
+# document numbers. Supports len(), membership tests and iteration.
+class SearchResult:
+    __slots__ = ('_bits', '_docs', '_restaurant_ids', '_count')
+
+    def __init__(self, bitmap, docs, restaurant_ids):
+        self._bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+        self._docs = docs
+        self._restaurant_ids = restaurant_ids
+        self._count = bitmap.bit_count()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, restaurant_id):
+        doc = self._docs.get(restaurant_id)
+        if doc is None or doc >> 3 >= len(self._bits):
+            return False
+        return bool(self._bits[doc >> 3] >> (doc & 7) & 1)
+
+    def __iter__(self):
+        for i, byte in enumerate(self._bits):
+            while byte:
+                low = byte & -byte
+                yield self._restaurant_ids[i * 8 + low.bit_length() - 1]
+                byte ^= low
+
+
+# Inverted index from word to the restaurants whose name, cuisine,
+# description or reviews contain it. Postings count occurrences per
+# restaurant so reviews can be removed again without a rebuild; queries
+# combine per-word bitmaps so broad words cost a few big-int operations.
+# fields picks the restaurant fields to index.
+class SearchIndex:
+    def __init__(self, restaurants=(), reviews=(), fields=SEARCH_FIELDS):
+        self.fields = fields
+        self._postings = {}
+        self._bitmaps = {}
+        # Document numbers for the bitmaps, assigned in first-seen order
+        self._docs = {}
+        self._restaurant_ids = []
+        # Sorted list of words for prefix lookups. New words are queued and
+        # merged on the next search; removed words are skipped until the next
+        # full rebuild drops them.
+        self._vocabulary = []
+        self._new_terms = []
+        self._restaurant_terms = {}
+        for restaurant in restaurants:
+            self.add_restaurant(restaurant)
+        for review in reviews:
+            self.add_review(review)
+
+    def __len__(self):
+        return len(self._postings)
+
+    def add_restaurant(self, restaurant):
+        self.remove_restaurant(restaurant['id'])
+        terms = Counter()
+        for field in self.fields:
+            terms.update(tokenize(restaurant.get(field)))
+        self._restaurant_terms[restaurant['id']] = terms
+        self._add_terms(restaurant['id'], terms)
+
+    def remove_restaurant(self, restaurant_id):
+        terms = self._restaurant_terms.pop(restaurant_id, None)
+        if terms:
+            self._remove_terms(restaurant_id, terms)
+
+    def add_review(self, review):
+        self._add_terms(review['restaurant_id'], Counter(tokenize(review['review_text'])))
+
+    def remove_review(self, review):
+        self._remove_terms(review['restaurant_id'], Counter(tokenize(review['review_text'])))
+
+    # Returns a SearchResult, or None for a blank query. Every word must
+    # match; with prefix=True the last one may be a prefix.
+    def search(self, query, prefix=True):
+        terms = tokenize(query)
+        if not terms:
+            return None
+        last = terms.pop()
+        if prefix and len(last) >= MIN_PREFIX_LENGTH:
+            bitmap = self._prefix_bitmap(last)
+        else:
+            bitmap = self._bitmap(last)
+        for term in set(terms):
+            if not bitmap:
+                break
+            bitmap &= self._bitmap(term)
+        return SearchResult(bitmap, self._docs, self._restaurant_ids)
+
+    def _prefix_bitmap(self, prefix):
+        vocabulary = self._sorted_vocabulary()
+        start = bisect_left(vocabulary, prefix)
+        end = bisect_left(vocabulary, prefix + '\U0010ffff', start)
+        terms = [term for term in vocabulary[start:end] if term in self._postings]
+        if len(terms) > MAX_PREFIX_TERMS:
+            terms = nlargest(MAX_PREFIX_TERMS, terms, key=lambda t: len(self._postings[t]))
+        # Cached bitmaps are OR-ed directly; the rare words are collected into
+        # one shared bitmap rather than building one per word
+        bitmap = 0
+        rare = []
+        for term in terms:
+            posting = self._postings[term]
+            if term in self._bitmaps or len(posting) >= BITMAP_CACHE_MIN_POSTING:
+                bitmap |= self._bitmap(term)
+            else:
+                rare.append(posting)
+        if rare:
+            bitmap |= self._postings_bitmap(rare)
+        return bitmap
+
+    def _bitmap(self, term):
+        bitmap = self._bitmaps.get(term)
+        if bitmap is not None:
+            return bitmap
+        posting = self._postings.get(term)
+        if not posting:
+            return 0
+        bitmap = self._postings_bitmap([posting])
+        if len(posting) >= BITMAP_CACHE_MIN_POSTING:
+            self._bitmaps[term] = bitmap
+        return bitmap
+
+    def _postings_bitmap(self, postings):
+        bits = bytearray((len(self._restaurant_ids) + 7) // 8)
+        docs = self._docs
+        for posting in postings:
+            for restaurant_id in posting:
+                doc = docs[restaurant_id]
+                bits[doc >> 3] |= 1 << (doc & 7)
+        return int.from_bytes(bits, 'little')
+
+    def _sorted_vocabulary(self):
+        if self._new_terms:
+            if len(self._new_terms) * 8 > len(self._vocabulary):
+                self._vocabulary = sorted(self._postings)
+            else:
+                for term in self._new_terms:
+                    i = bisect_left(self._vocabulary, term)
+                    if i == len(self._vocabulary) or self._vocabulary[i] != term:
+                        self._vocabulary.insert(i, term)
+            self._new_terms = []
+        return self._vocabulary
+
+    def _add_terms(self, restaurant_id, terms):
+        doc = self._docs.get(restaurant_id)
+        if doc is None:
+            doc = self._docs[restaurant_id] = len(self._restaurant_ids)
+            self._restaurant_ids.append(restaurant_id)
+        for term, count in terms.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                self._new_terms.append(term)
+            previous = posting.get(restaurant_id, 0)
+            posting[restaurant_id] = previous + count
+            if not previous and term in self._bitmaps:
+                self._bitmaps[term] |= 1 << doc
+
+    def _remove_terms(self, restaurant_id, terms):
+        doc = self._docs.get(restaurant_id)
+        for term, count in terms.items():
+            posting = self._postings.get(term)
+            if posting is None or restaurant_id not in posting:
+                continue
+            remaining = posting[restaurant_id] - count
+            if remaining > 0:
+                posting[restaurant_id] = remaining
+                continue
+            del posting[restaurant_id]
+            if term in self._bitmaps:
+                self._bitmaps[term] &= ~(1 << doc)
+            if not posting:
+                del self._postings[term]
+                self._bitmaps.pop(term, None)
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text files served from memory, minified (CSS) and optionally compressed
+TEXT_ASSET_TYPES = {
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+}
+
+# Dash adds ?m=<modification time> to the asset URLs it puts in the page,
+# so those URLs change with the file and can be cached for good
+FINGERPRINT_PARAM = 'm'
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+# Strips comments (except /*! licence */ ones) and the whitespace that does
+# not matter. Spaces around ':' are kept, since "a :hover" and "a:hover"
+# select different things.
+def minify_css(css):
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = _CSS_SPACE_RE.sub(' ', css)
+    css = _CSS_PUNCTUATION_RE.sub(r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+class _Asset:
+    __slots__ = ('mtime', 'mimetype', 'etag', 'bodies')
+
+    def __init__(self, mtime, mimetype, etag, bodies):
+        self.mtime = mtime
+        self.mimetype = mimetype
+        self.etag = etag
+        # Body per content coding: 'identity' and, when precompressed,
+        # 'gzip' and 'br'
+        self.bodies = bodies
+
+
+# Serves the text files in Dash's assets folder from memory, with CSS
+# minified, long-lived cache headers on fingerprinted URLs, and gzip/brotli
+# bodies prepared once when precompress is on. Entries are rebuilt when a
+# file changes on disk. Other files are left to Dash's static route but get
+# the same cache headers.
+class StaticAssets:
+    def __init__(self, folder, url_path='/assets/', precompress=False):
+        self.folder = folder
+        self.url_path = url_path
+        self.precompress = precompress
+        self._assets = {}
+
+    def init_app(self, server):
+        for directory, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.relpath(os.path.join(directory, name), self.folder)
+                self._load(path.replace(os.sep, '/'))
+        logger.info("serving %d assets from memory%s", len(self._assets),
+                    " (precompressed)" if self.precompress else "")
+        server.before_request(self._before_request)
+        server.after_request(self._after_request)
+
+    def _load(self, path):
+        mimetype = TEXT_ASSET_TYPES.get(os.path.splitext(path)[1])
+        if mimetype is None:
+            return None
+        full_path = os.path.join(self.folder, path)
+        mtime = int(os.stat(full_path).st_mtime)
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        if path.endswith('.css') and not path.endswith('.min.css'):
+            body = minify_css(body.decode('utf-8')).encode('utf-8')
+        asset = _Asset(mtime, mimetype, hashlib.sha256(body).hexdigest()[:20],
+                       {'identity': body})
+        if self.precompress:
+            asset.bodies['gzip'] = gzip.compress(body, 9, mtime=0)
+            if brotli is not None:
+                asset.bodies['br'] = brotli.compress(body, quality=11)
+        self._assets[path] = asset
+        return asset
+
+    def _before_request(self):
+        request = flask.request
+        if not request.path.startswith(self.url_path):
+            return None
+        path = request.path[len(self.url_path):]
+        asset = self._assets.get(path)
+        if asset is None:
+            return None
+        try:
+            if int(os.stat(os.path.join(self.folder, path)).st_mtime) != asset.mtime:
+                asset = self._load(path)
+        except FileNotFoundError:
+            # Another thread may have dropped it first
+            self._assets.pop(path, None)
+            return None
+        # The smallest body the client accepts
+        codings = sorted(asset.bodies, key=lambda coding: len(asset.bodies[coding]))
+        coding = request.accept_encodings.best_match(codings, 'identity')
+        response = flask.Response(asset.bodies[coding], mimetype=asset.mimetype)
+        if coding != 'identity':
+            response.headers['Content-Encoding'] = coding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(f"{asset.etag}-{coding}")
+        return response.make_conditional(request)
+
+    def _after_request(self, response):
+        if flask.request.path.startswith(self.url_path) and response.status_code in (200, 304):
+            if FINGERPRINT_PARAM in flask.request.args:
+                response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+            else:
+                response.headers['Cache-Control'] = 'no-cache'
+        return response
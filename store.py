@@ -0,0 +1,741 @@
+from array import array
+from bisect import bisect_left, insort
+from datetime import date
+from heapq import nlargest, nsmallest
+from itertools import islice
+
+
+class RatingStats:
+    __slots__ = ('count', 'total', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        # histogram[i] is the number of (i + 1)-star reviews
+        self.histogram = [0, 0, 0, 0, 0]
+
+    # Mean rating rounded half up to one decimal, in integer arithmetic so
+    # it matches the SQLite repository exactly
+    @property
+    def average(self):
+        if not self.count:
+            return 0
+        return (20 * self.total + self.count) // (2 * self.count) / 10
+
+
+# Rating aggregates per restaurant, kept up to date as reviews come and go
+# so that reads never have to scan the reviews list
+class RatingAggregates:
+    def __init__(self, reviews=()):
+        self._stats = {}
+        for review in reviews:
+            self.add(review)
+
+    def add(self, review):
+        stats = self._stats.get(review['restaurant_id'])
+        if stats is None:
+            stats = self._stats[review['restaurant_id']] = RatingStats()
+        stats.count += 1
+        stats.total += review['rating']
+        stats.histogram[review['rating'] - 1] += 1
+        return stats
+
+    def remove(self, review):
+        stats = self._stats.get(review['restaurant_id'])
+        if stats is None or not stats.histogram[review['rating'] - 1]:
+            raise KeyError(review['id'])
+        stats.count -= 1
+        stats.total -= review['rating']
+        stats.histogram[review['rating'] - 1] -= 1
+        return stats
+
+    def get(self, restaurant_id):
+        stats = self._stats.get(restaurant_id)
+        return stats if stats is not None else _EMPTY_STATS
+
+    def average(self, restaurant_id):
+        return self.get(restaurant_id).average
+
+    def count(self, restaurant_id):
+        return self.get(restaurant_id).count
+
+
+_EMPTY_STATS = RatingStats()
+
+
+ROLLUP_FIELDS = ('date', 'cuisine', 'location', 'review_count', 'rating_sum',
+                 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+# Rollup granularities: day, week (starting on Monday), month and quarter
+ROLLUP_PERIODS = ('D', 'W', 'M', 'Q')
+
+
+# First day of the period containing day, both as ISO date strings. The
+# SQLite repository computes the same in SQL.
+def period_start(day, period):
+    if period == 'D':
+        return day
+    if period == 'W':
+        start = date.fromisoformat(day)
+        return date.fromordinal(start.toordinal() - start.weekday()).isoformat()
+    if period == 'M':
+        return day[:8] + '01'
+    if period == 'Q':
+        return f"{day[:4]}-{(int(day[5:7]) - 1) // 3 * 3 + 1:02d}-01"
+    raise ValueError(f"unknown period {period!r}")
+
+
+# Review counts, rating totals and rating histograms per period, cuisine
+# and location, for each of ROLLUP_PERIODS, kept up to date as reviews come
+# and go. The analytics page reads these (a few rows per period) instead of
+# grouping the reviews themselves.
+class ReviewRollups:
+    def __init__(self):
+        # period -> period start -> (cuisine, location) ->
+        #     [count, rating total, 1 star, ..., 5 stars]
+        self._periods = {period: {} for period in ROLLUP_PERIODS}
+
+    def add(self, review, restaurant):
+        group = (restaurant['cuisine'], restaurant['location'])
+        for period, starts in self._periods.items():
+            groups = starts.setdefault(period_start(review['date'], period), {})
+            row = groups.get(group)
+            if row is None:
+                row = groups[group] = [0] * 7
+            row[0] += 1
+            row[1] += review['rating']
+            row[1 + review['rating']] += 1
+
+    def remove(self, review, restaurant):
+        group = (restaurant['cuisine'], restaurant['location'])
+        for period, starts in self._periods.items():
+            start = period_start(review['date'], period)
+            row = starts[start][group]
+            row[0] -= 1
+            row[1] -= review['rating']
+            row[1 + review['rating']] -= 1
+            if not row[0]:
+                del starts[start][group]
+                if not starts[start]:
+                    del starts[start]
+
+    # Rows as dicts with ROLLUP_FIELDS, by date (the period start), cuisine
+    # and location
+    def rows(self, cuisine='all', location='all', period='D'):
+        rows = []
+        for start, groups in sorted(self._periods[period].items()):
+            for group, row in sorted(groups.items()):
+                if cuisine in ('all', group[0]) and location in ('all', group[1]):
+                    rows.append(dict(zip(ROLLUP_FIELDS, (start,) + group + tuple(row))))
+        return rows
+
+
+FILTER_FIELDS = ('cuisine', 'location', 'price_range')
+SORT_ORDERS = ('rating_desc', 'rating_asc', 'name_asc', 'name_desc')
+
+# Orders stored ascending but served back to front; their keys negate the
+# insertion sequence so ties still come out in insertion order
+_REVERSED_ORDERS = {'name_desc'}
+
+# Below this fraction of the catalogue a filtered result is sorted directly,
+# above it the pre-sorted order is walked and filtered instead
+_SMALL_RESULT_RATIO = 0.125
+
+
+# Secondary indexes over the restaurant catalogue: a posting set of ids per
+# filter value and a pre-sorted order per sort key. Rating orders follow
+# RatingAggregates and must be told about changes through rating_changed.
+class RestaurantIndex:
+    def __init__(self, aggregates, restaurants=()):
+        self._aggregates = aggregates
+        self._restaurants = {}
+        self._seq = {}
+        self._ratings = {}
+        self._next_seq = 0
+        self._postings = {field: {} for field in FILTER_FIELDS}
+        self._orders = {sort_by: [] for sort_by in SORT_ORDERS}
+        for restaurant in restaurants:
+            self.add(restaurant)
+
+    def __len__(self):
+        return len(self._restaurants)
+
+    def get(self, restaurant_id):
+        return self._restaurants.get(restaurant_id)
+
+    def add(self, restaurant):
+        restaurant_id = restaurant['id']
+        if restaurant_id in self._restaurants:
+            self.remove(restaurant_id)
+        self._restaurants[restaurant_id] = restaurant
+        self._seq[restaurant_id] = self._next_seq
+        self._next_seq += 1
+        self._ratings[restaurant_id] = self._aggregates.average(restaurant_id)
+        for field in FILTER_FIELDS:
+            self._postings[field].setdefault(restaurant[field], set()).add(restaurant_id)
+        for sort_by in SORT_ORDERS:
+            insort(self._orders[sort_by], self._sort_key(sort_by, restaurant_id))
+
+    def remove(self, restaurant_id):
+        restaurant = self._restaurants.get(restaurant_id)
+        if restaurant is None:
+            return None
+        for sort_by in SORT_ORDERS:
+            self._discard_key(sort_by, restaurant_id)
+        for field in FILTER_FIELDS:
+            posting = self._postings[field][restaurant[field]]
+            posting.discard(restaurant_id)
+            if not posting:
+                del self._postings[field][restaurant[field]]
+        del self._restaurants[restaurant_id]
+        del self._seq[restaurant_id]
+        del self._ratings[restaurant_id]
+        return restaurant
+
+    # Number of restaurants per value of a filter field
+    def facet_counts(self, field):
+        return {value: len(posting) for value, posting in self._postings[field].items()}
+
+    def rating_changed(self, restaurant_id):
+        if restaurant_id not in self._restaurants:
+            return
+        rating = self._aggregates.average(restaurant_id)
+        if rating == self._ratings[restaurant_id]:
+            return
+        for sort_by in ('rating_desc', 'rating_asc'):
+            self._discard_key(sort_by, restaurant_id)
+        self._ratings[restaurant_id] = rating
+        for sort_by in ('rating_desc', 'rating_asc'):
+            insort(self._orders[sort_by], self._sort_key(sort_by, restaurant_id))
+
+    # Returns (total, ids) where ids is the [offset:offset + limit] slice of
+    # the matching restaurant ids in sort order; only that slice is built.
+    # within optionally restricts the result to a set of ids, e.g. search hits
+    def query(self, cuisine='all', location='all', price='all', sort_by='rating_desc',
+              within=None, offset=0, limit=None):
+        matched = self._match(cuisine, location, price, within)
+        total = len(self._restaurants) if matched is None else len(matched)
+        stop = total if limit is None else min(offset + limit, total)
+        if offset >= stop:
+            return total, []
+        order = self._orders.get(sort_by)
+        if order is None:
+            # Unknown sort keys keep catalogue order, as the unindexed grid did
+            ids = (rid for rid in self._restaurants if matched is None or rid in matched)
+            return total, list(islice(ids, offset, stop))
+        reverse = sort_by in _REVERSED_ORDERS
+        if matched is None:
+            if reverse:
+                keys = reversed(order[len(order) - stop:len(order) - offset])
+            else:
+                keys = order[offset:stop]
+            return total, [key[-1] for key in keys]
+        if len(matched) < len(order) * _SMALL_RESULT_RATIO:
+            select = nlargest if reverse else nsmallest
+            ids = select(stop, matched, key=lambda rid: self._sort_key(sort_by, rid))
+            return total, ids[offset:]
+        keys = reversed(order) if reverse else order
+        ids = (key[-1] for key in keys if key[-1] in matched)
+        return total, list(islice(ids, offset, stop))
+
+    # The set of ids passing the filters (and in within), or None for all
+    def match(self, cuisine='all', location='all', price='all', within=None):
+        return self._match(cuisine, location, price, within)
+
+    def _match(self, cuisine, location, price, within=None):
+        postings = []
+        for field, value in zip(FILTER_FIELDS, (cuisine, location, price)):
+            if value != 'all':
+                postings.append(self._postings[field].get(value, _EMPTY_POSTING))
+        if within is None:
+            if not postings:
+                return None
+            postings.sort(key=len)
+            return postings[0].intersection(*postings[1:])
+        # within can be any sized container (e.g. a SearchResult), so walk
+        # the smallest candidate and probe the others
+        if not postings:
+            return within
+        postings.append(within)
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        return {rid for rid in smallest if all(rid in other for other in others)}
+
+    def _sort_key(self, sort_by, restaurant_id):
+        seq = self._seq[restaurant_id]
+        if sort_by == 'rating_desc':
+            return (-self._ratings[restaurant_id], seq, restaurant_id)
+        if sort_by == 'rating_asc':
+            return (self._ratings[restaurant_id], seq, restaurant_id)
+        name = self._restaurants[restaurant_id]['name']
+        if sort_by == 'name_desc':
+            return (name, -seq, restaurant_id)
+        return (name, seq, restaurant_id)
+
+    def _discard_key(self, sort_by, restaurant_id):
+        order = self._orders[sort_by]
+        key = self._sort_key(sort_by, restaurant_id)
+        i = bisect_left(order, key)
+        if i < len(order) and order[i] == key:
+            del order[i]
+
+
+_EMPTY_POSTING = frozenset()
+
+
+LEADERBOARDS = ('top_rated', 'most_reviewed', 'trending')
+
+# Top rated ranks restaurants by a Bayesian average: their reviews plus
+# BAYESIAN_PRIOR_WEIGHT imaginary reviews of BAYESIAN_PRIOR_MEAN stars, so a
+# lone 5-star review scores 3.33 while a hundred averaging 4.5 score 4.43.
+# The SQLite repository computes the same in SQL.
+BAYESIAN_PRIOR_MEAN = 3
+BAYESIAN_PRIOR_WEIGHT = 5
+# Trending counts the reviews dated in the last TRENDING_DAYS days, today
+# included
+TRENDING_DAYS = 7
+
+# When more than this fraction of the restaurants change at once (a bulk
+# load, or a day of trending reviews expiring), boards are re-sorted from
+# scratch instead of updated one restaurant at a time
+_RESORT_RATIO = 0.125
+
+
+def bayesian_average(stats):
+    return ((stats.total + BAYESIAN_PRIOR_MEAN * BAYESIAN_PRIOR_WEIGHT)
+            / (stats.count + BAYESIAN_PRIOR_WEIGHT))
+
+
+# The LEADERBOARDS for the whole catalogue, each cuisine, each location and
+# each cuisine in each location, so reading the top n of any of them is a
+# slice. Each is a sorted list of (-score, seq, id) keys for the
+# restaurants with a score (at least one review; for trending, one this
+# week). Writers report the reviews they add or remove and then call
+# refresh(), which moves the restaurants whose scores changed; a move only
+# shifts the keys between the old and new place, so a review that lifts a
+# restaurant a few places costs a few steps. Trending scores are day
+# counts: when the date changes, the day that left the window is taken off.
+class Leaderboards:
+    def __init__(self, aggregates, today=date.today):
+        self._aggregates = aggregates
+        self._today = today
+        self._day = today().toordinal()
+        self._seq = {}
+        self._next_seq = 0
+        self._scopes = {}
+        # board -> restaurant id -> score, and board -> scope -> keys
+        self._scores = {board: {} for board in LEADERBOARDS}
+        self._orders = {board: {} for board in LEADERBOARDS}
+        # Day ordinal -> restaurant id -> reviews, for the days from the
+        # start of the trending window on (future dates included), and the
+        # reviews per restaurant inside the window
+        self._days = {}
+        self._recent = {}
+        self._dirty = set()
+
+    def add_restaurant(self, restaurant):
+        restaurant_id = restaurant['id']
+        self.remove_restaurant(restaurant_id)
+        self._seq[restaurant_id] = self._next_seq
+        self._next_seq += 1
+        cuisine, location = restaurant['cuisine'], restaurant['location']
+        self._scopes[restaurant_id] = (('all', 'all'), (cuisine, 'all'), ('all', location),
+                                       (cuisine, location))
+        self._dirty.add(restaurant_id)
+
+    def remove_restaurant(self, restaurant_id):
+        if restaurant_id not in self._scopes:
+            return
+        for board in LEADERBOARDS:
+            self._rescore(board, restaurant_id, None)
+        del self._scopes[restaurant_id]
+        del self._seq[restaurant_id]
+
+    # Call with each review added or removed, then refresh()
+    def review_added(self, review):
+        self._count(review, 1)
+
+    def review_removed(self, review):
+        self._count(review, -1)
+
+    def _count(self, review, change):
+        restaurant_id = review['restaurant_id']
+        self._dirty.add(restaurant_id)
+        day = date.fromisoformat(review['date']).toordinal()
+        if day <= self._day - TRENDING_DAYS:
+            return
+        counts = self._days.setdefault(day, {})
+        counts[restaurant_id] = counts.get(restaurant_id, 0) + change
+        if day <= self._day:
+            self._recent[restaurant_id] = self._recent.get(restaurant_id, 0) + change
+
+    # Brings the boards up to date with the reviews reported since the
+    # last call and with today's date
+    def refresh(self):
+        self._roll()
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        resort = len(dirty) > len(self._scopes) * _RESORT_RATIO
+        for board in LEADERBOARDS:
+            scores = self._scores[board]
+            for restaurant_id in dirty:
+                if restaurant_id in self._scopes:
+                    score = self._score(board, restaurant_id)
+                    if resort:
+                        if score is None:
+                            scores.pop(restaurant_id, None)
+                        else:
+                            scores[restaurant_id] = score
+                    else:
+                        self._rescore(board, restaurant_id, score)
+            if resort:
+                self._resort(board)
+
+    # Up to limit (restaurant id, score) pairs from the top of the board
+    # for a cuisine and location ('all' for any), best first
+    def top(self, board, cuisine='all', location='all', limit=10):
+        self.refresh()
+        order = self._orders[board].get((cuisine, location), ())
+        return [(key[-1], -key[0]) for key in order[:limit]]
+
+    def _score(self, board, restaurant_id):
+        if board == 'trending':
+            return self._recent.get(restaurant_id) or None
+        stats = self._aggregates.get(restaurant_id)
+        if not stats.count:
+            return None
+        return stats.count if board == 'most_reviewed' else bayesian_average(stats)
+
+    def _rescore(self, board, restaurant_id, score):
+        scores = self._scores[board]
+        old = scores.get(restaurant_id)
+        if old == score:
+            return
+        seq = self._seq[restaurant_id]
+        orders = self._orders[board]
+        for scope in self._scopes[restaurant_id]:
+            order = orders.setdefault(scope, [])
+            if old is None:
+                insort(order, (-score, seq, restaurant_id))
+            elif score is None:
+                del order[bisect_left(order, (-old, seq, restaurant_id))]
+            else:
+                _move(order, (-old, seq, restaurant_id), (-score, seq, restaurant_id))
+        if score is None:
+            del scores[restaurant_id]
+        else:
+            scores[restaurant_id] = score
+
+    def _resort(self, board):
+        orders = self._orders[board] = {}
+        for restaurant_id, score in self._scores[board].items():
+            key = (-score, self._seq[restaurant_id], restaurant_id)
+            for scope in self._scopes[restaurant_id]:
+                orders.setdefault(scope, []).append(key)
+        for order in orders.values():
+            order.sort()
+
+    # Moves the trending window to today: days that left it stop counting
+    # and days that entered it (reviews dated ahead) start
+    def _roll(self):
+        today = self._today().toordinal()
+        if today == self._day:
+            return
+        old_start, new_start = self._day - TRENDING_DAYS, today - TRENDING_DAYS
+        for day in sorted(self._days):
+            change = (new_start < day <= today) - (old_start < day <= self._day)
+            counts = self._days[day] if day > new_start else self._days.pop(day)
+            if change:
+                for restaurant_id, count in counts.items():
+                    self._recent[restaurant_id] = self._recent.get(restaurant_id, 0) + change * count
+                    self._dirty.add(restaurant_id)
+        self._day = today
+
+
+# Moves key old in the sorted list order to where key new belongs, shifting
+# only the keys in between
+def _move(order, old, new):
+    i = bisect_left(order, old)
+    j = bisect_left(order, new)
+    if j > i:
+        order[i:j - 1] = order[i + 1:j]
+        order[j - 1] = new
+    else:
+        order[j + 1:i + 1] = order[j:i]
+        order[j] = new
+
+
+REVIEW_ORDERS = ('newest', 'highest', 'lowest')
+REVIEW_TEXT_FIELDS = ('id', 'restaurant_id', 'reviewer_name', 'review_text')
+
+
+# Ratings are whole stars; 4.0 and True are not ratings, even though they
+# compare equal to one
+def valid_rating(rating):
+    return isinstance(rating, int) and not isinstance(rating, bool) and 1 <= rating <= 5
+
+
+# Raises ValueError unless the review can be stored as it is: text fields
+# that are strings UTF-8 can encode, a valid rating and an ISO date, and
+# sentiment and text_hash of the right type if given
+def check_review(review):
+    for field in REVIEW_TEXT_FIELDS:
+        value = review.get(field)
+        if not isinstance(value, str):
+            raise ValueError(f"invalid {field} {value!r}")
+        try:
+            value.encode()
+        except UnicodeEncodeError:
+            raise ValueError(f"invalid {field} {value!r}") from None
+    if not valid_rating(review.get('rating')):
+        raise ValueError(f"invalid rating {review.get('rating')!r}")
+    try:
+        date.fromisoformat(review.get('date'))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid date {review.get('date')!r}") from None
+    sentiment = review.get('sentiment')
+    if sentiment is not None and (isinstance(sentiment, bool) or not isinstance(sentiment, (int, float))
+                                  or not -1 <= sentiment <= 1):
+        raise ValueError(f"invalid sentiment {sentiment!r}")
+    text_hash = review.get('text_hash')
+    if text_hash is not None and (isinstance(text_hash, bool) or not isinstance(text_hash, int)
+                                  or not -2 ** 63 <= text_hash < 2 ** 63):
+        raise ValueError(f"invalid text_hash {text_hash!r}")
+
+_SEQ_BITS = 32
+_SEQ_MASK = (1 << _SEQ_BITS) - 1
+_DATE_BITS = 25
+_DATE_MASK = (1 << _DATE_BITS) - 1
+_NO_SENTIMENT = -128
+
+
+# A column of strings stored as UTF-8 in one buffer plus an offsets array,
+# instead of one str object per value
+class StringColumn:
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        return self._data[self._offsets[row]:self._offsets[row + 1]].decode()
+
+    def append(self, value):
+        self.append_bytes(value.encode())
+
+    def append_bytes(self, value):
+        self._data += value
+        self._offsets.append(len(self._data))
+
+    def nbytes(self):
+        return len(self._data) + self._offsets.itemsize * len(self._offsets)
+
+
+# Columnar review storage. Fixed-width fields live in typed arrays (dates as
+# day ordinals, restaurant ids as codes into a shared table) and text in
+# StringColumns. Rows are numbered in insertion order; deleted rows stay
+# behind as tombstones. Reviews are handed out as fresh dicts.
+class ReviewColumns:
+    def __init__(self):
+        self.restaurant = array('I')
+        self.rating = array('B')
+        self.date = array('I')
+        # Sentiment in hundredths (_NO_SENTIMENT for none) and the text hash
+        # from moderation.text_hash (0 for none)
+        self.sentiment = array('b')
+        self.text_hash = array('q')
+        self.id = StringColumn()
+        self.reviewer_name = StringColumn()
+        self.review_text = StringColumn()
+        self._live = bytearray()
+        self._live_count = 0
+        self._restaurant_codes = {}
+        self._restaurant_ids = []
+        # Row per review id, keyed by the id's hash rather than the string;
+        # the rare ids whose hash is taken go in _colliding_rows
+        self._rows = {}
+        self._colliding_rows = {}
+
+    def __len__(self):
+        return self._live_count
+
+    # Every field is converted before any column grows, so a review that
+    # cannot be stored raises (ValueError, or TypeError for a wrong type)
+    # and leaves the columns in step
+    def append(self, review):
+        rating = review['rating']
+        if not valid_rating(rating):
+            raise ValueError(f"invalid rating {rating!r}")
+        day = date.fromisoformat(review['date']).toordinal()
+        sentiment = review.get('sentiment')
+        sentiment = _NO_SENTIMENT if sentiment is None else round(sentiment * 100)
+        if sentiment != _NO_SENTIMENT and not -100 <= sentiment <= 100:
+            raise ValueError(f"invalid sentiment {review['sentiment']!r}")
+        text_hash = review.get('text_hash') or 0
+        if not -2 ** 63 <= text_hash < 2 ** 63:
+            raise ValueError(f"invalid text_hash {text_hash!r}")
+        for field in REVIEW_TEXT_FIELDS:
+            if not isinstance(review[field], str):
+                raise TypeError(f"invalid {field} {review[field]!r}")
+        review_id, reviewer_name, review_text = (
+            review['id'].encode(), review['reviewer_name'].encode(), review['review_text'].encode())
+
+        row = len(self._live)
+        code = self._restaurant_codes.get(review['restaurant_id'])
+        if code is None:
+            code = self._restaurant_codes[review['restaurant_id']] = len(self._restaurant_ids)
+            self._restaurant_ids.append(review['restaurant_id'])
+        self.restaurant.append(code)
+        self.rating.append(rating)
+        self.date.append(day)
+        self.sentiment.append(sentiment)
+        self.text_hash.append(text_hash)
+        self.id.append_bytes(review_id)
+        self.reviewer_name.append_bytes(reviewer_name)
+        self.review_text.append_bytes(review_text)
+        self._live.append(1)
+        self._live_count += 1
+        key = hash(review['id'])
+        if key in self._rows:
+            self._colliding_rows[review['id']] = row
+        else:
+            self._rows[key] = row
+        return row
+
+    def find(self, review_id):
+        row = self._rows.get(hash(review_id))
+        if row is not None and self._live[row] and self.id[row] == review_id:
+            return row
+        return self._colliding_rows.get(review_id)
+
+    def get(self, row):
+        return {
+            'id': self.id[row],
+            'restaurant_id': self._restaurant_ids[self.restaurant[row]],
+            'reviewer_name': self.reviewer_name[row],
+            'rating': self.rating[row],
+            'review_text': self.review_text[row],
+            'date': date.fromordinal(self.date[row]).isoformat(),
+            'sentiment': None if self.sentiment[row] == _NO_SENTIMENT else self.sentiment[row] / 100
+        }
+
+    def delete(self, row):
+        if not self._live[row]:
+            return
+        self._live[row] = 0
+        self._live_count -= 1
+        review_id = self.id[row]
+        if self._colliding_rows.get(review_id) == row:
+            del self._colliding_rows[review_id]
+        elif self._rows.get(hash(review_id)) == row:
+            del self._rows[hash(review_id)]
+
+    def restaurant_code(self, restaurant_id):
+        return self._restaurant_codes.get(restaurant_id)
+
+    def nbytes(self):
+        arrays = (self.restaurant, self.rating, self.date, self.sentiment, self.text_hash)
+        return (sum(a.itemsize * len(a) for a in arrays) + len(self._live)
+                + self.id.nbytes() + self.reviewer_name.nbytes() + self.review_text.nbytes())
+
+
+# Per-restaurant sorted review orders, so a page of reviews is a slice.
+# Each order is an array of 64-bit ints packing (rating, date, row) so that
+# ascending int order is the wanted order; row is the review's row in the
+# ReviewColumns. Order None is insertion order. _texts counts the live
+# reviews per (restaurant code, text hash), for the moderation pipeline's
+# duplicate check.
+class ReviewIndex:
+    def __init__(self, reviews=()):
+        self._columns = ReviewColumns()
+        self._orders = {}
+        self._texts = {}
+        for review in reviews:
+            self.add(review)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __contains__(self, review_id):
+        return self._columns.find(review_id) is not None
+
+    def get(self, review_id):
+        row = self._columns.find(review_id)
+        return None if row is None else self._columns.get(row)
+
+    def add(self, review):
+        row = self._columns.append(review)
+        orders = self._orders.get(review['restaurant_id'])
+        if orders is None:
+            orders = self._orders[review['restaurant_id']] = {None: array('q')}
+            for order in REVIEW_ORDERS:
+                orders[order] = array('q')
+        # Insertion order only ever appends
+        orders[None].append(row)
+        for order in REVIEW_ORDERS:
+            insort(orders[order], self._key(order, row))
+        text = self._text_key(row)
+        if text is not None:
+            self._texts[text] = self._texts.get(text, 0) + 1
+
+    def remove(self, review_id):
+        row = self._columns.find(review_id)
+        if row is None:
+            return None
+        review = self._columns.get(row)
+        orders = self._orders[review['restaurant_id']]
+        for order in (None,) + REVIEW_ORDERS:
+            keys = orders[order]
+            del keys[bisect_left(keys, self._key(order, row))]
+        text = self._text_key(row)
+        if text is not None:
+            if self._texts[text] == 1:
+                del self._texts[text]
+            else:
+                self._texts[text] -= 1
+        self._columns.delete(row)
+        return review
+
+    def count(self, restaurant_id):
+        orders = self._orders.get(restaurant_id)
+        return len(orders[None]) if orders else 0
+
+    # Whether the restaurant has a review with this text hash
+    def has_text(self, restaurant_id, text_hash):
+        code = self._columns.restaurant_code(restaurant_id)
+        return code is not None and (code, text_hash) in self._texts
+
+    # Reviews without a text hash (0) are left out of _texts
+    def _text_key(self, row):
+        text_hash = self._columns.text_hash[row]
+        return (self._columns.restaurant[row], text_hash) if text_hash else None
+
+    def page(self, restaurant_id, order=None, offset=0, limit=None):
+        orders = self._orders.get(restaurant_id)
+        if not orders:
+            return []
+        stop = None if limit is None else offset + limit
+        return [self._columns.get(self._row(order, key)) for key in orders[order][offset:stop]]
+
+    def _key(self, order, row):
+        if order is None:
+            return row
+        day = self._columns.date[row]
+        if order == 'newest':
+            return -((day << _SEQ_BITS) | row)
+        rating = self._columns.rating[row]
+        if order == 'highest':
+            return -((((rating << _DATE_BITS) | day) << _SEQ_BITS) | row)
+        # lowest: rating ascending, then newest first
+        return (((rating << _DATE_BITS) | (_DATE_MASK - day)) << _SEQ_BITS) | (_SEQ_MASK - row)
+
+    @staticmethod
+    def _row(order, key):
+        if order is None:
+            return key
+        if order == 'lowest':
+            return _SEQ_MASK - (key & _SEQ_MASK)
+        return -key & _SEQ_MASK
@@ -0,0 +1,115 @@
+import datetime
+import random
+
+import pytest
+
+from benchmarks.harness import build_repository
+from benchmarks.synthetic import CUISINES, LOCATION_CENTERS, LOCATIONS, PRICE_RANGES, generate_reviews
+from store import LEADERBOARDS, ROLLUP_PERIODS, SORT_ORDERS
+
+RESTAURANTS = 400
+REVIEWS = 4000
+# Reviews dated in the last week, added after the catalogue is loaded so
+# they go through add_reviews (and the SQLite triggers) rather than the
+# bulk loader, and so the trending board has something to rank
+RECENT_REVIEWS = 600
+QUERIES = 300
+
+
+# The same synthetic catalogue in both backends
+@pytest.fixture(scope='module')
+def repositories(tmp_path_factory):
+    path = tmp_path_factory.mktemp('parity') / 'parity.db'
+    backends = [build_repository(RESTAURANTS, REVIEWS, 'memory'),
+                build_repository(RESTAURANTS, REVIEWS, 'sqlite', str(path))]
+    reviews = _recent_reviews()
+    for repository in backends:
+        # Read first, so the recent reviews update a trending board that
+        # is already there rather than one built from scratch
+        repository.leaderboard('trending')
+        repository.add_reviews(reviews)
+        for review in reviews[::50]:
+            repository.remove_review(review['id'])
+        repository.add_restaurant({
+            'id': 'new', 'name': 'Kalomi Late Arrival', 'cuisine': CUISINES[0],
+            'location': LOCATIONS[0], 'price_range': PRICE_RANGES[0], 'image': '',
+            'description': '', 'phone': '', 'address': '', 'latitude': None, 'longitude': None})
+        repository.add_review({'id': 'new-1', 'restaurant_id': 'new', 'reviewer_name': 'A',
+                               'rating': 5, 'review_text': 'Great.',
+                               'date': datetime.date.today().isoformat()})
+    return backends
+
+
+def _recent_reviews():
+    today = datetime.date.today()
+    reviews = []
+    for i, review in enumerate(generate_reviews(RECENT_REVIEWS, RESTAURANTS, seed=5)):
+        review['id'] = f'recent-{i}'
+        review['date'] = (today - datetime.timedelta(days=i % 9)).isoformat()
+        reviews.append(review)
+    return reviews
+
+
+def _random_queries(rng):
+    words = ['pizza', 'sushi curry', 'spic', 'wine tac', 'chef', 'zzz', None, None, None]
+    for _ in range(QUERIES):
+        query = {
+            'cuisine': rng.choice(['all'] * 3 + CUISINES),
+            'location': rng.choice(['all'] * 3 + LOCATIONS),
+            'price': rng.choice(['all'] * 2 + PRICE_RANGES),
+            'sort_by': rng.choice(SORT_ORDERS + ('distance',)),
+            'search': rng.choice(words),
+            'offset': rng.choice([0, 0, 12, 24]),
+            'limit': rng.choice([12, 12, None]),
+        }
+        if rng.random() < 0.4:
+            latitude, longitude = LOCATION_CENTERS[rng.choice(LOCATIONS)]
+            query['near'] = (latitude + rng.uniform(-0.01, 0.01), longitude + rng.uniform(-0.01, 0.01))
+            query['radius_km'] = rng.choice([None, 1, 2, 5])
+        yield query
+
+
+def test_query_restaurants(repositories):
+    memory, sqlite = repositories
+    for query in _random_queries(random.Random(0)):
+        assert memory.query_restaurants(**query) == sqlite.query_restaurants(**query), query
+
+
+def test_leaderboard(repositories):
+    memory, sqlite = repositories
+    for board in LEADERBOARDS:
+        for cuisine in ['all'] + CUISINES:
+            for location in ['all'] + LOCATIONS[:3]:
+                expected = memory.leaderboard(board, cuisine, location)
+                actual = sqlite.leaderboard(board, cuisine, location)
+                assert [restaurant['id'] for restaurant, _ in actual] == \
+                    [restaurant['id'] for restaurant, _ in expected], (board, cuisine, location)
+                assert [score for _, score in actual] == \
+                    pytest.approx([score for _, score in expected]), (board, cuisine, location)
+
+
+def test_review_rollups(repositories):
+    memory, sqlite = repositories
+    for period in ROLLUP_PERIODS:
+        for cuisine, location in [('all', 'all'), (CUISINES[1], 'all'), ('all', LOCATIONS[2]),
+                                  (CUISINES[3], LOCATIONS[4])]:
+            assert memory.review_rollups(cuisine, location, period) == \
+                sqlite.review_rollups(cuisine, location, period), (period, cuisine, location)
+
+
+def test_suggest_restaurants(repositories):
+    memory, sqlite = repositories
+    for query in ['pi', 'piz', 'pizza', 'spicy', 'mit', 'kalomi la', 'late', 'zzz', '']:
+        assert memory.suggest_restaurants(query) == sqlite.suggest_restaurants(query), query
+
+
+def test_facets_and_stats(repositories):
+    memory, sqlite = repositories
+    assert memory.facets() == sqlite.facets()
+    for restaurant_id in [str(i) for i in range(1, RESTAURANTS + 1, 7)] + ['new']:
+        assert _stats(memory, restaurant_id) == _stats(sqlite, restaurant_id), restaurant_id
+
+
+def _stats(repository, restaurant_id):
+    stats = repository.get_rating_stats(restaurant_id)
+    return stats.count, stats.total, stats.histogram, stats.average
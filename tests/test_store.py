@@ -0,0 +1,40 @@
+import pytest
+
+from store import ReviewIndex
+
+
+def _review(review_id, restaurant_id, **fields):
+    return {'id': review_id, 'restaurant_id': restaurant_id, 'reviewer_name': 'Ann',
+            'rating': 4, 'review_text': 'Lovely.', 'date': '2024-05-01', **fields}
+
+
+# A review the columns cannot store must not grow some of them and not
+# others, or every later row reads back fields of its neighbours
+@pytest.mark.parametrize('fields', [
+    {'rating': 4.0}, {'rating': True}, {'rating': 6}, {'date': '2024-13-01'}, {'date': None},
+    {'sentiment': 2.5}, {'text_hash': 2 ** 64}, {'review_text': None},
+    {'reviewer_name': '\ud800'},
+])
+def test_rejected_review_leaves_columns_in_step(fields):
+    reviews = ReviewIndex([_review('a', '1'), _review('b', '2')])
+    with pytest.raises((TypeError, ValueError)):
+        reviews.add(_review('bad', '1', **fields))
+    reviews.add(_review('c', '1', rating=5))
+    assert 'bad' not in reviews
+    assert len(reviews) == 3
+    assert reviews.get('c') == _review('c', '1', rating=5, sentiment=None)
+    assert [review['id'] for review in reviews.page('1', 'highest')] == ['c', 'a']
+
+
+# Duplicate texts are counted, so removing one copy keeps the other visible
+def test_has_text_follows_adds_and_removes():
+    reviews = ReviewIndex([_review('a', '1', text_hash=7), _review('b', '1', text_hash=7),
+                           _review('c', '2', text_hash=9), _review('d', '2')])
+    assert reviews.has_text('1', 7) and reviews.has_text('2', 9)
+    assert not reviews.has_text('2', 7) and not reviews.has_text('3', 7)
+    reviews.remove('a')
+    assert reviews.has_text('1', 7)
+    reviews.remove('b')
+    assert not reviews.has_text('1', 7)
+    reviews.add(_review('e', '1', text_hash=7))
+    assert reviews.has_text('1', 7)
@@ -0,0 +1,10 @@
+import os
+
+# Worker processes share data only through a database, so the production
+# entry point uses a SQLite file unless RESTAURANT_DB says otherwise
+os.environ.setdefault('RESTAURANT_DB', 'restaurants.db')
+
+from app import app, review_writer  # noqa: E402
+
+# The Flask app behind Dash, for gunicorn or any other WSGI server
+server = app.server